@@ -1,12 +1,63 @@
-import matplotlib.pyplot as plt
-import networkx as nx
-import numpy as np
-import graphviz
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import MutableSequence
+from operator import itemgetter
+from time import perf_counter
 
-splits = 0
-parent_splits = 0
-fusions = 0
-parent_fusions = 0
+
+def _pack_sizes(count, per_node, least, most):
+    """Split ``count`` entries into consecutive groups of ``per_node``.
+    The last group is folded into its neighbour, or both are evened out, when it has fewer than ``least``.
+    :rtype: list[int]
+    """
+    sizes = [per_node] * (count // per_node)
+    if count % per_node:
+        sizes.append(count % per_node)
+    if len(sizes) > 1 and sizes[-1] < least:
+        total = sizes.pop() + sizes.pop()
+        if total <= most:
+            sizes.append(total)
+        else:
+            sizes += [total // 2, total - total // 2]
+    return sizes
+
+
+def _merge_into(leaf, pairs, replace):
+    """Merge sorted (key, value) pairs with distinct keys into a leaf, ignoring its size limit."""
+    keys, values = leaf.keys, leaf.values
+    if not keys or keys[-1] < pairs[0][0]:
+        keys.extend(key for key, _ in pairs)
+        values.extend(value for _, value in pairs)
+        return
+    if len(pairs) <= 16:
+        # Few keys: inserting in place is cheaper than rebuilding the lists
+        i = 0
+        for key, value in pairs:
+            i = bisect_left(keys, key, i)
+            if i < len(keys) and keys[i] == key:
+                if replace:
+                    values[i] = value
+            else:
+                keys.insert(i, key)
+                values.insert(i, value)
+            i += 1
+        return
+    merged_keys, merged_values = keys[:0], []
+    i = 0
+    for key, value in pairs:
+        while i < len(keys) and keys[i] < key:
+            merged_keys.append(keys[i])
+            merged_values.append(values[i])
+            i += 1
+        if i < len(keys) and keys[i] == key:
+            merged_keys.append(key)
+            merged_values.append(value if replace else values[i])
+            i += 1
+        else:
+            merged_keys.append(key)
+            merged_values.append(value)
+    leaf.keys = merged_keys + keys[i:]
+    leaf.values = merged_values + values[i:]
 
 
 class Node(object):
@@ -15,6 +66,7 @@ class Node(object):
     Attributes:
         parent
     """
+    __slots__ = ('keys', 'values', 'parent')
 
     def __init__(self, parent=None):
         """Child nodes are stored in values. Parent nodes simply act as a medium to traverse the tree.
@@ -24,36 +76,37 @@ class Node(object):
         self.parent: Node = parent
 
     def index(self, key):
-        """Return the index where the key should be.
+        """Return the index where the key should be, found by binary search.
         :type key: str
         """
-        for i, item in enumerate(self.keys):
-            if key < item:
-                return i
-
-        return len(self.keys)
+        return bisect_right(self.keys, key)
 
     def __getitem__(self, item):
         return self.values[self.index(item)]
 
+    def child_index(self):
+        """Return the position of this node among the children of its parent."""
+        if self.keys:
+            return self.parent.index(self.keys[0])
+        # An emptied node has no key to route with
+        return self.parent.values.index(self)
+
     def __setitem__(self, key, value):
         i = self.index(key)
         self.keys[i:i] = [key]
         self.values.pop(i)
         self.values[i:i] = value
 
-    def split(self):
+    def split(self, mid=None):
         """Splits the node into two and stores them as child nodes.
         extract a pivot from the child to be inserted into the keys of the parent.
+        :param mid: position of the pivot, the middle if None
         @:return key and two children
         """
-        global splits, parent_splits
-        splits += 1
-        parent_splits += 1
-
-        left = Node(self.parent)
+        left = type(self)(self.parent)
 
-        mid = len(self.keys) // 2
+        if mid is None:
+            mid = len(self.keys) // 2
 
         left.keys = self.keys[:mid]
         left.values = self.values[:mid + 1]
@@ -75,11 +128,7 @@ class Node(object):
             del self.keys[i - 1]
 
     def fusion(self):
-        global fusions, parent_fusions
-        fusions += 1
-        parent_fusions += 1
-
-        index = self.parent.index(self.keys[0])
+        index = self.child_index()
         # merge this node with the next node
         if index < len(self.parent.keys):
             next_node: Node = self.parent.values[index + 1]
@@ -95,7 +144,7 @@ class Node(object):
             prev.values += self.values
 
     def borrow_key(self, minimum: int):
-        index = self.parent.index(self.keys[0])
+        index = self.child_index()
         if index < len(self.parent.keys):
             next_node: Node = self.parent.values[index + 1]
             if len(next_node.keys) > minimum:
@@ -121,6 +170,8 @@ class Node(object):
 
 
 class Leaf(Node):
+    __slots__ = ('prev', 'next')
+
     def __init__(self, parent=None, prev_node=None, next_node=None):
         """
         Create a new leaf in the leaf link
@@ -135,23 +186,35 @@ class Leaf(Node):
         if prev_node is not None:
             prev_node.next = self
 
+    def position(self, key):
+        """Return the index of the key in this leaf, or -1 if it is not stored here."""
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return -1
+
+    def __contains__(self, key):
+        return self.position(key) >= 0
+
     def __getitem__(self, item):
-        return self.values[self.keys.index(item)]
+        i = self.position(item)
+        if i < 0:
+            raise ValueError(f'{item!r} is not in leaf')
+        return self.values[i]
 
     def __setitem__(self, key, value):
-        i = self.index(key)
-        if key not in self.keys:
-            self.keys[i:i] = [key]
-            self.values[i:i] = [value]
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            self.values[i] = value
         else:
-            self.values[i - 1] = value
+            self.keys.insert(i, key)
+            self.values.insert(i, value)
 
-    def split(self):
-        global splits
-        splits += 1
-
-        left = Leaf(self.parent, self.prev, self)
-        mid = len(self.keys) // 2
+    def split(self, mid=None):
+        """Move the keys before mid, the middle if None, to a new leaf linked in before this one."""
+        left = type(self)(self.parent, self.prev, self)
+        if mid is None:
+            mid = len(self.keys) // 2
 
         left.keys = self.keys[:mid]
         left.values = self.values[:mid]
@@ -159,18 +222,22 @@ class Leaf(Node):
         self.keys: list = self.keys[mid:]
         self.values: list = self.values[mid:]
 
-        # When the leaf node is split, set the parent key to the left-most key of the right child node.
-        return self.keys[0], [left, self]
+        return self.separator(left, self), [left, self]
+
+    @staticmethod
+    def separator(left, right):
+        """Key for the parent of two neighbouring leaves: keys below it belong to the left leaf.
+        This is the left-most key of the right leaf."""
+        return right.keys[0]
 
     def __delitem__(self, key):
-        i = self.keys.index(key)
+        i = self.position(key)
+        if i < 0:
+            raise ValueError(f'{key!r} is not in leaf')
         del self.keys[i]
         del self.values[i]
 
     def fusion(self):
-        global fusions
-        fusions += 1
-
         if self.next is not None and self.next.parent == self.parent:
             self.next.keys[0:0] = self.keys
             self.next.values[0:0] = self.values
@@ -184,14 +251,14 @@ class Leaf(Node):
             self.prev.next = self.next
 
     def borrow_key(self, minimum: int):
-        index = self.parent.index(self.keys[0])
+        index = self.child_index()
         if index < len(self.parent.keys) and len(self.next.keys) > minimum:
-            self.keys += [self.next.keys.pop(0)]
+            self.keys.append(self.next.keys.pop(0))
             self.values += [self.next.values.pop(0)]
             self.parent.keys[index] = self.next.keys[0]
             return True
         elif index != 0 and len(self.prev.keys) > minimum:
-            self.keys[0:0] = [self.prev.keys.pop()]
+            self.keys.insert(0, self.prev.keys.pop())
             self.values[0:0] = [self.prev.values.pop()]
             self.parent.keys[index - 1] = self.keys[0]
             return True
@@ -199,31 +266,406 @@ class Leaf(Node):
         return False
 
 
+class TypedLeaf(Leaf):
+    """Leaf that stores its keys contiguously in an ``array`` of ``typecode`` instead of a list."""
+    __slots__ = ()
+    typecode = 'q'
+
+    def __init__(self, parent=None, prev_node=None, next_node=None):
+        super(TypedLeaf, self).__init__(parent, prev_node, next_node)
+        self.keys = array(self.typecode)
+
+
+def _common_prefix(a, b):
+    """The longest common prefix of two strings."""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return a[:i]
+
+
+class PrefixKeys(MutableSequence):
+    """Sorted str or bytes keys stored as one common prefix and the list of their suffixes.
+    The first key added is the whole prefix; it is shortened when a key that does not start with
+    it is added, and only lengthened again by ``compact``, which leaves do when their keys are
+    replaced, e.g. by a split. ``bisect_left``/``bisect_right`` search the
+    suffixes without rebuilding any full key.
+    Attributes:
+        prefix: the common prefix, None until the first key is added
+        suffixes (list): what follows the prefix in each key
+    """
+    __slots__ = ('prefix', 'suffixes')
+
+    def __init__(self, keys=()):
+        keys = list(keys)
+        self.prefix = _common_prefix(keys[0], keys[-1]) if keys else None
+        n = len(self.prefix) if keys else 0
+        self.suffixes = [key[n:] for key in keys]
+
+    def _cover(self, key):
+        """Shorten the prefix so that it is a prefix of key too."""
+        prefix = self.prefix
+        if not self.suffixes:
+            self.prefix = key
+        elif not key.startswith(prefix):
+            shorter = _common_prefix(prefix, key)
+            rest = prefix[len(shorter):]
+            self.suffixes = [rest + suffix for suffix in self.suffixes]
+            self.prefix = shorter
+
+    def _search(self, key, search):
+        prefix = self.prefix
+        if prefix is None or key.startswith(prefix):
+            return search(self.suffixes, key[len(prefix or ''):])
+        # Every key starts with the prefix, so all of them are on the same side of this one
+        return 0 if key < prefix else len(self.suffixes)
+
+    def bisect_left(self, key):
+        return self._search(key, bisect_left)
+
+    def bisect_right(self, key):
+        return self._search(key, bisect_right)
+
+    def __len__(self):
+        return len(self.suffixes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            keys = PrefixKeys()
+            keys.prefix, keys.suffixes = self.prefix, self.suffixes[i]
+            return keys
+        return self.prefix + self.suffixes[i]
+
+    def __iter__(self):
+        prefix = self.prefix
+        return (prefix + suffix for suffix in self.suffixes)
+
+    def __setitem__(self, i, key):
+        if isinstance(i, slice):
+            keys = list(key)
+            for key in keys:
+                self._cover(key)
+            n = len(self.prefix)
+            self.suffixes[i] = [key[n:] for key in keys]
+        else:
+            self._cover(key)
+            self.suffixes[i] = key[len(self.prefix):]
+
+    def __delitem__(self, i):
+        del self.suffixes[i]
+
+    def insert(self, i, key):
+        self._cover(key)
+        self.suffixes.insert(i, key[len(self.prefix):])
+
+    def __add__(self, other):
+        return PrefixKeys(list(self) + list(other))
+
+    def compact(self):
+        """Lengthen the prefix to the longest one the keys share."""
+        if self.suffixes:
+            longer = _common_prefix(self.suffixes[0], self.suffixes[-1])
+            if longer:
+                n = len(longer)
+                self.prefix += longer
+                self.suffixes = [suffix[n:] for suffix in self.suffixes]
+
+    def __repr__(self):
+        return f'PrefixKeys({self.prefix!r}, {self.suffixes!r})'
+
+
+class CompressedLeaf(Leaf):
+    """Leaf for str or bytes keys that stores them as ``PrefixKeys``, and pushes the shortest key
+    that separates it from its new neighbour up to the parent when it splits (suffix truncation)."""
+    __slots__ = ('_keys',)
+
+    @property
+    def keys(self):
+        return self._keys
+
+    @keys.setter
+    def keys(self, keys):
+        if isinstance(keys, PrefixKeys):
+            keys.compact()
+        else:
+            keys = PrefixKeys(keys)
+        self._keys = keys
+
+    def position(self, key):
+        keys = self._keys
+        i = keys.bisect_left(key)
+        if i < len(keys) and keys[i] == key:
+            return i
+        return -1
+
+    def __setitem__(self, key, value):
+        keys = self._keys
+        i = keys.bisect_left(key)
+        if i < len(keys) and keys[i] == key:
+            self.values[i] = value
+        else:
+            keys.insert(i, key)
+            self.values.insert(i, value)
+
+    @staticmethod
+    def separator(left, right):
+        """The shortest prefix of the right leaf's first key that is above the left leaf's last key."""
+        low, high = left.keys[-1], right.keys[0]
+        return high[:len(_common_prefix(low, high)) + 1]
+
+
+_typed_leaves = {}
+
+
+def typed_leaf(typecode):
+    """Return the TypedLeaf class for an ``array`` typecode, e.g. 'q' for int or 'd' for float keys."""
+    if typecode not in _typed_leaves:
+        array(typecode)  # Raises ValueError for an unknown typecode
+        _typed_leaves[typecode] = type(f'TypedLeaf_{typecode}', (TypedLeaf,),
+                                       {'__slots__': (), 'typecode': typecode})
+    return _typed_leaves[typecode]
+
+
+class TreeStats(object):
+    """Statistics of one tree.
+    The event counters and timings grow until ``reset()``. ``size``, ``nodes`` and ``leaves`` describe
+    the current shape of the tree and are kept up to date by every insert and delete.
+    Attributes:
+        splits, fusions, borrows: splits, merges and key borrows of leaves and index nodes
+        parent_splits, parent_fusions, parent_borrows: the ones of those that happened on index nodes
+        size: the number of keys in the tree
+        nodes, leaves: the number of index nodes and leaves
+        timing (bool): whether find, insert and delete add their running time to ``times``
+    """
+
+    def __init__(self, tree, timing=False):
+        self.tree = tree
+        self.timing = timing
+        self.size = 0
+        self.nodes = 0
+        self.leaves = 1
+        self.reset()
+
+    def reset(self):
+        """Zero the event counters and timings."""
+        self.splits = self.parent_splits = 0
+        self.fusions = self.parent_fusions = 0
+        self.borrows = self.parent_borrows = 0
+        self.times = dict.fromkeys(('find', 'insert', 'delete'), 0.0)
+        self.calls = dict.fromkeys(('find', 'insert', 'delete'), 0)
+
+    def add_time(self, operation, start):
+        self.times[operation] += perf_counter() - start
+        self.calls[operation] += 1
+
+    @property
+    def fill_factor(self):
+        """Average fraction of the leaf capacity in use."""
+        return self.size / (self.leaves * self.tree.maximum)
+
+    def snapshot(self):
+        """Return a copy of all counters as a dict."""
+        return {'splits': self.splits, 'parent_splits': self.parent_splits,
+                'fusions': self.fusions, 'parent_fusions': self.parent_fusions,
+                'borrows': self.borrows, 'parent_borrows': self.parent_borrows,
+                'depth': self.tree.depth, 'size': self.size, 'nodes': self.nodes, 'leaves': self.leaves,
+                'fill_factor': self.fill_factor, 'times': dict(self.times), 'calls': dict(self.calls)}
+
+
+SPLIT_POLICIES = ('half', 'append')
+
+
 class BPlusTree(object):
     """B+ tree object, consisting of nodes.
     Nodes will automatically be split into two once it is full. When a split occurs, a key will
     'float' upwards and be inserted into the parent node to act as a pivot.
     Attributes:
         maximum (int): The maximum number of keys each node can hold.
+        node_type, leaf_type: The classes used to create index nodes and leaves.
+        stats (TreeStats): split, merge and borrow counters, shape and optional timings of this tree.
+        typecode: When set, leaves keep their keys in an ``array`` of this typecode (see ``typed_leaf``).
+        compress: When set, leaves keep their str or bytes keys prefix-compressed and leaf splits push
+            up truncated separators (see ``CompressedLeaf``).
+        fill_factor (float): fraction of ``maximum`` that ``rebuild``, ``reorganize`` and append
+            splits fill nodes to, in (0, 1].
+        split_policy (str): one of ``SPLIT_POLICIES``. 'half' splits every over-full node in the
+            middle. 'append' splits a rightmost leaf that got its keys added at its end so that the
+            left node keeps the fill factor's share of keys, and its rightmost ancestors likewise,
+            like SQL Server does for ever-increasing keys; the new right nodes may hold fewer than
+            ``minimum`` keys until later appends fill them.
     """
     root: Node
+    node_type = Node
+    leaf_type = Leaf
+    fill_factor = 1.0
+    split_policy = 'half'
 
-    def __init__(self, maximum=4):
-        self.root = Leaf()
+    def __init__(self, maximum=4, timing=False, typecode=None, compress=False, fill_factor=1.0,
+                 split_policy='half'):
+        if typecode is not None and compress:
+            raise ValueError('typecode and compress cannot be combined')
+        if split_policy not in SPLIT_POLICIES:
+            raise ValueError(f'unknown split policy {split_policy!r}, expected one of {list(SPLIT_POLICIES)}')
+        self.split_policy = split_policy
+        if typecode is not None:
+            self.leaf_type = typed_leaf(typecode)
+        if compress:
+            self.leaf_type = CompressedLeaf
+        self.root = self.leaf_type()
         self.maximum: int = maximum if maximum > 2 else 2
         self.minimum: int = self.maximum // 2
         self.depth = 0
+        self.stats = TreeStats(self, timing)
+        self._fill(fill_factor)
+        self.fill_factor = fill_factor
+
+    @classmethod
+    def bulk_load(cls, items, maximum=4, fill_factor=1.0, presorted=False, **kwargs):
+        """Build a tree bottom-up from key/value pairs instead of inserting them one by one.
+        Leaves are packed in key order and chained through prev/next, then every level of index
+        nodes is built from the level below it. Duplicate keys keep the last value.
+        :param items: iterable of (key, value) pairs
+        :param maximum: the maximum number of keys each node can hold
+        :param fill_factor: fraction of ``maximum`` each node is filled to, in (0, 1]; also becomes
+            the tree's ``fill_factor``
+        :param presorted: ``items`` are already in ascending key order, stream them without sorting
+        :param kwargs: further arguments for the tree constructor
+        :rtype: BPlusTree
+        """
+        if not 0 < fill_factor <= 1:
+            raise ValueError('fill_factor must be in (0, 1]')
+        tree = cls(maximum=maximum, **kwargs)
+        tree.fill_factor = fill_factor
+        if not presorted:
+            items = sorted(items, key=itemgetter(0))
+        leaves, tree.stats.size = tree._pack_leaves(items, tree._fill(fill_factor), tree.root)
+        tree._build_index(leaves, tree._fill(fill_factor))
+        return tree
+
+    def _fill(self, fill_factor):
+        """The number of keys a fill factor in (0, 1] packs into a node, at least ``minimum``."""
+        if not 0 < fill_factor <= 1:
+            raise ValueError('fill_factor must be in (0, 1]')
+        return min(self.maximum, max(self.minimum, int(self.maximum * fill_factor), 1))
+
+    def _pack_leaves(self, items, fill, first):
+        """Pack sorted (key, value) pairs into a chain of leaves of fill keys, starting with first.
+        :return: the leaves and the number of distinct keys
+        """
+        leaves = [first]
+        count = 0
+        for key, value in items:
+            leaf = leaves[-1]
+            if leaf.keys and not leaf.keys[-1] < key:
+                if leaf.keys[-1] == key:
+                    leaf.values[-1] = value
+                    continue
+                raise ValueError('bulk_load expects items sorted by key')
+            if len(leaf.keys) == fill:
+                leaf = self.leaf_type(prev_node=leaf)
+                leaves.append(leaf)
+            leaf.keys.append(key)
+            leaf.values.append(value)
+            count += 1
+        self._even_last(leaves)
+        return leaves, count
+
+    def _even_last(self, leaves):
+        """Merge an under-full last leaf into its left neighbour, or even the two out."""
+        if len(leaves) > 1 and len(leaves[-1].keys) < self.minimum:
+            prev, last = leaves[-2], leaves[-1]
+            keys, values = prev.keys + last.keys, prev.values + last.values
+            if len(keys) <= self.maximum:
+                prev.keys, prev.values = keys, values
+                prev.next = None
+                leaves.pop()
+            else:
+                mid = len(keys) // 2
+                prev.keys, prev.values = keys[:mid], values[:mid]
+                last.keys, last.values = keys[mid:], values[mid:]
+
+    def _build_index(self, leaves, fill):
+        """Build every level of index nodes above a chain of leaves, fill + 1 children per node, and
+        make its top the root."""
+        self.depth = 0
+        self.stats.nodes = 0
+        level = leaves
+        # The first low of a level is never a key of the level above
+        separator = self.leaf_type.separator
+        lows = [None] + [separator(left, right) for left, right in zip(leaves, leaves[1:])] if len(leaves) > 1 else []
+        while len(level) > 1:
+            parents, parent_lows = [], []
+            start = 0
+            for size in _pack_sizes(len(level), fill + 1, self.minimum + 1, self.maximum + 1):
+                node = self.node_type()
+                node.keys = lows[start + 1:start + size]
+                node.values = level[start:start + size]
+                for child in node.values:
+                    child.parent = node
+                parents.append(node)
+                parent_lows.append(lows[start])
+                start += size
+            level, lows = parents, parent_lows
+            self.depth += 1
+            self.stats.nodes += len(level)
+
+        level[0].parent = None
+        self.root = level[0]
+        self.stats.leaves = len(leaves)
+
+    def rebuild(self, fill_factor=None):
+        """Rebuild the whole tree from its items, like ALTER INDEX ... REBUILD: new leaves are packed
+        to the fill factor in key order and new index levels built above them. The old tree stays
+        readable until the new root replaces it in one assignment.
+        :param fill_factor: fraction of ``maximum`` each node is filled to, the tree's ``fill_factor`` if None
+        """
+        fill = self._fill(self.fill_factor if fill_factor is None else fill_factor)
+        leaves, self.stats.size = self._pack_leaves(self.items(), fill, self.leaf_type())
+        self._build_index(leaves, fill)
+
+    def reorganize(self, fill_factor=None):
+        """Compact the leaves in place, like ALTER INDEX ... REORGANIZE: walking the leaf chain, each
+        leaf takes keys from the leaves after it until it holds the fill factor's share of
+        ``maximum``; emptied leaves are unlinked. Leaves already fuller are left as they are. The
+        small index levels are then rebuilt above the remaining leaves.
+        :param fill_factor: fraction of ``maximum`` each leaf is filled to, the tree's ``fill_factor`` if None
+        """
+        fill = self._fill(self.fill_factor if fill_factor is None else fill_factor)
+        leaves = []
+        leaf = self.leftmost_leaf()
+        while leaf is not None:
+            following = leaf.next
+            while following is not None and len(leaf.keys) < fill:
+                take = fill - len(leaf.keys)
+                leaf.keys += following.keys[:take]
+                leaf.values += following.values[:take]
+                del following.keys[:take]
+                del following.values[:take]
+                if following.keys:
+                    break
+                leaf.next = following = following.next
+                if following is not None:
+                    following.prev = leaf
+            leaves.append(leaf)
+            leaf = leaf.next
+        self._even_last(leaves)
+        self._build_index(leaves, fill)
 
     def find(self, key) -> Leaf:
         """ find the leaf
         Returns:
             Leaf: the leaf which should have the key
         """
+        if self.stats.timing:
+            start = perf_counter()
         node = self.root
         # Traverse tree until leaf node is reached.
-        while type(node) is not Leaf:
+        while not isinstance(node, Leaf):
             node = node[key]
 
+        if self.stats.timing:
+            self.stats.add_time('find', start)
         return node
 
     def __getitem__(self, item):
@@ -232,7 +674,8 @@ class BPlusTree(object):
     def query(self, key):
         """Returns a value for a given key, and None if the key does not exist."""
         leaf = self.find(key)
-        return leaf[key] if key in leaf.keys else None
+        i = leaf.position(key)
+        return leaf.values[i] if i >= 0 else None
 
     def change(self, key, value):
         """change the value
@@ -240,7 +683,7 @@ class BPlusTree(object):
             (bool,Leaf): the leaf where the key is. return False if the key does not exist
         """
         leaf = self.find(key)
-        if key not in leaf.keys:
+        if key not in leaf:
             return False, leaf
         else:
             leaf[key] = value
@@ -250,31 +693,56 @@ class BPlusTree(object):
         """Inserts a key-value pair after traversing to a leaf node. If the leaf node is full, split
               the leaf node into two.
               """
+        start = perf_counter() if self.stats.timing and leaf is None else None
         if leaf is None:
             leaf = self.find(key)
+        size = len(leaf.keys)
         leaf[key] = value
+        self.stats.size += len(leaf.keys) - size
         if len(leaf.keys) > self.maximum:
-            self.insert_index(*leaf.split())
+            self.split_leaf(leaf, leaf.next is None and leaf.keys[-1] == key)
+        if start is not None:
+            self.stats.add_time('insert', start)
 
     def insert(self, key, value):
         """
         Returns:
             (bool,Leaf): the leaf where the key is inserted. return False if already has same key
         """
+        start = perf_counter() if self.stats.timing else None
         leaf = self.find(key)
-        if key in leaf.keys:
-            return False, leaf
-        else:
+        inserted = key not in leaf
+        if inserted:
             self.__setitem__(key, value, leaf)
-            return True, leaf
+        if start is not None:
+            self.stats.add_time('insert', start)
+        return inserted, leaf
 
-    def insert_index(self, key, values: list[Node]):
+    def split_leaf(self, leaf, appended=False):
+        """Split an over-full leaf, and the halves again, until every piece fits into a leaf.
+        :param appended: the new keys went to the end of the rightmost leaf; with the 'append' split
+            policy the left pieces then keep the fill factor's share of keys instead of half
+        """
+        mid = self._fill(self.fill_factor) if appended and self.split_policy == 'append' else None
+        pending = [leaf]
+        while pending:
+            leaf = pending.pop()
+            if len(leaf.keys) > self.maximum:
+                self.stats.splits += 1
+                self.stats.leaves += 1
+                key, halves = leaf.split(mid)
+                self.insert_index(key, halves, mid is not None)
+                pending += halves
+
+    def insert_index(self, key, values: list[Node], appended=False):
         """For a parent and child node,
-                    Insert the values from the child into the values of the parent."""
+                    Insert the values from the child into the values of the parent.
+        :param appended: the children come from an append split, see ``split_leaf``"""
         parent = values[1].parent
         if parent is None:
-            values[0].parent = values[1].parent = self.root = Node()
+            values[0].parent = values[1].parent = self.root = self.node_type()
             self.depth += 1
+            self.stats.nodes += 1
             self.root.keys = [key]
             self.root.values = values
             return
@@ -282,26 +750,58 @@ class BPlusTree(object):
         parent[key] = values
         # If the node is full, split the  node into two.
         if len(parent.keys) > self.maximum:
-            self.insert_index(*parent.split())
+            self.stats.splits += 1
+            self.stats.parent_splits += 1
+            self.stats.nodes += 1
+            # An append split keeps at least one key in the new right node
+            mid = min(self._fill(self.fill_factor), len(parent.keys) - 2) if appended else None
+            self.insert_index(*parent.split(mid), appended)
         # Once a leaf node is split, it consists of a internal node and two leaf nodes.
         # These need to be re-inserted back into the tree.
 
     def delete(self, key, node: Node = None):
         if node is None:
+            if self.stats.timing:
+                start = perf_counter()
+                self.delete(key, self.find(key))
+                self.stats.add_time('delete', start)
+                return
             node = self.find(key)
         del node[key]
+        if isinstance(node, Leaf):
+            self.stats.size -= 1
+        self.rebalance(key, node)
 
-        if len(node.keys) < self.minimum:
+    def rebalance(self, key, node: Node):
+        """Refill an under-full node by borrowing keys from its siblings, or merge it into one.
+        The key must route to the node, its parent loses the child after a merge."""
+        is_leaf = isinstance(node, Leaf)
+        while len(node.keys) < self.minimum:
             if node == self.root:
                 if len(self.root.keys) == 0 and len(self.root.values) > 0:
-                    self.root = self.root.values[0]
-                    self.root.parent = None
-                    self.depth -= 1
+                    self.collapse_root()
                 return
 
-            elif not node.borrow_key(self.minimum):
+            elif node.borrow_key(self.minimum):
+                self.stats.borrows += 1
+                self.stats.parent_borrows += not is_leaf
+            else:
                 node.fusion()
+                self.stats.fusions += 1
+                if is_leaf:
+                    self.stats.leaves -= 1
+                else:
+                    self.stats.parent_fusions += 1
+                    self.stats.nodes -= 1
                 self.delete(key, node.parent)
+                return
+
+    def collapse_root(self):
+        """Replace an index root that has a single child by that child."""
+        self.root = self.root.values[0]
+        self.root.parent = None
+        self.depth -= 1
+        self.stats.nodes -= 1
         # Change the left-most key in node
         # if i == 0:
         #     node = self
@@ -315,110 +815,230 @@ class BPlusTree(object):
         #
         #     node.keys[i - 1] = self.keys[0]
 
+    def insert_many(self, batch, replace=False):
+        """Insert a batch of key/value pairs.
+        The batch is sorted and applied leaf by leaf: all keys that fall into a leaf are merged into
+        it before it is split, and the tree is only climbed again once the batch moves past the key
+        range of the current leaf.
+        :param batch: iterable of (key, value) pairs
+        :param replace: overwrite existing keys like ``tree[key] = value`` instead of keeping them like ``insert``
+        :return: the number of keys added to the tree
+        """
+        # The sort is stable, so equal keys stay in batch order; keep the one the per-key calls would.
+        pairs = []
+        for pair in sorted(batch, key=itemgetter(0)):
+            if not pairs or pairs[-1][0] < pair[0]:
+                pairs.append(pair)
+            elif replace:
+                pairs[-1] = pair
+        path, inserted, i = [], 0, 0
+        while i < len(pairs):
+            leaf, high = self._descend(pairs[i][0], path)
+            j = i + 1
+            while j < len(pairs) and (high is None or pairs[j][0] < high):
+                j += 1
+            size = len(leaf.keys)
+            appended = leaf.next is None and (not leaf.keys or leaf.keys[-1] < pairs[i][0])
+            _merge_into(leaf, pairs[i:j], replace)
+            inserted += len(leaf.keys) - size
+            if len(leaf.keys) > self.maximum:
+                self.split_leaf(leaf, appended)
+                path = []
+            i = j
+        self.stats.size += inserted
+        return inserted
+
+    def delete_many(self, keys):
+        """Delete a batch of keys; keys that are not in the tree are skipped.
+        The batch is sorted and applied leaf by leaf: all keys of a leaf are removed before it is
+        rebalanced, and the tree is only climbed again once the batch moves past the key range of
+        the current leaf.
+        :return: the number of keys removed from the tree
+        """
+        keys = sorted(keys)
+        path, deleted, i = [], 0, 0
+        while i < len(keys):
+            leaf, high = self._descend(keys[i], path)
+            j = i + 1
+            while j < len(keys) and (high is None or keys[j] < high):
+                j += 1
+            size = len(leaf.keys)
+            for key in keys[i:j]:
+                position = leaf.position(key)
+                if position >= 0:
+                    del leaf.keys[position]
+                    del leaf.values[position]
+            deleted += size - len(leaf.keys)
+            if len(leaf.keys) < self.minimum and leaf is not self.root:
+                # Any key of the batch routes to this leaf, even after borrowing.
+                self.rebalance(keys[i], leaf)
+                path = []
+            i = j
+        self.stats.size -= deleted
+        return deleted
+
+    def _descend(self, key, path):
+        """Find the leaf for the key, starting from the deepest node on ``path`` whose key range holds it.
+        ``path`` lists (node, low, high) from the root down and is updated for the new leaf.
+        :return: the leaf and the upper bound of its key range, None if it is unbounded
+        """
+        while path:
+            node, low, high = path[-1]
+            if (low is None or not key < low) and (high is None or key < high):
+                break
+            path.pop()
+        else:
+            path.append((self.root, None, None))
+        node, low, high = path[-1]
+        while not isinstance(node, Leaf):
+            i = node.index(key)
+            if i > 0:
+                low = node.keys[i - 1]
+            if i < len(node.keys):
+                high = node.keys[i]
+            node = node.values[i]
+            path.append((node, low, high))
+        return node, high
+
     def show(self, node=None, file=None, _prefix="", _last=True):
         """Prints the keys at each level."""
         if node is None:
             node = self.root
-        print(_prefix, "`- " if _last else "|- ", node.keys, sep="", file=file)
+        print(_prefix, "`- " if _last else "|- ", list(node.keys), sep="", file=file)
         _prefix += "   " if _last else "|  "
 
-        if type(node) is Node:
+        if not isinstance(node, Leaf):
             # Recursively print the key of child nodes (if these exist).
             for i, child in enumerate(node.values):
                 _last = (i == len(node.values) - 1)
                 self.show(child, file, _prefix, _last)
 
     def output(self):
-        return splits, parent_splits, fusions, parent_fusions, self.depth
+        stats = self.stats
+        return stats.splits, stats.parent_splits, stats.fusions, stats.parent_fusions, self.depth
 
-    def readfile(self, reader):
+    def readfile(self, reader, progress=None):
+        """Insert the "key value" lines of a binary file one by one.
+        :param progress: callable(rows) called every 1000 rows instead of printing the count
+        """
         i = 0
         for i, line in enumerate(reader):
             s = line.decode().split(maxsplit=1)
             self[s[0]] = s[1]
             if i % 1000 == 0:
-                print('Insert ' + str(i) + 'items')
+                if progress is None:
+                    print('Insert ' + str(i) + 'items')
+                else:
+                    progress(i)
         return i + 1
 
+    @classmethod
+    def ingest(cls, reader, maximum=4, chunk_size=1 << 23, workers=None, fan_in=64, temp_dir=None,
+               progress=None, fill_factor=1.0, **kwargs):
+        """Build a tree from a binary file of "key value" lines, which may be larger than memory, with
+        the same keys and values as ``readfile``. Chunks of the file are parsed and sorted into run
+        files in a process pool, the runs are merged and the merged stream is bulk loaded; see the
+        externalSort module.
+        :param chunk_size: bytes of the file per sorted run
+        :param workers: size of the process pool, 0 to parse in this process, None for one per CPU
+        :param fan_in: most runs merged at once
+        :param temp_dir: directory for the run files, the system's temporary directory if None
+        :param progress: callable(stage, rows), called with 'parse' after each run and 'merge'
+            during the build
+        :rtype: BPlusTree
+        """
+        from externalSort import ingest
+        return ingest(cls, reader, maximum, chunk_size, workers, fan_in, temp_dir, progress, fill_factor, **kwargs)
+
     def leftmost_leaf(self) -> Leaf:
         node = self.root
-        while type(node) is not Leaf:
+        while not isinstance(node, Leaf):
             node = node.values[0]
         return node
 
-    def plot_tree(self, filename='./bplus_tree'):
-        dot = graphviz.Digraph(comment='B+ Tree')
-        self._plot_tree(dot, self.root)
-        dot.render(filename, format='png', cleanup=True, view=True)
+    def rightmost_leaf(self) -> Leaf:
+        node = self.root
+        while not isinstance(node, Leaf):
+            node = node.values[-1]
+        return node
 
-    def _plot_tree(self, dot, node, parent_label=None, link_label=None):
-        if node is None:
+    def range(self, lo=None, hi=None, inclusive=True, reverse=False):
+        """Yield (key, value) pairs with lo <= key <= hi in key order.
+        The start leaf is found once, then the scan streams along the leaf chain, so it needs
+        O(log n + k) time and constant extra memory. The tree must not be modified while iterating.
+        :param lo: lower bound, or None for no lower bound
+        :param hi: upper bound, or None for no upper bound
+        :param inclusive: whether the bounds are included, either one bool or a (lo, hi) pair
+        :param reverse: yield the pairs in descending key order
+        """
+        lo_inclusive, hi_inclusive = inclusive if isinstance(inclusive, tuple) else (inclusive, inclusive)
+        if reverse:
+            yield from self._range_reverse(lo, hi, lo_inclusive, hi_inclusive)
             return
 
-        if isinstance(node, Node):
-            node_label = ', '.join(map(str, node.keys))
-        elif isinstance(node, Leaf):
-            node_label = ', '.join(map(str, node.keys))
+        if lo is None:
+            leaf, i = self.leftmost_leaf(), 0
+        else:
+            leaf = self.find(lo)
+            i = bisect_left(leaf.keys, lo) if lo_inclusive else bisect_right(leaf.keys, lo)
+        while leaf is not None:
+            keys, values = leaf.keys, leaf.values
+            while i < len(keys):
+                key = keys[i]
+                if hi is not None and (hi < key or (key == hi and not hi_inclusive)):
+                    return
+                yield key, values[i]
+                i += 1
+            leaf, i = leaf.next, 0
+
+    def _range_reverse(self, lo, hi, lo_inclusive, hi_inclusive):
+        if hi is None:
+            leaf = self.rightmost_leaf()
+            i = len(leaf.keys) - 1
         else:
-            # Handle other types of nodes if necessary
-            node_label = str(node)
+            leaf = self.find(hi)
+            i = (bisect_right(leaf.keys, hi) if hi_inclusive else bisect_left(leaf.keys, hi)) - 1
+        while leaf is not None:
+            keys, values = leaf.keys, leaf.values
+            while i >= 0:
+                key = keys[i]
+                if lo is not None and (key < lo or (key == lo and not lo_inclusive)):
+                    return
+                yield key, values[i]
+                i -= 1
+            leaf = leaf.prev
+            if leaf is not None:
+                i = len(leaf.keys) - 1
 
-        dot.node(str(id(node)), label=node_label)
+    def items(self):
+        """Yield every (key, value) pair in key order."""
+        return self.range()
 
-        if parent_label is not None:
-            dot.edge(str(parent_label), str(id(node)), label=link_label)
+    def keys(self):
+        """Yield every key in order."""
+        for key, _ in self.range():
+            yield key
 
-        if isinstance(node, Node):
-            for i, child in enumerate(node.values):
-                link_label = f'[{i}]'
-                self._plot_tree(dot, child, parent_label=id(node), link_label=link_label)
-        elif isinstance(node, Leaf):
-            if node.next:
-                link_label = 'next'
-                self._plot_tree(dot, node.next, parent_label=id(node), link_label=link_label)
-
-        return dot
-    # def plot(self):
-    #
-    #     # Track node positions
-    #     pos = {}
-    #
-    #     def set_pos(node, x, y):
-    #         pos[node] = (x, y)
-    #
-    #     def get_pos(node):
-    #         return pos.get(node, (0, 0))
-    #
-    #     # Plot self recursively
-    #     def plot_node(node, x, y, angle_offset=np.pi/4):
-    #
-    #         set_pos(node, x, y)
-    #
-    #         if isinstance(node, Leaf):
-    #             # Plot leaf node
-    #             plt.Circle([x, y], 0.5, color='green')
-    #             plt.text(x, y, str(node.keys))
-    #
-    #         else:
-    #             # Plot internal node
-    #             plt.Circle([x, y], 0.5, color='black')
-    #             plt.text(x, y, str(node.keys))
-    #
-    #             # Plot lines to children
-    #             x_increment = 1 / (len(node.keys) + 1)
-    #
-    #             num_children = len(node.values)
-    #
-    #             for i, child in enumerate(node.values):
-    #                 angle_rad = (i / num_children) * (2 * np.pi) + angle_offset
-    #                 child_x = x + x_increment * (i + 1) * np.cos(angle_rad)
-    #                 child_y = y - 1 + x_increment * (i + 1) * np.sin(angle_rad)
-    #
-    #                 plt.plot([x, child_x], [y, child_y], color='black')
-    #                 plot_node(child, child_x, child_y, angle_offset)
-    #
-    #     fig, ax = plt.subplots(figsize=(20, 20))
-    #     plot_node(self.root, 0, 0)
-    #     ax.margins(0.1)
-    #     plt.axis('off')
-    #     plt.show()
\ No newline at end of file
+    def __iter__(self):
+        return self.keys()
+
+    def save(self, path):
+        """Write the tree to a binary snapshot file, level by level; see the snapshot module."""
+        from snapshot import save_tree
+        save_tree(self, path)
+
+    @classmethod
+    def load(cls, path, lazy=False):
+        """Rebuild a tree saved with ``save`` in one pass over the file, without splitting or inserting.
+        :param lazy: map the file with mmap and decode the values of a leaf only when they are first used
+        :rtype: BPlusTree
+        """
+        from snapshot import load_tree
+        return load_tree(cls, path, lazy)
+
+    def plot_tree(self, filename='./bplus_tree'):
+        """Render the tree to a png with graphviz.
+        The plotting code lives in BPlusTreePlot and is only imported here, so importing this module
+        needs nothing beyond the standard library."""
+        from BPlusTreePlot import plot_tree
+        plot_tree(self, filename)
@@ -0,0 +1,62 @@
+"""insert_many/delete_many vs. per-key insert/delete on BPlusTree, for clustered and random batches.
+
+Run from the repository root:
+    python -m benchmarks.bench_batch [n] [batch size]
+"""
+import random
+import sys
+import time
+
+from BPlusTree import BPlusTree
+
+
+def make_batches(n, batch_size, clustered):
+    keys = list(range(n))
+    if clustered:
+        # Runs of consecutive keys, in random run order
+        runs = [keys[i:i + batch_size] for i in range(0, n, batch_size)]
+        random.shuffle(runs)
+        return runs
+    random.shuffle(keys)
+    return [keys[i:i + batch_size] for i in range(0, n, batch_size)]
+
+
+def per_key(batches, maximum):
+    tree = BPlusTree(maximum)
+    start = time.perf_counter()
+    for batch in batches:
+        for key in batch:
+            tree.insert(key, key)
+    inserted = time.perf_counter() - start
+    start = time.perf_counter()
+    for batch in batches:
+        for key in batch:
+            tree.delete(key)
+    return inserted, time.perf_counter() - start
+
+
+def batched(batches, maximum):
+    tree = BPlusTree(maximum)
+    start = time.perf_counter()
+    for batch in batches:
+        tree.insert_many([(key, key) for key in batch])
+    inserted = time.perf_counter() - start
+    start = time.perf_counter()
+    for batch in batches:
+        tree.delete_many(batch)
+    return inserted, time.perf_counter() - start
+
+
+def main(n, batch_size, maximum=64):
+    print(f"{'workload':>10} {'insert':>8} {'insert_many':>12} {'speedup':>8} {'delete':>8} {'delete_many':>12} {'speedup':>8}")
+    for clustered in (True, False):
+        batches = make_batches(n, batch_size, clustered)
+        single_insert, single_delete = per_key(batches, maximum)
+        batch_insert, batch_delete = batched(batches, maximum)
+        print(f"{'clustered' if clustered else 'random':>10} {single_insert:>7.3f}s {batch_insert:>11.3f}s "
+              f"{single_insert / batch_insert:>7.1f}x {single_delete:>7.3f}s {batch_delete:>11.3f}s "
+              f"{single_delete / batch_delete:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6, int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
@@ -0,0 +1,42 @@
+"""Bulk load vs. per-key inserts for BPlusTree.
+
+Run from the repository root:
+    python -m benchmarks.bench_bulk_load [n ...]
+"""
+import random
+import sys
+import time
+
+from BPlusTree import BPlusTree
+
+
+def insert_loop(items, maximum):
+    tree = BPlusTree(maximum)
+    for key, value in items:
+        tree[key] = value
+    return tree
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main(sizes, maximum=64):
+    print(f"{'n':>10} {'insert shuffled':>16} {'insert sorted':>14} {'bulk (sort)':>12} {'bulk presorted':>15}")
+    for n in sizes:
+        items = [(key, str(key)) for key in range(n)]
+        shuffled = items[:]
+        random.shuffle(shuffled)
+        results = [
+            timed(insert_loop, shuffled, maximum),
+            timed(insert_loop, items, maximum),
+            timed(BPlusTree.bulk_load, shuffled, maximum),
+            timed(BPlusTree.bulk_load, items, maximum, presorted=True),
+        ]
+        print(f'{n:>10} ' + ' '.join(f'{seconds:>{width}.3f}s' for seconds, width in zip(results, (15, 13, 11, 14))))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10 ** 4, 10 ** 5, 10 ** 6])
@@ -0,0 +1,72 @@
+"""Point lookups through the read-through cache of CachedBPlusTree against a plain BPlusTree.
+
+Loads n keys, then looks up probes keys drawn from a Zipf distribution over the keys, with a share
+of them keys that are not in the tree (answered by negative entries), at several skews; skew 0 is
+uniform. For the plain tree and LRU and CLOCK caches of a given size it reports the lookup time,
+the speedup over the plain tree and the cache's hit rate. A last run per skew mixes in updates, so
+``__setitem__`` keeps refreshing cached entries.
+
+Run from the repository root:
+    python -m benchmarks.bench_cache [n] [probes] [cache size] [maximum] [absent share]
+"""
+import random
+import sys
+import time
+from itertools import accumulate
+
+from BPlusTree import BPlusTree
+from cachedBPlusTree import CachedBPlusTree
+
+SKEWS = (0.0, 0.6, 0.9, 1.1, 1.3)
+
+
+def zipf_keys(keys, count, skew, rng):
+    """Draw count keys, the key of rank r with weight 1 / r ** skew; ranks are shuffled over the keys."""
+    ranked = list(keys)
+    rng.shuffle(ranked)
+    weights = accumulate(1 / rank ** skew for rank in range(1, len(ranked) + 1))
+    return rng.choices(ranked, cum_weights=list(weights), k=count)
+
+
+def timed(tree, probes, writes=0.0):
+    rng = random.Random(2)
+    start = time.perf_counter()
+    if writes:
+        for key in probes:
+            if rng.random() < writes:
+                tree[key] = key
+            else:
+                tree.query(key)
+    else:
+        for key in probes:
+            tree.query(key)
+    return (time.perf_counter() - start) / len(probes)
+
+
+def main(n, probes, cache_size, maximum, absent):
+    rng = random.Random(7)
+    present = list(range(0, 2 * n, 2))
+    missing = list(range(1, 2 * n, 2))
+    print(f'{n} keys, {probes} lookups, {absent:.0%} absent, cache of {cache_size} keys, maximum {maximum}')
+    print(f"{'skew':>5} {'tree':>14} {'lookup us':>10} {'speedup':>8} {'hit rate':>9}")
+    items = [(key, key) for key in present]
+    for skew in SKEWS:
+        keys = zipf_keys(present, probes, skew, rng)
+        misses = iter(zipf_keys(missing, probes, skew, rng))
+        keys = [next(misses) if rng.random() < absent else key for key in keys]
+        plain = timed(BPlusTree.bulk_load(items, maximum), keys)
+        print(f'{skew:>5.1f} {"plain":>14} {plain * 1e6:>10.2f} {1:>8.2f} {"-":>9}')
+        for name, policy, writes in (('lru', 'lru', 0.0), ('clock', 'clock', 0.0), ('lru, 10% set', 'lru', 0.1)):
+            tree = CachedBPlusTree.bulk_load(items, maximum, cache_size=cache_size, cache_policy=policy)
+            seconds = timed(tree, keys, writes)
+            base = plain if not writes else timed(BPlusTree.bulk_load(items, maximum), keys, writes)
+            print(f'{skew:>5.1f} {name:>14} {seconds * 1e6:>10.2f} {base / seconds:>8.2f}'
+                  f' {tree.cache.hit_rate:>9.1%}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 300000,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 2000,
+         int(sys.argv[4]) if len(sys.argv) > 4 else 64,
+         float(sys.argv[5]) if len(sys.argv) > 5 else 0.1)
@@ -0,0 +1,105 @@
+"""Prefix compression and suffix truncation of string keys in BPlusTree leaves.
+
+Builds a tree of n path-like keys ("tenant0042/orders/2024/0000123"), with long shared prefixes,
+with plain leaves and with ``compress=True``, and reports
+
+- the key characters stored in the leaves and the compression ratio,
+- the average length of the separator keys in index nodes,
+- the bytes per key measured with tracemalloc and the lookup time,
+- the fanout of 8 KiB pages given the encoded size of a leaf entry (key + 8 byte value) and of an
+  index entry (separator + 8 byte child pointer), and the depth that gives for n keys.
+
+Run from the repository root:
+    python -m benchmarks.bench_compression [n] [maximum] [tenants]
+"""
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+from BPlusTree import BPlusTree, Leaf
+from pagedBPlusTree import PAGE_SIZE
+
+
+def make_keys(n, tenants):
+    """Key parts: (tenant, year, serial) of each key."""
+    rng = random.Random(3)
+    return [(rng.randrange(tenants), rng.randrange(2019, 2025), i) for i in range(n)]
+
+
+def key_of(tenant, year, serial):
+    return f'tenant{tenant:04d}/orders/{year}/{serial:07d}'
+
+
+def nodes(tree):
+    level = [tree.root]
+    while level:
+        yield from level
+        level = [child for node in level if not isinstance(node, Leaf) for child in node.values]
+
+
+def shape(tree):
+    """Key characters stored in leaves, total separator length and number of separators."""
+    stored = separators = count = 0
+    for node in nodes(tree):
+        if isinstance(node, Leaf):
+            keys = node.keys
+            if hasattr(keys, 'suffixes'):
+                stored += len(keys.prefix or '') + sum(map(len, keys.suffixes))
+            else:
+                stored += sum(map(len, keys))
+        else:
+            separators += sum(map(len, node.keys))
+            count += len(node.keys)
+    return stored, separators / max(count, 1)
+
+
+def page_depth(n, leaf_entry, index_entry):
+    """Fanout of a leaf and an index page and the depth of a tree of n keys packed into them."""
+    leaf_fanout = PAGE_SIZE // leaf_entry
+    index_fanout = PAGE_SIZE // index_entry
+    pages = math.ceil(n / leaf_fanout)
+    depth = 0
+    while pages > 1:
+        pages = math.ceil(pages / index_fanout)
+        depth += 1
+    return leaf_fanout, index_fanout, depth
+
+
+def main(n, maximum, tenants):
+    parts = make_keys(n, tenants)
+    random.shuffle(parts)
+    probes = [key_of(*key) for key in random.sample(parts, min(n, 20000))]
+    length = sum(len(key_of(*key)) for key in parts) / n
+    print(f'{n} keys of {length:.1f} characters, maximum {maximum}, {PAGE_SIZE} byte pages')
+    print(f"{'leaves':>10} {'key chars':>10} {'ratio':>6} {'sep len':>8} {'bytes/key':>10} {'lookup us':>10}"
+          f" {'leaf fan':>9} {'index fan':>10} {'depth':>6}")
+    full = None
+    for compress in (False, True):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        tree = BPlusTree(maximum, compress=compress)
+        # Keys are made here, so they are only kept alive by the tree
+        for key in parts:
+            tree[key_of(*key)] = None
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        for key in probes:
+            tree.query(key)
+        lookup = (time.perf_counter() - start) / len(probes)
+
+        stored, separator = shape(tree)
+        full = full or stored
+        fanouts = page_depth(n, math.ceil(stored / n) + 8, math.ceil(separator) + 8)
+        name = 'compressed' if compress else 'plain'
+        print(f'{name:>10} {stored:>10} {full / stored:>6.2f} {separator:>8.1f} {used / n:>10.1f}'
+              f' {lookup * 1e6:>10.2f} {fanouts[0]:>9} {fanouts[1]:>10} {fanouts[2]:>6}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 64,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 50)
@@ -0,0 +1,105 @@
+"""Throughput of ConcurrentBPlusTree (latch crabbing) vs. a BPlusTree behind one global lock.
+
+Every thread runs the same mix of point reads, short scans, inserts and deletes over a preloaded
+tree, and the table reports total operations per second for 1 to N threads. Under the GIL only one
+thread runs Python code at a time, so neither tree scales and the per-node latches mostly add cost;
+the difference to expect there is that readers are never queued behind a writer's whole operation.
+On a free-threaded build (python3.13t and later) the crabbing tree can scale with the threads.
+
+Run from the repository root:
+    python -m benchmarks.bench_concurrent [max threads] [operations per thread] [read fraction]
+"""
+import random
+import sys
+import threading
+import time
+
+from BPlusTree import BPlusTree
+from concurrentBPlusTree import ConcurrentBPlusTree
+
+KEYS = 100000
+SCAN = 50
+
+
+class GlobalLockTree:
+    """BPlusTree with every operation serialized by a single lock, the baseline."""
+
+    def __init__(self, maximum):
+        self.tree = BPlusTree(maximum)
+        self.lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.tree[key] = value
+
+    def query(self, key):
+        with self.lock:
+            return self.tree.query(key)
+
+    def delete(self, key):
+        with self.lock:
+            self.tree.delete(key)
+
+    def range(self, lo, hi):
+        with self.lock:
+            return list(self.tree.range(lo, hi))
+
+
+def preload(tree):
+    for key in range(0, KEYS, 2):
+        tree[key] = key
+
+
+def worker(tree, seed, operations, read_fraction, start):
+    rng = random.Random(seed)
+    start.wait()
+    for _ in range(operations):
+        choice = rng.random()
+        key = rng.randrange(KEYS)
+        if choice < read_fraction * 0.9:
+            tree.query(key)
+        elif choice < read_fraction:
+            list(tree.range(key, key + SCAN))
+        elif choice < (1 + read_fraction) / 2:
+            tree[key] = key
+        else:
+            try:
+                tree.delete(key)
+            except ValueError:
+                pass
+
+
+def run(tree, threads, operations, read_fraction):
+    start = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=worker, args=(tree, seed, operations, read_fraction, start))
+               for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * operations / (time.perf_counter() - began)
+
+
+def main(max_threads, operations, read_fraction):
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f"GIL {'enabled' if gil else 'disabled'}, {read_fraction:.0%} reads")
+    print(f"{'threads':>8} {'global lock ops/s':>18} {'crabbing ops/s':>15} {'pessimistic':>12}")
+    threads = 1
+    while threads <= max_threads:
+        locked = GlobalLockTree(32)
+        preload(locked)
+        crabbing = ConcurrentBPlusTree(32)
+        preload(crabbing)
+        crabbing.pessimistic = 0
+        locked_rate = run(locked, threads, operations, read_fraction)
+        crabbing_rate = run(crabbing, threads, operations, read_fraction)
+        print(f'{threads:>8} {locked_rate:>18.0f} {crabbing_rate:>15.0f} {crabbing.pessimistic:>12}')
+        threads *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 20000,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 0.9)
@@ -0,0 +1,37 @@
+"""Point lookup and insert latency of BPlusTree as the node fanout (``maximum``) grows.
+
+Run from the repository root:
+    python -m benchmarks.bench_fanout [n]
+"""
+import random
+import sys
+import time
+
+from BPlusTree import BPlusTree
+
+FANOUTS = [4, 8, 16, 32, 64, 128, 256, 512]
+
+
+def main(n, lookups=200000):
+    keys = list(range(n))
+    probes = [random.randrange(n) for _ in range(lookups)]
+    shuffled = keys[:]
+    random.shuffle(shuffled)
+    print(f"{'maximum':>8} {'depth':>6} {'query ns/op':>12} {'insert ns/op':>13}")
+    for maximum in FANOUTS:
+        tree = BPlusTree.bulk_load([(key, key) for key in keys], maximum, presorted=True)
+        start = time.perf_counter()
+        for key in probes:
+            tree.query(key)
+        query_ns = (time.perf_counter() - start) / lookups * 1e9
+
+        fresh = BPlusTree(maximum)
+        start = time.perf_counter()
+        for key in shuffled:
+            fresh[key] = key
+        insert_ns = (time.perf_counter() - start) / n * 1e9
+        print(f'{maximum:>8} {tree.depth:>6} {query_ns:>12.0f} {insert_ns:>13.0f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6)
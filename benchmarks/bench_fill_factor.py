@@ -0,0 +1,56 @@
+"""Leaf utilization of BPlusTree under split policies, and before and after reorganize/rebuild.
+
+First inserts n ever-increasing keys (an identity column) with the 'half' and 'append' split
+policies at a few fill factors. Then fragments a tree with random inserts and deletes and compacts
+it with ``reorganize`` and ``rebuild``. Reports leaves, leaf utilization (``stats.fill_factor``),
+depth, bytes per key measured with tracemalloc and the time taken.
+
+Run from the repository root:
+    python -m benchmarks.bench_fill_factor [n] [maximum]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from BPlusTree import BPlusTree
+
+
+def report(name, tree, seconds, used=None):
+    stats = tree.stats
+    used = f'{used / stats.size:.1f}' if used is not None else '-'
+    print(f'{name:>28} {stats.leaves:>8} {stats.fill_factor:>12.1%} {tree.depth:>6} {used:>10} {seconds:>8.3f}')
+
+
+def main(n, maximum):
+    print(f"{'':>28} {'leaves':>8} {'utilization':>12} {'depth':>6} {'bytes/key':>10} {'seconds':>8}")
+    for policy, fill_factor in (('half', 1.0), ('append', 1.0), ('append', 0.9), ('append', 0.7)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        tree = BPlusTree(maximum, fill_factor=fill_factor, split_policy=policy)
+        for i in range(n):
+            tree[i] = None
+        seconds = time.perf_counter() - start
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        report(f'sequential, {policy} {fill_factor:.0%}', tree, seconds, used)
+
+    keys = list(range(n))
+    random.shuffle(keys)
+    tree = BPlusTree(maximum)
+    for key in keys:
+        tree[key] = None
+    report('random inserts', tree, 0)
+    for key in keys[:n * 2 // 3]:
+        tree.delete(key)
+    report('2/3 deleted', tree, 0)
+    for name, compact in (('reorganize', tree.reorganize), ('rebuild 90%', lambda: tree.rebuild(0.9)),
+                          ('rebuild 100%', tree.rebuild)):
+        start = time.perf_counter()
+        compact()
+        report(name, tree, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 64)
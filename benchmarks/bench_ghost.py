@@ -0,0 +1,86 @@
+"""Delete latency and churn throughput of GhostBPlusTree against eager rebalancing in BPlusTree.
+
+Bulk loads n keys to a fill factor, half full by default so leaves sit at the minimum, then runs
+ops operations of churn: each deletes a random live key and inserts a key, so leaves keep draining
+and refilling around the minimum. In the 'random' workload the inserted key is random; in the
+'update' workload it is the key deleted ``lag`` operations earlier, as when rows are updated by a
+delete and an insert. The plain tree rebalances on every delete; the ghost tree only marks a ghost,
+and its ghosts are removed either by an explicit ``cleanup`` every ``batch`` operations or by the
+background cleaner thread. Reports the delete latency (mean, p99 and max), the churn throughput
+including the time spent in cleanup, the number of leaf merges and borrows, and the ghosts left at
+the end.
+
+Run from the repository root:
+    python -m benchmarks.bench_ghost [n] [ops] [maximum] [batch] [fill factor]
+"""
+import random
+import sys
+import time
+from itertools import product
+
+from BPlusTree import BPlusTree
+from ghostBPlusTree import GhostBPlusTree
+
+
+def churn(tree, keys, ops, batch, cleanup, workload, lag=100):
+    """Run the churn and return the delete latencies in seconds and the total elapsed time."""
+    rng = random.Random(5)
+    live, space = list(keys), len(keys) * 2
+    latencies, deleted = [], []
+    start = time.perf_counter()
+    for op in range(1, ops + 1):
+        i = rng.randrange(len(live))
+        key = live[i]
+        live[i] = live[-1]
+        live.pop()
+        begin = time.perf_counter()
+        tree.delete(key)
+        latencies.append(time.perf_counter() - begin)
+        deleted.append(key)
+        if workload == 'random':
+            key = rng.randrange(space)
+        elif len(deleted) > lag:
+            key = deleted[-lag - 1]
+        else:
+            continue
+        inserted, _ = tree.insert(key, key)
+        if inserted:
+            live.append(key)
+        if cleanup and op % batch == 0:
+            tree.cleanup()
+    return latencies, time.perf_counter() - start
+
+
+def rebalances(tree):
+    stats = tree.stats.snapshot()
+    return stats['fusions'] + stats['borrows']
+
+
+def main(n, ops, maximum, batch, fill_factor):
+    keys = random.Random(1).sample(range(n * 2), n)
+    print(f'{n} keys, {ops} delete+insert operations, maximum {maximum}, fill factor {fill_factor},'
+          f' cleanup batch {batch}')
+    print(f"{'workload':>8} {'tree':>18} {'mean us':>8} {'p99 us':>8} {'max us':>8} {'ops/s':>10}"
+          f" {'rebalances':>11} {'ghosts':>7}")
+    for workload, name in product(('random', 'update'), ('eager', 'ghost, explicit', 'ghost, background')):
+        cls = BPlusTree if name == 'eager' else GhostBPlusTree
+        tree = cls.bulk_load(((key, key) for key in sorted(keys)), maximum, fill_factor)
+        if name == 'ghost, background':
+            tree.start_cleaner(batch=batch)
+        latencies, elapsed = churn(tree, keys, ops, batch, name == 'ghost, explicit', workload)
+        if name == 'ghost, background':
+            tree.stop_cleaner()
+        latencies.sort()
+        mean = sum(latencies) / len(latencies)
+        p99 = latencies[int(len(latencies) * 0.99)]
+        ghosts = getattr(tree, 'ghosts', 0)
+        print(f'{workload:>8} {name:>18} {mean * 1e6:>8.2f} {p99 * 1e6:>8.2f} {latencies[-1] * 1e6:>8.1f}'
+              f' {ops / elapsed:>10.0f} {rebalances(tree):>11} {ghosts:>7}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200000,
+         int(sys.argv[3]) if len(sys.argv) > 3 else 16,
+         int(sys.argv[4]) if len(sys.argv) > 4 else 1000,
+         float(sys.argv[5]) if len(sys.argv) > 5 else 0.5)
@@ -0,0 +1,61 @@
+"""insert_many/find_many/remove_many vs. the per-key loop on every hash table.
+
+Inserts n string keys in batches, looks all of them up in batches, then removes them in batches,
+and reports microseconds per key for the per-key methods and for the batch methods. With the
+pure-Python hash functions most of the time goes to hashing, which batching cannot avoid; run it
+with 'builtin' to see the per-call overhead the batch methods save.
+
+Run from the repository root:
+    python -m benchmarks.bench_hash_batch [n] [batch size] [hash function]
+"""
+import random
+import sys
+import time
+
+from hashTableDoubleHashing import HashTableDH
+from hashTableLinearProbing import HashTableLP
+from hashTableSeparateChainingWithLinkedList import HashTable
+from hashTableSeparateChainingWithList import HashTableSC
+
+TABLES = [('HashTable', HashTable, 'insertSC', 'removeSC'), ('HashTableSC', HashTableSC, 'insertSC', 'removeSC'),
+          ('HashTableDH', HashTableDH, 'insertDH', 'removeDH'), ('HashTableLP', HashTableLP, 'insertLP', 'removeLP')]
+
+
+def timed(function, batches):
+    start = time.perf_counter()
+    for batch in batches:
+        function(batch)
+    return (time.perf_counter() - start) / sum(map(len, batches)) * 1e6
+
+
+def per_key(table, insert_name, remove_name, batches, hash_function):
+    ht = table(hash_function=hash_function)
+    insert, remove = getattr(ht, insert_name), getattr(ht, remove_name)
+    return (timed(lambda batch: [insert(key, key) for key in batch], batches),
+            timed(lambda batch: [ht.find(key) for key in batch], batches),
+            timed(lambda batch: [remove(key) for key in batch], batches))
+
+
+def batched(table, batches, hash_function):
+    ht = table(hash_function=hash_function)
+    return (timed(lambda batch: ht.insert_many([(key, key) for key in batch]), batches),
+            timed(ht.find_many, batches),
+            timed(ht.remove_many, batches))
+
+
+def main(n, batch_size, hash_function):
+    keys = ['key' + str(i) for i in range(n)]
+    random.shuffle(keys)
+    batches = [keys[i:i + batch_size] for i in range(0, n, batch_size)]
+    print(f"{'table':>12} {'mode':>8} {'insert us':>10} {'find us':>8} {'remove us':>10}")
+    for name, table, insert_name, remove_name in TABLES:
+        for mode, result in (('per-key', per_key(table, insert_name, remove_name, batches, hash_function)),
+                             ('batch', batched(table, batches, hash_function))):
+            insert, find, remove = result
+            print(f'{name:>12} {mode:>8} {insert:>10.2f} {find:>8.2f} {remove:>10.2f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+         sys.argv[3] if len(sys.argv) > 3 else 'fnv1a')
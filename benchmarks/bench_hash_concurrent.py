@@ -0,0 +1,71 @@
+"""Thread scaling of HashTableStriped for a mixed read/write workload.
+
+Runs 1, 2, 4 ... N threads over one shared table, first with a single stripe (one global lock)
+and then with many, and reports total operations per second, the speedup over one thread and the
+share of lock acquisitions that had to wait for another thread. Many contended acquisitions that
+striping removes point at lock contention; a speedup that stays at or below 1 with hardly any
+contention points at the GIL, which lets only one thread run Python code at a time.
+
+Run from the repository root:
+    python -m benchmarks.bench_hash_concurrent [max threads] [operations per thread] [read fraction] [stripes]
+"""
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hashTableLockStriping import HashTableStriped
+
+KEYS = 50000
+
+
+def worker(ht, seed, operations, read_fraction, start):
+    rng = random.Random(seed)
+    keys = ['key' + str(rng.randrange(KEYS)) for _ in range(operations)]
+    choices = [rng.random() for _ in range(operations)]
+    start.wait()
+    for key, choice in zip(keys, choices):
+        if choice < read_fraction:
+            ht.find(key)
+        elif choice < (1 + read_fraction) / 2:
+            ht.insert(key, choice)
+        else:
+            ht.remove(key)
+
+
+def run(stripes, threads, operations, read_fraction):
+    ht = HashTableStriped(hash_function='builtin', stripes=stripes)
+    ht.insert_many(('key' + str(i), i) for i in range(0, KEYS, 2))
+    ht.contended = [0] * stripes
+    start = threading.Barrier(threads + 1)
+    with ThreadPoolExecutor(threads) as pool:
+        futures = [pool.submit(worker, ht, seed, operations, read_fraction, start) for seed in range(threads)]
+        start.wait()
+        began = time.perf_counter()
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - began
+    writes = threads * operations * (1 - read_fraction)
+    return threads * operations / elapsed, sum(ht.contended) / max(writes, 1)
+
+
+def main(max_threads, operations, read_fraction, stripes):
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f"GIL {'enabled' if gil else 'disabled'}, {read_fraction:.0%} reads")
+    print(f"{'stripes':>8} {'threads':>8} {'ops/s':>10} {'speedup':>8} {'contended':>10}")
+    for stripe_count in (1, stripes):
+        single = None
+        threads = 1
+        while threads <= max_threads:
+            rate, contended = run(stripe_count, threads, operations, read_fraction)
+            single = single or rate
+            print(f'{stripe_count:>8} {threads:>8} {rate:>10.0f} {rate / single:>8.2f} {contended:>10.1%}')
+            threads *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 50000,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 0.8,
+         int(sys.argv[4]) if len(sys.argv) > 4 else 64)
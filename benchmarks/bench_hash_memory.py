@@ -0,0 +1,73 @@
+"""Bytes per entry of the hash table layouts, measured with tracemalloc.
+
+Compares HashTableSC's previous layout (a Python list per bucket holding one Node object with a
+``__dict__`` per entry, reproduced here as ListOfNodesTable) with the current flat arrays, and
+the other tables for reference. Keys and values are created before measuring and shared, so only
+the table structure is counted.
+
+Run from the repository root:
+    python -m benchmarks.bench_hash_memory [n]
+"""
+import sys
+import tracemalloc
+
+from hashFunctions import get_hash_function
+from hashTableDoubleHashing import HashTableDH
+from hashTableLinearProbing import HashTableLP
+from hashTableSeparateChainingWithLinkedList import HashTable
+from hashTableSeparateChainingWithList import HashTableSC
+
+
+class DictNode:
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+# HashTableSC before the flat arrays, grown to the same capacity up front
+class ListOfNodesTable:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buckets = [[] for _ in range(capacity)]
+        self.hash_function = get_hash_function('fnv1a')
+
+    def insertSC(self, key, value):
+        self.buckets[self.hash_function(key) % self.capacity].append(DictNode(key, value))
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return table, used
+
+
+def main(n):
+    keys = ['key' + str(i) for i in range(n)]
+    value = object()
+    capacity = HashTableSC(hash_function='fnv1a').resize.capacity_for(n, 50)
+    layouts = [('HashTableSC before', lambda: ListOfNodesTable(capacity), 'insertSC'),
+               ('HashTableSC', lambda: HashTableSC(hash_function='fnv1a'), 'insertSC'),
+               ('HashTable', lambda: HashTable(hash_function='fnv1a'), 'insertSC'),
+               ('HashTableDH', lambda: HashTableDH(hash_function='fnv1a'), 'insertDH'),
+               ('HashTableLP', lambda: HashTableLP(hash_function='fnv1a'), 'insertLP')]
+    print(f"{'layout':>20} {'bytes/entry':>12}")
+    for name, create, method in layouts:
+        def build():
+            table = create()
+            insert = getattr(table, method)
+            for key in keys:
+                insert(key, value)
+            if hasattr(table, 'finish_resize'):
+                table.finish_resize()
+            return table
+
+        table, used = measure(build)
+        print(f'{name:>20} {used / n:>12.1f}')
+        del table
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5)
@@ -0,0 +1,52 @@
+"""Import time and peak RSS of the index modules, each measured in a fresh interpreter.
+
+Also lists third-party modules pulled in by the import; importing the index modules should pull in none.
+
+Run from the repository root:
+    python -m benchmarks.bench_import [module ...]
+"""
+import json
+import subprocess
+import sys
+
+MODULES = ['BPlusTree', 'pagedBPlusTree', 'hashTableSeparateChainingWithLinkedList',
+           'hashTableSeparateChainingWithList', 'hashTableDoubleHashing', 'BPlusTreePlot']
+
+PROBE = '''
+import json, resource, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+    error = None
+except ImportError as e:
+    error = str(e)
+seconds = time.perf_counter() - start
+third_party = sorted({name.split('.')[0] for name in set(sys.modules) - before} - set(sys.stdlib_module_names)
+                     - {sys.argv[1]} - set(sys.argv[2:]))
+print(json.dumps({'seconds': seconds, 'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'third_party': third_party, 'error': error}))
+'''
+
+
+def measure(module):
+    output = subprocess.run([sys.executable, '-c', PROBE, module] + MODULES, capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output)
+
+
+def main(modules, repeat=5):
+    baseline = min(measure('sys')['maxrss_kb'] for _ in range(repeat))
+    print(f"{'module':>42} {'import ms':>10} {'RSS +KB':>8}  third-party modules")
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['seconds'])
+        if best['error']:
+            print(f'{module:>42} {"-":>10} {"-":>8}  {best["error"]}')
+            continue
+        print(f"{module:>42} {best['seconds'] * 1000:>10.2f} {best['maxrss_kb'] - baseline:>8}  "
+              f"{', '.join(best['third_party']) or '-'}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or MODULES)
@@ -0,0 +1,53 @@
+"""Ingest throughput: BPlusTree.readfile against the external merge sort pipeline of BPlusTree.ingest.
+
+Writes n "key value" lines in random key order to a temporary file, then loads it with
+``readfile`` (one insert per line, progress to a callback) and with ``ingest`` parsing in this
+process and in process pools of growing size, and reports rows per second and the number of
+sorted runs spilled.
+
+Run from the repository root:
+    python -m benchmarks.bench_ingest [n] [maximum] [chunk MiB] [max workers]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from BPlusTree import BPlusTree
+
+
+def main(n, maximum, chunk_mib, max_workers):
+    chunk_size = int(chunk_mib * 2 ** 20)
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.txt')
+        keys = list(range(n))
+        random.shuffle(keys)
+        with open(source, 'w') as file:
+            file.writelines(f'key{k:09d} value of {k}\n' for k in keys)
+        print(f'{n} rows, {os.path.getsize(source) / 2 ** 20:.1f} MiB, {chunk_mib} MiB chunks')
+        print(f"{'method':>12} {'workers':>8} {'runs':>6} {'seconds':>8} {'rows/s':>10}")
+
+        start = time.perf_counter()
+        with open(source, 'rb') as file:
+            BPlusTree(maximum).readfile(file, progress=lambda rows: None)
+        elapsed = time.perf_counter() - start
+        print(f"{'readfile':>12} {'-':>8} {'-':>6} {elapsed:>8.2f} {n / elapsed:>10.0f}")
+
+        workers = 0
+        while workers <= max_workers:
+            runs = []
+            start = time.perf_counter()
+            with open(source, 'rb') as file:
+                BPlusTree.ingest(file, maximum, chunk_size, workers,
+                                 progress=lambda stage, rows: runs.append(stage) if stage == 'parse' else None)
+            elapsed = time.perf_counter() - start
+            print(f"{'ingest':>12} {workers:>8} {len(runs):>6} {elapsed:>8.2f} {n / elapsed:>10.0f}")
+            workers = workers * 2 or 1
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 64,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 4,
+         int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count() or 1)
@@ -0,0 +1,65 @@
+"""Bytes per key of BPlusTree node layouts, measured with tracemalloc.
+
+Compares nodes with a per-object ``__dict__`` (the layout before ``__slots__``), the current
+``__slots__`` nodes, and leaves with ``array('q')`` keys. Values are shared, so only the tree
+structure is measured.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory [n]
+"""
+import random
+import sys
+import tracemalloc
+
+from BPlusTree import BPlusTree, Node, Leaf
+
+
+class DictNode(Node):
+    pass
+
+
+class DictLeaf(Leaf):
+    pass
+
+
+class DictTree(BPlusTree):
+    node_type = DictNode
+    leaf_type = DictLeaf
+
+
+LAYOUTS = [('__dict__', DictTree, {}), ('__slots__', BPlusTree, {}), ('slots + array', BPlusTree, {'typecode': 'q'})]
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tree = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return tree, used
+
+
+def main(n, maximum=64):
+    # Keys are computed inside each build, so the int objects are only kept alive by the tree
+    base = 10 ** 6
+    order = list(range(n))
+    random.shuffle(order)
+    print(f"{'layout':>14} {'build':>7} {'bytes/key':>10}")
+    for name, cls, kwargs in LAYOUTS:
+        def inserted():
+            tree = cls(maximum, **kwargs)
+            for i in order:
+                tree[base + i] = None
+            return tree
+
+        def bulk():
+            return cls.bulk_load(((base + i, None) for i in range(n)), maximum, presorted=True, **kwargs)
+
+        for build, label in ((inserted, 'insert'), (bulk, 'bulk')):
+            tree, used = measure(build)
+            print(f'{name:>14} {label:>7} {used / n:>10.1f}')
+            del tree
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6)
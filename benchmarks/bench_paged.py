@@ -0,0 +1,44 @@
+"""Page reads, writes and buffer pool hit rate of PagedBPlusTree for different pool sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench_paged [n]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from pagedBPlusTree import PagedBPlusTree
+
+POOL_SIZES = [16, 64, 256, 1024, 4096]
+
+
+def main(n, maximum=64, lookups=50000):
+    keys = list(range(n))
+    random.shuffle(keys)
+    probes = [random.randrange(n) for _ in range(lookups)]
+    print(f"{'pool':>6} {'phase':>7} {'seconds':>8} {'reads':>8} {'writes':>8} {'hit rate':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for pool_size in POOL_SIZES:
+            path = os.path.join(directory, f'{pool_size}.pages')
+            with PagedBPlusTree(path, maximum, pool_size=pool_size) as tree:
+                start = time.perf_counter()
+                for key in keys:
+                    tree[key] = str(key)
+                tree.flush()
+                report(pool_size, 'insert', time.perf_counter() - start, tree.pool)
+
+            with PagedBPlusTree(path, pool_size=pool_size) as tree:
+                start = time.perf_counter()
+                for key in probes:
+                    tree.query(key)
+                report(pool_size, 'query', time.perf_counter() - start, tree.pool)
+
+
+def report(pool_size, phase, seconds, pool):
+    print(f'{pool_size:>6} {phase:>7} {seconds:>8.3f} {pool.reads:>8} {pool.writes:>8} {pool.hit_rate:>9.1%}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5)
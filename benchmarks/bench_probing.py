@@ -0,0 +1,46 @@
+"""Head-to-head of the hash tables: chaining, double hashing and Robin Hood linear probing.
+
+Inserts n string keys into each table, then looks up every key (hits) and n keys that were never
+inserted (misses), and reports microseconds per operation. For the open-addressing tables it also
+prints the probe length statistics.
+
+Run from the repository root:
+    python -m benchmarks.bench_probing [n]
+"""
+import sys
+import time
+
+from hashTableDoubleHashing import HashTableDH
+from hashTableLinearProbing import HashTableLP
+from hashTableSeparateChainingWithLinkedList import HashTable
+from hashTableSeparateChainingWithList import HashTableSC
+
+TABLES = [('HashTable', HashTable, 'insertSC'), ('HashTableSC', HashTableSC, 'insertSC'),
+          ('HashTableDH', HashTableDH, 'insertDH'), ('HashTableLP', HashTableLP, 'insertLP')]
+
+
+def us_per_op(function, keys, *args):
+    start = time.perf_counter()
+    for key in keys:
+        function(key, *args)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main(n):
+    keys = ['key' + str(i) for i in range(n)]
+    missing = ['miss' + str(i) for i in range(n)]
+    print(f"{'table':>12} {'insert us':>10} {'hit us':>8} {'miss us':>8} {'capacity':>9}")
+    for name, table, method in TABLES:
+        ht = table(hash_function='fnv1a')
+        insert = us_per_op(getattr(ht, method), keys, None)
+        hit = us_per_op(ht.find, keys)
+        miss = us_per_op(ht.find, missing)
+        print(f'{name:>12} {insert:>10.2f} {hit:>8.2f} {miss:>8.2f} {ht.capacity:>9}')
+        if hasattr(ht, 'probe_stats'):
+            stats = ht.probe_stats()
+            print(f"{'':>12} average probe length {stats['average_probe_length']:.2f}, "
+                  f"max {stats['max_probe_length']}, {stats['probes_per_operation']:.2f} slots per operation")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5)
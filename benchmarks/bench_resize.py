@@ -0,0 +1,54 @@
+"""Insert latency of the hash tables with incremental resizing.
+
+Inserts n string keys into each table starting from the default capacity, once with the default
+rehash_step and once with a rehash_step so large that every resize moves all buckets in the insert
+that triggers it (the stop-the-world rehash). Reports total time, p99 and worst single-insert
+latency, the number of grows and the longest resize (for the incremental runs that is the sum of
+the steps it was spread over). The garbage collector is off while timing so its pauses do not
+hide the rehash stalls.
+
+Run from the repository root:
+    python -m benchmarks.bench_resize [n]
+"""
+import gc
+import sys
+import time
+
+from hashTableDoubleHashing import HashTableDH
+from hashTableSeparateChainingWithLinkedList import HashTable
+from hashTableSeparateChainingWithList import HashTableSC
+
+TABLES = [('HashTable', HashTable, 'insertSC'), ('HashTableSC', HashTableSC, 'insertSC'),
+          ('HashTableDH', HashTableDH, 'insertDH')]
+
+
+def run(table, method, keys, rehash_step):
+    ht = table(hash_function='fnv1a', rehash_step=rehash_step)
+    insert = getattr(ht, method)
+    latencies = []
+    clock = time.perf_counter
+    gc.disable()
+    try:
+        for key in keys:
+            start = clock()
+            insert(key, key)
+            latencies.append(clock() - start)
+    finally:
+        gc.enable()
+    latencies.sort()
+    return sum(latencies), latencies[int(len(latencies) * 0.99)], latencies[-1], ht.resize
+
+
+def main(n):
+    keys = ['key' + str(i) for i in range(n)]
+    print(f"{'table':>12} {'rehash':>8} {'total s':>8} {'p99 us':>8} {'max us':>9} {'grows':>6} {'max resize ms':>14}")
+    for name, table, method in TABLES:
+        for label, rehash_step in (('4', 4), ('all', 1 << 62)):
+            total, p99, worst, resize = run(table, method, keys, rehash_step)
+            longest = max(resize.resize_times, default=0.0)
+            print(f'{name:>12} {label:>8} {total:>8.2f} {p99 * 1e6:>8.1f} {worst * 1e6:>9.0f} '
+                  f'{resize.grows:>6} {longest * 1e3:>14.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5)
@@ -0,0 +1,83 @@
+"""Warm restart: loading a snapshot vs. rebuilding an index from its source file.
+
+Writes n "key value" lines to a temporary file, rebuilds a BPlusTree from it with ``readfile`` and a
+HashTableSC with one insert per line, then times ``save`` and ``load`` (eager and lazy) of both and
+a pickle round trip of the tree, which has to raise the recursion limit to get through the
+parent/prev/next references.
+
+Run from the repository root:
+    python -m benchmarks.bench_snapshot [n] [maximum]
+"""
+import contextlib
+import io
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+from BPlusTree import BPlusTree
+from hashTableSeparateChainingWithList import HashTableSC
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def rebuild_table(path):
+    ht = HashTableSC(hash_function='fnv1a')
+    with open(path, 'rb') as file:
+        for line in file:
+            key, value = line.decode().split(maxsplit=1)
+            ht.insertSC(key, value)
+    return ht
+
+
+def main(n, maximum):
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source.txt')
+        keys = list(range(n))
+        random.shuffle(keys)
+        with open(source, 'w') as file:
+            file.writelines(f'key{k:09d} value of {k}\n' for k in keys)
+
+        def rebuild_tree():
+            tree = BPlusTree(maximum)
+            # readfile reports its progress on stdout
+            with open(source, 'rb') as file, contextlib.redirect_stdout(io.StringIO()):
+                tree.readfile(file)
+            return tree
+
+        snapshot = os.path.join(directory, 'index.snap')
+        tree, rebuild = timed(rebuild_tree)
+        _, save = timed(lambda: tree.save(snapshot))
+        size = os.path.getsize(snapshot)
+        _, load = timed(lambda: BPlusTree.load(snapshot))
+        lazy_tree, lazy = timed(lambda: BPlusTree.load(snapshot, lazy=True))
+        print(f'{n} keys, source {os.path.getsize(source) / 2 ** 20:.1f} MiB, snapshot {size / 2 ** 20:.1f} MiB')
+        print(f"{'index':>12} {'rebuild s':>10} {'save s':>8} {'load s':>8} {'lazy load s':>12} {'pickle s':>9}")
+
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 100000))
+        try:
+            _, pickled = timed(lambda: pickle.loads(pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)))
+            pickled = f'{pickled:.3f}'
+        except RecursionError:
+            pickled = 'recursion'
+        finally:
+            sys.setrecursionlimit(limit)
+        print(f"{'BPlusTree':>12} {rebuild:>10.3f} {save:>8.3f} {load:>8.3f} {lazy:>12.3f} {pickled:>9}")
+        del lazy_tree
+
+        ht, rebuild = timed(lambda: rebuild_table(source))
+        _, save = timed(lambda: ht.save(snapshot))
+        _, load = timed(lambda: HashTableSC.load(snapshot, hash_function='fnv1a'))
+        print(f"{'HashTableSC':>12} {rebuild:>10.3f} {save:>8.3f} {load:>8.3f} {'':>12} {'':>9}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 64)
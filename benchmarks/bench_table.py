@@ -0,0 +1,81 @@
+"""Access paths of a Table: hash lookup, tree range scan (covering or not) and full scan.
+
+Builds a table of n rows with a hash index and a tree index on ``customer`` and a tree index on
+``amount`` that includes ``status``, then times the same equality and range queries through every
+access path that can answer them, and one row per insert against one insert_many for the index
+maintenance of loading the table.
+
+Run from the repository root:
+    python -m benchmarks.bench_table [n] [queries]
+"""
+import random
+import sys
+import time
+
+from table import Table, SCAN
+
+COLUMNS = ['id', 'customer', 'amount', 'status', 'note']
+STATUSES = ['open', 'paid', 'shipped', 'closed']
+
+
+def make_rows(n):
+    rng = random.Random(1)
+    return [(i, rng.randrange(n // 10 or 1), rng.randrange(100000), rng.choice(STATUSES), f'order {i}')
+            for i in range(n)]
+
+
+def build(rows, batched):
+    table = Table(COLUMNS)
+    table.create_index('customer_hash', 'customer', 'hash')
+    table.create_index('customer_tree', 'customer')
+    table.create_index('amount', 'amount', include=['status'])
+    start = time.perf_counter()
+    if batched:
+        table.insert_many(rows)
+    else:
+        for row in rows:
+            table.insert(row)
+    return table, time.perf_counter() - start
+
+
+def timed(table, queries, columns, index):
+    start = time.perf_counter()
+    found = sum(len(table.select(where, columns, index)) for where in queries)
+    return (time.perf_counter() - start) / len(queries), found / len(queries)
+
+
+def main(n, count):
+    rows = make_rows(n)
+    rng = random.Random(2)
+    _, single = build(rows, False)
+    table, batched = build(rows, True)
+    print(f'{n} rows, 3 indexes: insert per row {single:.3f} s, insert_many {batched:.3f} s')
+
+    equality = [[('customer', '=', rng.randrange(n // 10 or 1))] for _ in range(count)]
+    ranges = []
+    for _ in range(count):
+        low = rng.randrange(99000)
+        ranges.append([('amount', 'between', (low, low + 1000))])
+    cases = [
+        ('customer =', equality, None, ['customer_hash', 'customer_tree', SCAN]),
+        ('amount between', ranges, None, ['amount', SCAN]),
+        ('amount between, status', ranges, ['amount', 'status'], ['amount', SCAN]),
+    ]
+    print(f"{'query':>24} {'path':>8} {'index':>14} {'covering':>9} {'rows':>7} {'ms/query':>9}")
+    for name, queries, columns, hints in cases:
+        chosen = table.plan(queries[0], columns).index
+        for hint in hints:
+            plan = table.plan(queries[0], columns, hint)
+            # A full scan is much slower; a few queries are enough
+            sample = queries[:max(1, count // 20)] if plan.access == SCAN else queries
+            seconds, found = timed(table, sample, columns, hint)
+            label = plan.index.name if plan.index else '-'
+            if plan.index is not None and plan.index is chosen:
+                label += '*'
+            print(f'{name:>24} {plan.access:>8} {label:>14} {str(plan.covering):>9} {found:>7.1f} {seconds * 1000:>9.3f}')
+    print('* chosen by the planner')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 200)
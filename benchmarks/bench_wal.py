@@ -0,0 +1,55 @@
+"""Insert throughput of LoggedBPlusTree at each durability level, with 1 and several threads.
+
+'commit' fsyncs before every insert returns, but concurrent inserts share one fsync (group commit),
+so its throughput grows with the number of threads; 'batch' and 'interval' only fsync every
+batch_size records or every interval seconds. The in-memory BPlusTree is the ceiling.
+
+Run from the repository root:
+    python -m benchmarks.bench_wal [inserts] [threads]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from BPlusTree import BPlusTree
+from loggedBPlusTree import DURABILITY, LoggedBPlusTree
+
+
+def run(tree, n, threads):
+    start = threading.Barrier(threads + 1)
+
+    def insert(first):
+        start.wait()
+        for key in range(first, n, threads):
+            tree[key] = key
+
+    workers = [threading.Thread(target=insert, args=(first,)) for first in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return n / (time.perf_counter() - began)
+
+
+def main(n, threads):
+    print(f"{'durability':>10} {'threads':>8} {'inserts/s':>10} {'fsyncs':>7} {'records/fsync':>14}")
+    for thread_count in sorted({1, threads}):
+        rate = run(BPlusTree(32), n, thread_count)
+        print(f"{'none':>10} {thread_count:>8} {rate:>10.0f} {0:>7} {'':>14}")
+        for durability in DURABILITY:
+            with tempfile.TemporaryDirectory() as directory:
+                tree = LoggedBPlusTree(os.path.join(directory, 'index.ckpt'), 32, durability)
+                rate = run(tree, n, thread_count)
+                tree.close()
+                stats = tree.log.stats()
+                print(f"{durability:>10} {thread_count:>8} {rate:>10.0f} {stats['syncs']:>7} "
+                      f"{stats['records_per_sync']:>14.1f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,381 @@
+"""YCSB-style workload benchmark across all index structures, with JSON output and run comparison.
+
+Every run loads ``size`` records (keys 0 .. size - 1, in random order) into a fresh structure and
+then executes ``operations`` operations of a workload mix, with the keys of the operations drawn
+from a distribution over the live records:
+
+    read_heavy     95% read, 5% update                    (YCSB B)
+    write_heavy    20% read, 40% update, 40% insert
+    scan_heavy     95% scan of 1-100 records, 5% insert   (YCSB E; ordered structures only)
+    delete_churn   40% read, 30% insert, 30% delete
+
+    uniform        every live record equally likely
+    zipfian        YCSB's scrambled Zipfian with constant 0.99: a few hot records, spread over the keyspace
+    sequential     walks the live records in key order, wrapping around
+
+Each result reports throughput, p50/p99 latency, load time, the peak traced memory of a separate
+load under tracemalloc, and the structure's own counters (tree statistics, resize and probe
+statistics, buffer pool statistics).
+
+Run from the repository root:
+    python -m benchmarks.bench_workloads run [--structures ...] [--workloads ...] [--distributions ...]
+        [--sizes 1000 10000 ...] [--operations n] [--seed n] [--no-memory] [--output run.json]
+    python -m benchmarks.bench_workloads compare base.json new.json [--threshold 0.1]
+
+``compare`` matches results by structure, workload, distribution and size, prints the change in
+throughput and p99 latency, and exits with status 1 if any of them regressed by more than the
+threshold.
+"""
+import argparse
+import bisect
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+from BPlusTree import BPlusTree
+from hashTableDoubleHashing import HashTableDH
+from hashTableLinearProbing import HashTableLP
+from hashTableSeparateChainingWithLinkedList import HashTable
+from hashTableSeparateChainingWithList import HashTableSC
+from pagedBPlusTree import PagedBPlusTree
+
+WORKLOADS = {
+    'read_heavy': {'read': 0.95, 'update': 0.05},
+    'write_heavy': {'read': 0.2, 'update': 0.4, 'insert': 0.4},
+    'scan_heavy': {'scan': 0.95, 'insert': 0.05},
+    'delete_churn': {'read': 0.4, 'insert': 0.3, 'delete': 0.3},
+}
+MAX_SCAN = 100
+
+
+class TreeAdapter:
+    ordered = True
+
+    def __init__(self, maximum=64, **kwargs):
+        self.index = BPlusTree(maximum)
+
+    def read(self, key):
+        return self.index.query(key)
+
+    def update(self, key, value):
+        self.index[key] = value
+
+    insert = update
+
+    def delete(self, key):
+        self.index.delete(key)
+
+    def scan(self, key, count):
+        scanned = 0
+        for _ in self.index.range(key):
+            scanned += 1
+            if scanned == count:
+                break
+        return scanned
+
+    def counters(self):
+        return self.index.stats.snapshot()
+
+    def close(self):
+        pass
+
+
+class PagedTreeAdapter(TreeAdapter):
+    def __init__(self, maximum=64, pool_size=256, **kwargs):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = PagedBPlusTree(os.path.join(self.directory.name, 'index.bpt'), maximum, pool_size)
+
+    def counters(self):
+        return dict(self.index.stats.snapshot(), pool=self.index.pool.stats())
+
+    def close(self):
+        self.index.close()
+        self.directory.cleanup()
+
+
+class HashAdapter:
+    ordered = False
+
+    def __init__(self, table, hash_function='fnv1a', **kwargs):
+        self.index = table(hash_function=hash_function)
+
+    def read(self, key):
+        return self.index.find(key)
+
+    def update(self, key, value):
+        # The chaining tables keep duplicate keys, so an update replaces the entry
+        if isinstance(self.index, (HashTable, HashTableSC)):
+            self.index.remove(key)
+        self.index.insert(key, value)
+
+    def insert(self, key, value):
+        self.index.insert(key, value)
+
+    def delete(self, key):
+        self.index.remove(key)
+
+    def scan(self, key, count):
+        raise NotImplementedError
+
+    def counters(self):
+        resize = self.index.resize.stats()
+        times = resize.pop('resize_times')
+        resize['max_resize_seconds'] = max(times, default=0.0)
+        resize['total_resize_seconds'] = sum(times)
+        counters = {'size': len(self.index), 'capacity': self.index.capacity, 'resize': resize}
+        if hasattr(self.index, 'probe_stats'):
+            counters['probes'] = self.index.probe_stats()
+        return counters
+
+    def close(self):
+        pass
+
+
+STRUCTURES = {
+    'BPlusTree': TreeAdapter,
+    'PagedBPlusTree': PagedTreeAdapter,
+    'HashTable': partial(HashAdapter, HashTable),
+    'HashTableSC': partial(HashAdapter, HashTableSC),
+    'HashTableDH': partial(HashAdapter, HashTableDH),
+    'HashTableLP': partial(HashAdapter, HashTableLP),
+}
+
+
+# YCSB's Zipfian generator (Gray et al., "Quickly generating billion-record synthetic databases")
+# over ranks 0 .. n - 1, with zeta(n) summed exactly up to 10 ** 5 and approximated by its integral
+# beyond that, so setting up a 10 ** 7 record run stays fast
+class Zipfian:
+    def __init__(self, n, rng, theta=0.99):
+        self.n = n
+        self.rng = rng
+        self.theta = theta
+        exact = min(n, 10 ** 5)
+        zeta = sum(1 / i ** theta for i in range(1, exact + 1))
+        if n > exact:
+            zeta += (n ** (1 - theta) - exact ** (1 - theta)) / (1 - theta)
+        self.zetan = zeta
+        self.alpha = 1 / (1 - theta)
+        self.eta = (1 - (2 / n) ** (1 - theta)) / (1 - (1 + 0.5 ** theta) / zeta)
+
+    def next(self):
+        u = self.rng.random()
+        uz = u * self.zetan
+        if uz < 1:
+            return 0
+        if uz < 1 + 0.5 ** self.theta:
+            return 1
+        return int(self.n * (self.eta * u - self.eta + 1) ** self.alpha)
+
+
+# The live records, with O(1) random choice, append and removal, and an ordered view for the
+# sequential distribution
+class Records:
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.ordered = sorted(self.keys)
+        self.cursor = 0
+        self.next_key = len(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self):
+        key = self.next_key
+        self.next_key += 1
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+        # New keys are the largest so far
+        self.ordered.append(key)
+        return key
+
+    def remove(self, key):
+        i = self.positions.pop(key)
+        last = self.keys.pop()
+        if last != key:
+            self.keys[i] = last
+            self.positions[last] = i
+        del self.ordered[bisect.bisect_left(self.ordered, key)]
+
+    def sequential(self):
+        if self.cursor >= len(self.ordered):
+            self.cursor = 0
+        key = self.ordered[self.cursor]
+        self.cursor += 1
+        return key
+
+
+def chooser(distribution, records, rng, size):
+    if distribution == 'uniform':
+        return lambda: records.keys[rng.randrange(len(records))]
+    if distribution == 'sequential':
+        return records.sequential
+    if distribution == 'zipfian':
+        zipfian = Zipfian(max(size, 2), rng)
+        # Scramble the ranks so the hot records are spread over the keyspace
+        return lambda: records.keys[(zipfian.next() * 0x9E3779B97F4A7C15 >> 7) % len(records)]
+    raise ValueError(f'unknown distribution {distribution!r}')
+
+
+def load(structure, size, rng, options):
+    adapter = STRUCTURES[structure](**options)
+    keys = list(range(size))
+    rng.shuffle(keys)
+    start = time.perf_counter()
+    for key in keys:
+        adapter.insert(key, key)
+    return adapter, time.perf_counter() - start
+
+
+def peak_memory(structure, size, seed, options):
+    gc.collect()
+    tracemalloc.start()
+    adapter, _ = load(structure, size, random.Random(seed), options)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    adapter.close()
+    return peak
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_one(structure, workload, distribution, size, operations, seed, memory, options):
+    rng = random.Random(seed)
+    adapter, load_seconds = load(structure, size, rng, options)
+    records = Records(range(size))
+    choose = chooser(distribution, records, rng, size)
+    mix = WORKLOADS[workload]
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=operations)
+    latencies = []
+    clock = time.perf_counter_ns
+    for kind in kinds:
+        if kind == 'insert':
+            key = records.add()
+            start = clock()
+            adapter.insert(key, key)
+        elif kind == 'delete':
+            if len(records) <= 1:
+                continue
+            key = choose()
+            records.remove(key)
+            start = clock()
+            adapter.delete(key)
+        elif kind == 'scan':
+            key, count = choose(), rng.randint(1, MAX_SCAN)
+            start = clock()
+            adapter.scan(key, count)
+        elif kind == 'update':
+            key = choose()
+            start = clock()
+            adapter.update(key, -key)
+        else:
+            key = choose()
+            start = clock()
+            adapter.read(key)
+        latencies.append(clock() - start)
+    total = sum(latencies) / 1e9
+    latencies.sort()
+    result = {'structure': structure, 'workload': workload, 'distribution': distribution, 'size': size,
+              'operations': len(latencies), 'throughput': len(latencies) / total if total else 0.0,
+              'p50_us': percentile(latencies, 0.5) / 1e3, 'p99_us': percentile(latencies, 0.99) / 1e3,
+              'load_seconds': load_seconds, 'counters': adapter.counters()}
+    adapter.close()
+    if memory:
+        result['peak_memory_bytes'] = peak_memory(structure, size, seed, options)
+    return result
+
+
+def run(args):
+    options = {'maximum': args.maximum, 'pool_size': args.pool_size, 'hash_function': args.hash_function}
+    results = []
+    print(f"{'structure':>15} {'workload':>13} {'distribution':>12} {'size':>9} {'ops/s':>10} "
+          f"{'p50 us':>8} {'p99 us':>8} {'peak MB':>8}", file=sys.stderr)
+    for size in args.sizes:
+        for structure in args.structures:
+            for workload in args.workloads:
+                factory = STRUCTURES[structure]
+                if 'scan' in WORKLOADS[workload] and not getattr(factory, 'func', factory).ordered:
+                    continue
+                for distribution in args.distributions:
+                    result = run_one(structure, workload, distribution, size, args.operations, args.seed,
+                                     args.memory, options)
+                    results.append(result)
+                    memory = result.get('peak_memory_bytes')
+                    print(f"{structure:>15} {workload:>13} {distribution:>12} {size:>9} {result['throughput']:>10.0f} "
+                          f"{result['p50_us']:>8.1f} {result['p99_us']:>8.1f} "
+                          f"{'-' if memory is None else f'{memory / 2 ** 20:.1f}':>8}", file=sys.stderr)
+    report = {'meta': {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+                       'machine': platform.machine(), 'system': platform.system(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': args.seed,
+                       'operations': args.operations, 'options': options},
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+def compare(args):
+    with open(args.base) as file:
+        base = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+    identity = lambda result: (result['structure'], result['workload'], result['distribution'], result['size'])
+    previous = {identity(result): result for result in base['results']}
+    regressions = 0
+    print(f"{'structure':>15} {'workload':>13} {'distribution':>12} {'size':>9} {'ops/s':>8} {'p99':>8}")
+    for result in new['results']:
+        old = previous.get(identity(result))
+        if old is None:
+            continue
+        throughput = result['throughput'] / old['throughput'] - 1 if old['throughput'] else 0.0
+        p99 = result['p99_us'] / old['p99_us'] - 1 if old['p99_us'] else 0.0
+        regressed = throughput < -args.threshold or p99 > args.threshold
+        regressions += regressed
+        print(f"{result['structure']:>15} {result['workload']:>13} {result['distribution']:>12} "
+              f"{result['size']:>9} {throughput:>+8.1%} {p99:>+8.1%}{'  REGRESSION' if regressed else ''}")
+    print(f'{regressions} regression(s) beyond {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_workloads',
+                                     description='YCSB-style workloads across the index structures')
+    commands = parser.add_subparsers(dest='command', required=True)
+    runner = commands.add_parser('run', help='run workloads and report JSON')
+    runner.add_argument('--structures', nargs='+', choices=list(STRUCTURES), default=list(STRUCTURES))
+    runner.add_argument('--workloads', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS))
+    runner.add_argument('--distributions', nargs='+', choices=['uniform', 'zipfian', 'sequential'],
+                        default=['uniform', 'zipfian', 'sequential'])
+    runner.add_argument('--sizes', nargs='+', type=int, default=[10 ** 3, 10 ** 4, 10 ** 5])
+    runner.add_argument('--operations', type=int, default=10 ** 4)
+    runner.add_argument('--seed', type=int, default=42)
+    runner.add_argument('--maximum', type=int, default=64, help='B+ tree fanout')
+    runner.add_argument('--pool-size', type=int, default=256, help='PagedBPlusTree buffer pool pages')
+    runner.add_argument('--hash-function', default='fnv1a')
+    runner.add_argument('--no-memory', dest='memory', action='store_false', help='skip the tracemalloc load')
+    runner.add_argument('--output', help='write the JSON report here instead of stdout')
+    comparer = commands.add_parser('compare', help='compare two JSON reports')
+    comparer.add_argument('base')
+    comparer.add_argument('new')
+    comparer.add_argument('--threshold', type=float, default=0.1, help='relative change that counts as a regression')
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return compare(args)
+    run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
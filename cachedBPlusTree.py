@@ -0,0 +1,239 @@
+from collections import OrderedDict
+
+from BPlusTree import BPlusTree, Leaf
+
+CACHE_POLICIES = ('lru', 'clock')
+
+
+class _Sentinel(object):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+MISS = _Sentinel('MISS')  # the key is not cached
+ABSENT = _Sentinel('ABSENT')  # cached: the key is not in the tree
+
+
+class LookupCache(object):
+    """Size-bounded map from keys to the values found for them, ``ABSENT`` for keys not in the tree.
+    Attributes:
+        capacity: the most entries held
+        hits, misses: lookups answered by the cache or not
+        evictions: entries dropped to stay within ``capacity``
+        invalidations: cached entries updated or dropped because the tree changed
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity if capacity > 1 else 1
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'invalidations': self.invalidations, 'hit_rate': self.hit_rate, 'resident': len(self),
+                'capacity': self.capacity}
+
+
+class LRUCache(LookupCache):
+    """Evicts the least recently used entry, kept in the order of an OrderedDict."""
+
+    def __init__(self, capacity):
+        super(LRUCache, self).__init__(capacity)
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the cached value of the key, ``MISS`` if it is not cached."""
+        value = self.entries.get(key, MISS)
+        if value is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+        entries[key] = value
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def refresh(self, key, value):
+        """Replace the value of the key if it is cached, without making it more recent."""
+        if key in self.entries:
+            self.entries[key] = value
+            self.invalidations += 1
+
+    def discard(self, key):
+        if self.entries.pop(key, MISS) is not MISS:
+            self.invalidations += 1
+
+    def clear(self):
+        self.entries.clear()
+
+
+class ClockCache(LookupCache):
+    """Second-chance eviction: entries sit in a ring of slots with a referenced bit set by each hit.
+    The hand clears set bits as it sweeps and evicts the first entry whose bit is already clear, so a
+    hit costs a dict lookup and a store instead of relinking a list."""
+
+    def __init__(self, capacity):
+        super(ClockCache, self).__init__(capacity)
+        self.slots = {}
+        self.keys = []
+        self.values = []
+        self.referenced = bytearray()
+        self.free = []
+        self.hand = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, key):
+        """Return the cached value of the key, ``MISS`` if it is not cached."""
+        i = self.slots.get(key)
+        if i is None:
+            self.misses += 1
+            return MISS
+        self.hits += 1
+        self.referenced[i] = 1
+        return self.values[i]
+
+    def put(self, key, value):
+        i = self.slots.get(key)
+        if i is not None:
+            self.values[i] = value
+            self.referenced[i] = 1
+            return
+        if self.free:
+            i = self.free.pop()
+        elif len(self.keys) < self.capacity:
+            i = len(self.keys)
+            self.keys.append(None)
+            self.values.append(None)
+            self.referenced.append(0)
+        else:
+            # Every slot is in use, as freed slots are reused first
+            referenced, hand = self.referenced, self.hand
+            while referenced[hand]:
+                referenced[hand] = 0
+                hand = hand + 1 if hand + 1 < self.capacity else 0
+            i = hand
+            self.hand = hand + 1 if hand + 1 < self.capacity else 0
+            del self.slots[self.keys[i]]
+            self.evictions += 1
+        self.slots[key] = i
+        self.keys[i] = key
+        self.values[i] = value
+        self.referenced[i] = 0
+
+    def refresh(self, key, value):
+        """Replace the value of the key if it is cached, leaving its referenced bit alone."""
+        i = self.slots.get(key)
+        if i is not None:
+            self.values[i] = value
+            self.invalidations += 1
+
+    def discard(self, key):
+        i = self.slots.pop(key, None)
+        if i is not None:
+            self.keys[i] = self.values[i] = None
+            self.referenced[i] = 0
+            self.free.append(i)
+            self.invalidations += 1
+
+    def clear(self):
+        self.slots.clear()
+        self.keys.clear()
+        self.values.clear()
+        self.referenced = bytearray()
+        self.free.clear()
+        self.hand = 0
+
+
+class CachedBPlusTree(BPlusTree):
+    """B+ tree with a read-through cache in front of ``query`` and ``__getitem__``, so hot keys are
+    answered without walking from the root. The cache maps keys to values, not to leaves, so splits
+    and merges never invalidate it; ``__setitem__``, ``insert``, ``change`` and ``delete`` update the
+    cached entry of their key, if there is one, and batch operations drop the entries of their keys.
+    Keys must be hashable. Not thread-safe.
+    Attributes:
+        cache (LookupCache): holding at most ``cache_size`` keys, evicted by ``cache_policy``, one of
+            ``CACHE_POLICIES``; ``cache.stats()`` has its counters.
+        negative (bool): whether lookups of keys not in the tree are cached too.
+    """
+
+    def __init__(self, maximum=4, timing=False, cache_size=1024, cache_policy='lru', negative=True, **kwargs):
+        if cache_policy not in CACHE_POLICIES:
+            raise ValueError(f'unknown cache policy {cache_policy!r}, expected one of {list(CACHE_POLICIES)}')
+        super(CachedBPlusTree, self).__init__(maximum, timing, **kwargs)
+        self.cache = LRUCache(cache_size) if cache_policy == 'lru' else ClockCache(cache_size)
+        self.negative = negative
+
+    def _load(self, key):
+        """Look the key up in the tree and cache the value, ``ABSENT`` if it is not there."""
+        leaf = self.find(key)
+        i = leaf.position(key)
+        value = leaf.values[i] if i >= 0 else ABSENT
+        if value is not ABSENT or self.negative:
+            self.cache.put(key, value)
+        return value
+
+    def __getitem__(self, item):
+        value = self.cache.get(item)
+        if value is MISS:
+            value = self._load(item)
+        if value is ABSENT:
+            raise ValueError(f'{item!r} is not in leaf')
+        return value
+
+    def query(self, key):
+        value = self.cache.get(key)
+        if value is MISS:
+            value = self._load(key)
+        return None if value is ABSENT else value
+
+    def change(self, key, value):
+        changed, leaf = super(CachedBPlusTree, self).change(key, value)
+        if changed:
+            self.cache.refresh(key, value)
+        return changed, leaf
+
+    def __setitem__(self, key, value, leaf=None):
+        # insert comes through here too
+        super(CachedBPlusTree, self).__setitem__(key, value, leaf)
+        self.cache.refresh(key, value)
+
+    def delete(self, key, node=None):
+        super(CachedBPlusTree, self).delete(key, node)
+        # rebalance deletes separators from index nodes, which leaves the key's entry alone
+        if node is None or isinstance(node, Leaf):
+            self.cache.refresh(key, ABSENT)
+
+    def insert_many(self, batch, replace=False):
+        batch = list(batch)
+        inserted = super(CachedBPlusTree, self).insert_many(batch, replace)
+        for key, _ in batch:
+            self.cache.discard(key)
+        return inserted
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        deleted = super(CachedBPlusTree, self).delete_many(keys)
+        for key in keys:
+            self.cache.refresh(key, ABSENT)
+        return deleted
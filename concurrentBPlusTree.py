@@ -0,0 +1,348 @@
+import threading
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+from BPlusTree import BPlusTree, Node, Leaf
+
+
+class RWLatch(object):
+    """Reader/writer latch: any number of shared holders or one exclusive holder.
+    Waiting writers block new readers, so a stream of readers cannot starve a writer.
+    """
+    __slots__ = ('_condition', '_readers', '_writer', '_waiting')
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting = 0
+
+    def acquire(self, exclusive=False):
+        with self._condition:
+            if exclusive:
+                self._waiting += 1
+                while self._writer or self._readers:
+                    self._condition.wait()
+                self._waiting -= 1
+                self._writer = True
+            else:
+                while self._writer or self._waiting:
+                    self._condition.wait()
+                self._readers += 1
+
+    def release(self, exclusive=False):
+        with self._condition:
+            if exclusive:
+                self._writer = False
+            else:
+                self._readers -= 1
+                if self._readers:
+                    return
+            self._condition.notify_all()
+
+
+class LatchedNode(Node):
+    __slots__ = ('latch',)
+
+    def __init__(self, parent=None):
+        super(LatchedNode, self).__init__(parent)
+        self.latch = RWLatch()
+
+
+class LatchedLeaf(Leaf):
+    __slots__ = ('latch',)
+
+    def __init__(self, parent=None, prev_node=None, next_node=None):
+        super(LatchedLeaf, self).__init__(parent, prev_node, next_node)
+        self.latch = RWLatch()
+
+
+class ConcurrentBPlusTree(BPlusTree):
+    """B+ tree that can be shared between threads, with a reader/writer latch on every node.
+    Lookups and writes that stay within one leaf crab down with shared latches, holding at most a
+    parent and a child at a time, and latch only the leaf exclusively, so readers never block each
+    other and writers to different leaves run side by side.
+    A write that has to split, merge or borrow restarts as a structure modification: it crabs down
+    with exclusive latches, releasing the ancestors of every node the write cannot change
+    structurally ("safe" nodes), and also latches the siblings and leaf neighbours it may touch.
+    Structure modifications are serialized by ``smo_latch``, like the index SX lock of InnoDB, which
+    rules out deadlocks between neighbours of different subtrees; they still exclude other threads
+    only from the affected subtree.
+    Scans copy one leaf at a time under its shared latch and re-descend from the root for the next
+    leaf, so no latch is held while the caller consumes the generator.
+    ``show``, ``plot_tree``, ``rebuild``, ``reorganize`` and the shape counters are not synchronized,
+    and ``typecode`` leaves are not supported.
+    Attributes:
+        smo_latch (threading.Lock): serializes structure modifications
+        pessimistic (int): writes that ran as a structure modification
+    """
+    node_type = LatchedNode
+    leaf_type = LatchedLeaf
+
+    def __init__(self, maximum=4, timing=False, typecode=None):
+        if typecode is not None:
+            raise ValueError('ConcurrentBPlusTree does not support typed leaves')
+        super(ConcurrentBPlusTree, self).__init__(maximum, timing)
+        self.smo_latch = threading.Lock()
+        self._size_lock = threading.Lock()
+        self.pessimistic = 0
+
+    def _add_size(self, delta):
+        with self._size_lock:
+            self.stats.size += delta
+
+    def _latch_root(self, exclusive_leaf=False, exclusive=False):
+        """Latch the root, retrying if a concurrent split or collapse replaced it meanwhile.
+        :return: the root and whether its latch is exclusive
+        """
+        while True:
+            node = self.root
+            mode = exclusive or (exclusive_leaf and isinstance(node, Leaf))
+            node.latch.acquire(mode)
+            if node is self.root:
+                return node, mode
+            node.latch.release(mode)
+
+    def _shared_descent(self, key, exclusive_leaf=False, before=False):
+        """Crab down to the leaf for the key with shared latches, exclusive on the leaf if asked.
+        :param key: the key to route, or None for the leftmost (rightmost if ``before``) leaf
+        :param before: route to the leaf holding the keys just below the key instead
+        :return: the latched leaf and the lower and upper bound of its key range, None if unbounded
+        """
+        node, _ = self._latch_root(exclusive_leaf)
+        low = high = None
+        while not isinstance(node, Leaf):
+            if key is None:
+                i = len(node.keys) if before else 0
+            else:
+                i = bisect_left(node.keys, key) if before else node.index(key)
+            if i > 0:
+                low = node.keys[i - 1]
+            if i < len(node.keys):
+                high = node.keys[i]
+            child = node.values[i]
+            child.latch.acquire(exclusive_leaf and isinstance(child, Leaf))
+            node.latch.release()
+            node = child
+        return node, low, high
+
+    def _exclusive_descent(self, key, safe, delete):
+        """Crab down to the leaf for the key with exclusive latches, for a structure modification.
+        Once a node is safe its latched ancestors are released. Nodes that are not safe keep them,
+        and for a delete their siblings are latched as well, since borrowing and merging touch them.
+        An unsafe leaf also latches its previous leaf (a split links the new leaf after it) and, for
+        a delete, its next leaf.
+        :return: the leaf and the list of latched nodes
+        """
+        node, _ = self._latch_root(exclusive=True)
+        held = [node]
+        while not isinstance(node, Leaf):
+            i = node.index(key)
+            child = node.values[i]
+            child.latch.acquire(True)
+            if safe(child):
+                self._release(held)
+                held = [child]
+            else:
+                held.append(child)
+                if delete and not isinstance(child, Leaf):
+                    for sibling in node.values[max(i - 1, 0):i] + node.values[i + 1:i + 2]:
+                        sibling.latch.acquire(True)
+                        held.append(sibling)
+            node = child
+        if not safe(node):
+            for neighbour in (node.prev, node.next if delete else None):
+                if neighbour is not None:
+                    neighbour.latch.acquire(True)
+                    held.append(neighbour)
+        return node, held
+
+    @staticmethod
+    def _release(held):
+        for node in held:
+            node.latch.release(True)
+
+    def _insert_safe(self, node):
+        return len(node.keys) < self.maximum
+
+    def _delete_safe(self, node):
+        if node is self.root:
+            return isinstance(node, Leaf) or len(node.keys) > 1
+        return len(node.keys) > self.minimum
+
+    def find(self, key) -> Leaf:
+        """Find the leaf for the key. It is returned unlatched, so it may change at any time."""
+        leaf, _, _ = self._shared_descent(key)
+        leaf.latch.release()
+        return leaf
+
+    def __getitem__(self, item):
+        leaf, _, _ = self._shared_descent(item)
+        try:
+            return leaf[item]
+        finally:
+            leaf.latch.release()
+
+    def query(self, key):
+        """Returns a value for a given key, and None if the key does not exist."""
+        leaf, _, _ = self._shared_descent(key)
+        i = leaf.position(key)
+        value = leaf.values[i] if i >= 0 else None
+        leaf.latch.release()
+        return value
+
+    def change(self, key, value):
+        """change the value
+        Returns:
+            (bool,Leaf): the leaf where the key is. return False if the key does not exist
+        """
+        leaf, _, _ = self._shared_descent(key, exclusive_leaf=True)
+        try:
+            if key not in leaf:
+                return False, leaf
+            leaf[key] = value
+            return True, leaf
+        finally:
+            leaf.latch.release(True)
+
+    def __setitem__(self, key, value, leaf=None):
+        self._insert(key, value, True)
+
+    def insert(self, key, value):
+        """
+        Returns:
+            (bool,Leaf): the leaf where the key is inserted. return False if already has same key
+        """
+        return self._insert(key, value, False)
+
+    def _insert(self, key, value, replace):
+        leaf, _, _ = self._shared_descent(key, exclusive_leaf=True)
+        try:
+            present = key in leaf
+            if present or len(leaf.keys) < self.maximum:
+                if replace or not present:
+                    leaf[key] = value
+                if not present:
+                    self._add_size(1)
+                return not present, leaf
+        finally:
+            leaf.latch.release(True)
+        # The leaf is full: insert again as a structure modification
+        with self.smo_latch:
+            self.pessimistic += 1
+            leaf, held = self._exclusive_descent(key, self._insert_safe, False)
+            try:
+                present = key in leaf
+                if replace or not present:
+                    leaf[key] = value
+                if not present:
+                    self._add_size(1)
+                    if len(leaf.keys) > self.maximum:
+                        self.split_leaf(leaf)
+                return not present, leaf
+            finally:
+                self._release(held)
+
+    def delete(self, key, node: Node = None):
+        if node is not None:
+            # rebalance removing the separator of a merged node from its parent, which is latched
+            return super(ConcurrentBPlusTree, self).delete(key, node)
+        leaf, _, _ = self._shared_descent(key, exclusive_leaf=True)
+        try:
+            if leaf is self.root or len(leaf.keys) > self.minimum or key not in leaf:
+                del leaf[key]
+                self._add_size(-1)
+                return
+        finally:
+            leaf.latch.release(True)
+        # The leaf would underflow: delete again as a structure modification
+        with self.smo_latch:
+            self.pessimistic += 1
+            leaf, held = self._exclusive_descent(key, self._delete_safe, True)
+            try:
+                del leaf[key]
+                self._add_size(-1)
+                self.rebalance(key, leaf)
+            finally:
+                self._release(held)
+
+    def insert_many(self, batch, replace=False):
+        """Insert a batch of key/value pairs in key order, one key at a time.
+        Unlike ``BPlusTree.insert_many`` the leaves are not filled in bulk, which would hold their
+        latches for the whole batch.
+        :return: the number of keys added to the tree
+        """
+        inserted = 0
+        for key, value in sorted(batch, key=itemgetter(0)):
+            inserted += self._insert(key, value, replace)[0]
+        return inserted
+
+    def delete_many(self, keys):
+        """Delete a batch of keys in key order, one key at a time; missing keys are skipped.
+        :return: the number of keys removed from the tree
+        """
+        deleted = 0
+        for key in sorted(keys):
+            try:
+                self.delete(key)
+            except ValueError:
+                continue
+            deleted += 1
+        return deleted
+
+    def range(self, lo=None, hi=None, inclusive=True, reverse=False):
+        """Yield (key, value) pairs with lo <= key <= hi in key order, while other threads write.
+        Every key that stays in the tree for the whole scan is yielded exactly once; keys inserted
+        or deleted during the scan may or may not be.
+        :param lo: lower bound, or None for no lower bound
+        :param hi: upper bound, or None for no upper bound
+        :param inclusive: whether the bounds are included, either one bool or a (lo, hi) pair
+        :param reverse: yield the pairs in descending key order
+        """
+        lo_inclusive, hi_inclusive = inclusive if isinstance(inclusive, tuple) else (inclusive, inclusive)
+        if reverse:
+            yield from self._range_reverse(lo, hi, lo_inclusive, hi_inclusive)
+            return
+
+        start, start_inclusive = lo, lo_inclusive
+        while True:
+            leaf, _, high = self._shared_descent(start)
+            try:
+                keys = leaf.keys
+                if start is None:
+                    i = 0
+                else:
+                    i = bisect_left(keys, start) if start_inclusive else bisect_right(keys, start)
+                if hi is None:
+                    j = len(keys)
+                else:
+                    j = bisect_right(keys, hi) if hi_inclusive else bisect_left(keys, hi)
+                pairs = list(zip(keys[i:j], leaf.values[i:j]))
+            finally:
+                leaf.latch.release()
+            yield from pairs
+            if high is None or (hi is not None and not (high < hi or (high == hi and hi_inclusive))):
+                return
+            start, start_inclusive = high, True
+
+    def _range_reverse(self, lo, hi, lo_inclusive, hi_inclusive):
+        end, end_inclusive = hi, hi_inclusive
+        while True:
+            leaf, low, _ = self._shared_descent(end, before=end is None or not end_inclusive)
+            try:
+                keys = leaf.keys
+                if end is None:
+                    j = len(keys)
+                else:
+                    j = bisect_right(keys, end) if end_inclusive else bisect_left(keys, end)
+                if lo is None:
+                    i = 0
+                else:
+                    i = bisect_left(keys, lo) if lo_inclusive else bisect_right(keys, lo)
+                pairs = list(zip(keys[i:j], leaf.values[i:j]))
+            finally:
+                leaf.latch.release()
+            yield from reversed(pairs)
+            if low is None or (lo is not None and not lo < low):
+                return
+            end, end_inclusive = low, False
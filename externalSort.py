@@ -0,0 +1,176 @@
+"""Streaming ingest of "key value" files larger than memory into a BPlusTree, by external merge sort.
+
+The file is read in chunks of about ``chunk_size`` bytes, cut at the last newline. Each chunk is
+parsed like ``BPlusTree.readfile`` parses a line, sorted by key and spilled to a run file in a
+temporary directory; with ``workers`` this happens in a process pool, so only the raw chunk goes to
+a worker and only the run's path comes back. The runs are then merged ``fan_in`` at a time, in
+extra passes if there are more, and the merged stream is fed to ``BPlusTree.bulk_load``, which
+builds the tree bottom-up. At no point is more than a few chunks of the file in memory.
+
+Both the sort and the merge are stable and runs keep the order of the chunks, so a key that occurs
+more than once keeps its last value, as with ``readfile``.
+"""
+import heapq
+import os
+import pickle
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from operator import itemgetter
+
+CHUNK_SIZE = 1 << 23
+FAN_IN = 64
+BLOCK = 8192  # pairs per pickled block of a run file
+PROGRESS_EVERY = 100000
+BUFFER = 1 << 20
+
+
+def read_chunks(reader, chunk_size=CHUNK_SIZE):
+    """Yield the contents of a binary file in blocks of about chunk_size bytes that end with a
+    newline, except maybe the last."""
+    rest = b''
+    while True:
+        data = reader.read(chunk_size)
+        if not data:
+            break
+        data = rest + data if rest else data
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            rest = data
+            continue
+        rest = data[end:]
+        yield data[:end]
+    if rest:
+        yield rest
+
+
+def parse_chunk(data):
+    """Parse the lines of a chunk into (key, value) pairs the way ``BPlusTree.readfile`` does, the
+    value keeping its line's newline.
+    :rtype: list[list]
+    """
+    lines = data.decode().split('\n')
+    last = lines.pop()
+    pairs = [line.split(maxsplit=1) for line in lines]
+    if last:
+        pairs.append(last.split(maxsplit=1))
+    if pairs and min(map(len, pairs)) < 2:
+        raise ValueError('every line needs a key and a value')
+    for pair in pairs[:len(lines)]:
+        pair[1] += '\n'
+    return pairs
+
+
+def write_run(pairs, path):
+    """Write sorted pairs, from any iterable, to a run file as a sequence of blocks, each a pickled
+    list of keys and one of values, which pickle much faster than a list of pairs."""
+    pairs = iter(pairs)
+    with open(path, 'wb', buffering=BUFFER) as file:
+        while True:
+            block = list(islice(pairs, BLOCK))
+            if not block:
+                break
+            pickle.dump([key for key, _ in block], file, pickle.HIGHEST_PROTOCOL)
+            pickle.dump([value for _, value in block], file, pickle.HIGHEST_PROTOCOL)
+
+
+def read_run(path):
+    """Yield the (key, value) pairs of a run file in order."""
+    with open(path, 'rb', buffering=BUFFER) as file:
+        while True:
+            try:
+                keys = pickle.load(file)
+            except EOFError:
+                return
+            yield from zip(keys, pickle.load(file))
+
+
+def sort_run(data, path):
+    """Parse a chunk, sort it by key and spill it to a run file; runs in a worker process.
+    :return: the number of pairs in the run
+    """
+    pairs = parse_chunk(data)
+    pairs.sort(key=itemgetter(0))
+    write_run(pairs, path)
+    return len(pairs)
+
+
+def sort_runs(reader, directory, chunk_size=CHUNK_SIZE, workers=None, progress=None):
+    """Split a file into sorted run files in directory, in file order.
+    :param workers: size of the process pool, 0 to sort in this process, None for one per CPU
+    :param progress: callable(stage, rows) called with 'parse' after each run
+    :return: the paths of the runs
+    """
+    paths, parsed = [], 0
+
+    def done(count):
+        nonlocal parsed
+        parsed += count
+        if progress is not None:
+            progress('parse', parsed)
+
+    chunks = read_chunks(reader, chunk_size)
+    if workers == 0:
+        for data in chunks:
+            paths.append(os.path.join(directory, f'run{len(paths)}'))
+            done(sort_run(data, paths[-1]))
+        return paths
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        # A couple of chunks per worker are in flight, so reading keeps ahead of parsing without
+        # holding the whole file
+        pending = deque()
+        for data in chunks:
+            if len(pending) >= 2 * workers:
+                done(pending.popleft().result())
+            paths.append(os.path.join(directory, f'run{len(paths)}'))
+            pending.append(pool.submit(sort_run, data, paths[-1]))
+        while pending:
+            done(pending.popleft().result())
+    return paths
+
+
+def merge_runs(paths, directory, fan_in=FAN_IN):
+    """Merge sorted run files into one sorted stream, stable by run order. While there are more
+    than fan_in runs, consecutive groups of them are first merged into new run files.
+    :return: iterator of (key, value) pairs
+    """
+    if fan_in < 2:
+        raise ValueError('fan_in must be at least 2')
+    passes = 0
+    while len(paths) > fan_in:
+        merged = []
+        for start in range(0, len(paths), fan_in):
+            group = paths[start:start + fan_in]
+            path = os.path.join(directory, f'pass{passes}-{len(merged)}')
+            write_run(heapq.merge(*map(read_run, group), key=itemgetter(0)), path)
+            for done in group:
+                os.remove(done)
+            merged.append(path)
+        paths = merged
+        passes += 1
+    if len(paths) == 1:
+        return read_run(paths[0])
+    return heapq.merge(*map(read_run, paths), key=itemgetter(0))
+
+
+def _report(stream, progress):
+    rows = 0
+    for rows, pair in enumerate(stream, 1):
+        if rows % PROGRESS_EVERY == 0:
+            progress('merge', rows)
+        yield pair
+    progress('merge', rows)
+
+
+def ingest(cls, reader, maximum=4, chunk_size=CHUNK_SIZE, workers=None, fan_in=FAN_IN, temp_dir=None,
+           progress=None, fill_factor=1.0, **kwargs):
+    """Build a tree of class cls from a binary file of "key value" lines; see ``BPlusTree.ingest``."""
+    with tempfile.TemporaryDirectory(prefix='bptree-runs-', dir=temp_dir) as directory:
+        paths = sort_runs(reader, directory, chunk_size, workers, progress)
+        stream = merge_runs(paths, directory, fan_in)
+        if progress is not None:
+            stream = _report(stream, progress)
+        return cls.bulk_load(stream, maximum, fill_factor, presorted=True, **kwargs)
@@ -0,0 +1,207 @@
+import threading
+from itertools import islice
+
+from BPlusTree import BPlusTree
+
+SCAN_CHUNK = 256  # pairs a scan copies under the lock at a time
+
+
+class _Ghost(object):
+    """Value of a ghost record."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'GHOST'
+
+    def __reduce__(self):
+        return 'GHOST'
+
+
+GHOST = _Ghost()
+
+
+class GhostBPlusTree(BPlusTree):
+    """B+ tree whose deletes leave ghost records, like SQL Server, instead of rebalancing at once.
+    ``delete`` and ``delete_many`` only replace the value of the entry with ``GHOST``; lookups,
+    ``change`` and scans skip ghosts, and inserting a ghost's key revives the entry in place. The
+    ghosts are removed, and the leaves they leave under-full rebalanced, by ``cleanup``, which can be
+    called explicitly or run in batches by a background thread started with ``start_cleaner``.
+    Every operation holds ``_lock``, so the cleaner can run while other threads use the tree; scans
+    copy ``SCAN_CHUNK`` pairs at a time under it.
+    ``stats.size`` counts the entries in the leaves, ghosts included.
+    Attributes:
+        ghost_keys (set): the keys of the ghost records
+        cleaned (int): ghosts removed by ``cleanup``
+        cleanups (int): batches ``cleanup`` has run
+    """
+
+    def __init__(self, maximum=4, timing=False, **kwargs):
+        super(GhostBPlusTree, self).__init__(maximum, timing, **kwargs)
+        self.ghost_keys = set()
+        self.cleaned = self.cleanups = 0
+        self._lock = threading.RLock()
+        self._cleaner = None
+        self._stop = threading.Event()
+
+    @property
+    def ghosts(self):
+        """The number of ghost records."""
+        return len(self.ghost_keys)
+
+    def _revive(self, key, value):
+        leaf = self.find(key)
+        leaf.values[leaf.position(key)] = value
+        self.ghost_keys.discard(key)
+
+    def _live_position(self, leaf, key):
+        """Return the index of the key in the leaf, or -1 if it is not stored there or a ghost."""
+        i = leaf.position(key)
+        return i if i >= 0 and leaf.values[i] is not GHOST else -1
+
+    def __getitem__(self, item):
+        with self._lock:
+            leaf = self.find(item)
+            i = self._live_position(leaf, item)
+            if i < 0:
+                raise ValueError(f'{item!r} is not in leaf')
+            return leaf.values[i]
+
+    def query(self, key):
+        with self._lock:
+            leaf = self.find(key)
+            i = self._live_position(leaf, key)
+            return leaf.values[i] if i >= 0 else None
+
+    def change(self, key, value):
+        with self._lock:
+            leaf = self.find(key)
+            i = self._live_position(leaf, key)
+            if i < 0:
+                return False, leaf
+            leaf.values[i] = value
+            return True, leaf
+
+    def __setitem__(self, key, value, leaf=None):
+        with self._lock:
+            if key in self.ghost_keys:
+                self._revive(key, value)
+            else:
+                super(GhostBPlusTree, self).__setitem__(key, value, leaf)
+
+    def insert(self, key, value):
+        with self._lock:
+            if key in self.ghost_keys:
+                self._revive(key, value)
+                return True, self.find(key)
+            return super(GhostBPlusTree, self).insert(key, value)
+
+    def delete(self, key, node=None):
+        """Mark the entry of the key as a ghost.
+        :raise ValueError: the key is not in the tree
+        """
+        if node is not None:
+            # rebalance removing the separator of a merged node during cleanup
+            return super(GhostBPlusTree, self).delete(key, node)
+        with self._lock:
+            leaf = self.find(key)
+            i = self._live_position(leaf, key)
+            if i < 0:
+                raise ValueError(f'{key!r} is not in leaf')
+            leaf.values[i] = GHOST
+            self.ghost_keys.add(key)
+
+    def insert_many(self, batch, replace=False):
+        """Insert a batch of key/value pairs, reviving ghosts; see ``BPlusTree.insert_many``."""
+        with self._lock:
+            rest, revived = [], 0
+            for key, value in batch:
+                if key in self.ghost_keys:
+                    self._revive(key, value)
+                    revived += 1
+                else:
+                    rest.append((key, value))
+            return revived + super(GhostBPlusTree, self).insert_many(rest, replace)
+
+    def delete_many(self, keys):
+        """Mark the entries of a batch of keys as ghosts; keys that are not in the tree are skipped.
+        :return: the number of entries marked
+        """
+        marked = 0
+        with self._lock:
+            for key in set(keys):
+                leaf = self.find(key)
+                i = self._live_position(leaf, key)
+                if i >= 0:
+                    leaf.values[i] = GHOST
+                    self.ghost_keys.add(key)
+                    marked += 1
+        return marked
+
+    def cleanup(self, batch=None):
+        """Remove up to batch ghosts, all of them if None, rebalancing the leaves they leave
+        under-full leaf by leaf as ``BPlusTree.delete_many`` does.
+        :return: the number of ghosts removed
+        """
+        with self._lock:
+            keys = list(self.ghost_keys if batch is None else islice(self.ghost_keys, batch))
+            if not keys:
+                return 0
+            self.ghost_keys.difference_update(keys)
+            removed = BPlusTree.delete_many(self, keys)
+            self.cleaned += removed
+            self.cleanups += 1
+            return removed
+
+    def start_cleaner(self, interval=0.05, batch=1024):
+        """Run ``cleanup(batch)`` every interval seconds in a daemon thread while there are ghosts."""
+        if self._cleaner is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                while self.ghost_keys and not self._stop.is_set():
+                    self.cleanup(batch)
+
+        self._cleaner = threading.Thread(target=run, name='ghost-cleanup', daemon=True)
+        self._cleaner.start()
+
+    def stop_cleaner(self):
+        """Stop the background cleanup thread; ghosts it has not reached yet stay."""
+        if self._cleaner is not None:
+            self._stop.set()
+            self._cleaner.join()
+            self._cleaner = None
+
+    def range(self, lo=None, hi=None, inclusive=True, reverse=False):
+        """Yield the live (key, value) pairs like ``BPlusTree.range``. Pairs are copied a chunk at a
+        time under the lock and the scan resumes after the last key, so no lock is held while the
+        caller consumes them."""
+        lo_inclusive, hi_inclusive = inclusive if isinstance(inclusive, tuple) else (inclusive, inclusive)
+        while True:
+            with self._lock:
+                pairs = super(GhostBPlusTree, self).range(lo, hi, (lo_inclusive, hi_inclusive), reverse)
+                chunk = list(islice((pair for pair in pairs if pair[1] is not GHOST), SCAN_CHUNK))
+            yield from chunk
+            if len(chunk) < SCAN_CHUNK:
+                return
+            if reverse:
+                hi, hi_inclusive = chunk[-1][0], False
+            else:
+                lo, lo_inclusive = chunk[-1][0], False
+
+    def rebuild(self, fill_factor=None):
+        """Rebuild the tree from its live entries, which drops every ghost; see ``BPlusTree.rebuild``."""
+        with self._lock:
+            super(GhostBPlusTree, self).rebuild(fill_factor)
+            self.ghost_keys.clear()
+
+    def reorganize(self, fill_factor=None):
+        with self._lock:
+            super(GhostBPlusTree, self).reorganize(fill_factor)
+
+    def save(self, path):
+        """Remove every ghost, then write a snapshot; see ``BPlusTree.save``."""
+        with self._lock:
+            self.cleanup()
+            super(GhostBPlusTree, self).save(path)
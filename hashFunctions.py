@@ -0,0 +1,117 @@
+# Hash functions shared by the hash tables.
+# Each one maps a key to an integer in [0, 2 ** 64); a table reduces it modulo its capacity.
+import struct
+
+MASK64 = (1 << 64) - 1
+MERSENNE61 = (1 << 61) - 1
+FNV_OFFSET = 0xcbf29ce484222325
+FNV_PRIME = 0x100000001b3
+
+_double = struct.Struct('<d')
+
+
+# Encode a key as bytes so that any key can be hashed byte by byte
+# Input:  key - str, bytes, int, float, tuple of those, or anything with a repr
+# Output: bytes; keys that compare equal (1, 1.0, True) give the same bytes
+def key_bytes(key):
+    if isinstance(key, str):
+        return key.encode('utf-8', 'surrogatepass')
+    if isinstance(key, (bytes, bytearray, memoryview)):
+        return bytes(key)
+    if isinstance(key, float) and key.is_integer():
+        key = int(key)
+    if isinstance(key, int):
+        return key.to_bytes(key.bit_length() // 8 + 1, 'little', signed=True)
+    if isinstance(key, float):
+        return _double.pack(key)
+    if isinstance(key, tuple):
+        # Length-prefix every field so ('ab', 'c') and ('a', 'bc') differ
+        return b''.join(len(part).to_bytes(4, 'little') + part for part in map(key_bytes, key))
+    return repr(key).encode('utf-8')
+
+
+_power_tables = {}
+POWER_TABLES = 1024  # bases whose power table is kept
+
+
+# base ^ c modulo 2 ** 61 - 1, from a table of every byte value c built once per base with
+# three-argument pow so no term ever becomes a huge integer. Once POWER_TABLES bases have tables,
+# as with long keys or many seeds, the power of other bases is computed for the one byte instead.
+def _power(base, c):
+    table = _power_tables.get(base)
+    if table is None:
+        if len(_power_tables) >= POWER_TABLES:
+            return pow(base, c, MERSENNE61)
+        table = _power_tables[base] = [pow(base, b, MERSENNE61) for b in range(256)]
+    return table[c]
+
+
+# The original table hash: sum of (index + length of key) ^ (current char code),
+# now taken modulo 2 ** 61 - 1 with the powers looked up instead of recomputed
+def power_hash(key, seed=0):
+    data = key_bytes(key)
+    n = len(data) + seed
+    hashsum = 0
+    for index, c in enumerate(data):
+        hashsum += _power(index + n, c)
+    return hashsum % MERSENNE61
+
+
+# 64-bit FNV-1a over the key bytes
+def fnv1a_hash(key, seed=0):
+    hashsum = FNV_OFFSET ^ seed
+    for c in key_bytes(key):
+        hashsum = ((hashsum ^ c) * FNV_PRIME) & MASK64
+    return hashsum
+
+
+# Polynomial hash of the key bytes in base 256 modulo 2 ** 61 - 1. int.from_bytes evaluates the
+# polynomial in C; the splitmix64 finalizer then spreads consecutive keys over the whole range.
+def polynomial_hash(key, seed=0):
+    hashsum = (int.from_bytes(key_bytes(key), 'little') + seed) % MERSENNE61
+    hashsum = ((hashsum ^ (hashsum >> 30)) * 0xbf58476d1ce4e5b9) & MASK64
+    hashsum = ((hashsum ^ (hashsum >> 27)) * 0x94d049bb133111eb) & MASK64
+    return hashsum ^ (hashsum >> 31)
+
+
+# Python's built-in hash of the (seed, key) pair. Fastest and works for any hashable key, but str
+# and bytes hashes change between processes unless PYTHONHASHSEED is set.
+def builtin_hash(key, seed=0):
+    return hash((seed, key)) & MASK64
+
+
+HASH_FUNCTIONS = {
+    'power': power_hash,
+    'fnv1a': fnv1a_hash,
+    'polynomial': polynomial_hash,
+    'builtin': builtin_hash,
+}
+
+
+# Hash a batch of keys once and group it by bucket for the batch operations of the tables
+# Input:  hash_function - callable key -> non-negative int
+#         keys - list of keys
+#         capacity - number of buckets
+#         hashes - the hashes of the keys if they are already known, e.g. from a snapshot
+# Output: (hash of every key, positions of the keys ordered by bucket, in input order within a bucket)
+def hash_batch(hash_function, keys, capacity, hashes=None):
+    if hashes is None:
+        hashes = list(map(hash_function, keys))
+    homes = [h % capacity for h in hashes]
+    return hashes, sorted(range(len(keys)), key=homes.__getitem__)
+
+
+# Resolve the hash_function argument of a table
+# Input:  hash_function - a name from HASH_FUNCTIONS or a callable key -> non-negative int
+#         seed - seed passed to the named hash functions
+# Output: callable key -> non-negative int
+def get_hash_function(hash_function='power', seed=0):
+    if callable(hash_function):
+        return hash_function
+    try:
+        function = HASH_FUNCTIONS[hash_function]
+    except KeyError:
+        raise ValueError(f"unknown hash function {hash_function!r}, expected one of {sorted(HASH_FUNCTIONS)}")
+    if seed:
+        return lambda key: function(key, seed)
+    return function
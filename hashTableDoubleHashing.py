@@ -1,5 +1,13 @@
+from time import perf_counter
+
+from hashFunctions import get_hash_function, hash_batch
+from hashTableResize import IncrementalResize
+
+
 # Node data structure - essentially a LinkedList node
 class Node:
+    __slots__ = ('key', 'value')
+
     def __init__(self, key, value):
         self.key = key
         self.value = value
@@ -11,111 +19,344 @@ class Node:
         return str(self)
 
 
-# Hash table with separate chaining
+# Left in a slot by removeDH, and in the old array while resizing by an entry moved ahead of the
+# sequential migration: probes continue past it and inserts may reuse it
+TOMBSTONE = Node(None, None)
+
+
+def is_prime(n):
+    if n < 2:
+        return False
+    if n % 2 == 0:
+        return n == 2
+    divisor = 3
+    while divisor * divisor <= n:
+        if n % divisor == 0:
+            return False
+        divisor += 2
+    return True
+
+
+# Smallest prime >= n
+def next_prime(n):
+    while not is_prime(n):
+        n += 1
+    return n
+
+
+# Hash table with double hashing
+# The capacity is always prime, so every step 1 + h % (capacity - 2) is coprime with it and a probe
+# sequence visits every slot once before it repeats.
 class HashTableDH:
     # Initialize hash table
-    def __init__(self, INITIAL_CAPACITY = 50):
-        self.capacity = INITIAL_CAPACITY
+    # Input:  INITIAL_CAPACITY - rounded up to a prime of at least 5
+    #         hash_function - name from hashFunctions.HASH_FUNCTIONS or a callable key -> int
+    #         seed - seed for a named hash function
+    #         max_load_factor - grow once size / capacity goes above this, below 1 so a slot stays
+    #                           empty; tombstones count towards the load too, and when they push it
+    #                           over the table is rebuilt
+    #         min_load_factor - shrink on remove once size / capacity drops below this, 0 to never shrink
+    #         rehash_step - slots moved to the new array per operation while resizing
+    def __init__(self, INITIAL_CAPACITY = 50, hash_function='power', seed=0,
+                 max_load_factor=0.5, min_load_factor=0.0, rehash_step=4):
+        if not 0 < max_load_factor < 1:
+            raise ValueError("max_load_factor must be between 0 and 1 for open addressing")
+        self.capacity = next_prime(max(INITIAL_CAPACITY, 5))
         self.size = 0
         self.buckets = [None] * self.capacity
+        self.hash_function = get_hash_function(hash_function, seed)
+        self.resize = IncrementalResize(self.capacity, max_load_factor, min_load_factor, rehash_step)
+        self.tombstones = 0
+        # Slots inspected by find, insertDH and removeDH, and the number of those calls
+        self.probes = 0
+        self.operations = 0
 
     # Generate a hash for a given key
-    # Input:  key - string
+    # Input:  key - string, or any key the hash function supports
     # Output: Index from 0 to self.capacity
     def hash1(self, key):
-        hashsum = 0
-        # For each character in the key
-        for index, c in enumerate(key):
-            # Add (index + length of key) ^ (current char code)
-            hashsum += (index + len(key)) ** ord(c)
-            # Perform modulus to keep hashsum in range [0, self.capacity - 1]
-            hashsum = hashsum % self.capacity
-        return hashsum
+        return self.hash_function(key) % self.capacity
 
+    # Step size of the probe sequence, from 1 to self.capacity - 2
     def hash2(self, key):
-        hashsum = 0
-        # For each character in the key
-        for index, c in enumerate(key):
-            # Add (index + length of key) ^ (current char code)
-            hashsum += (index + len(key)) ** ord(c)
-            # Perform modulus to keep hashsum in range [0, self.capacity - 1]
-            hashsum = 1 + hashsum % (self.capacity - 2)
-        return hashsum
-
-    # Insert a key,value pair to the hashtable
+        return 1 + self.hash_function(key) % (self.capacity - 2)
+
+    # Walk the probe sequence of hash h in buckets, computing its start and step once
+    # Output: (slot of key or None, first empty or tombstone slot before the end of the probe or None,
+    #          number of slots inspected)
+    @staticmethod
+    def _lookup(buckets, capacity, h, key):
+        index = h % capacity
+        step = 1 + h % (capacity - 2)
+        free = None
+        probes = 0
+        while probes < capacity:
+            probes += 1
+            node = buckets[index]
+            if node is None:
+                return None, index if free is None else free, probes
+            if node is TOMBSTONE:
+                if free is None:
+                    free = index
+            elif node.key == key:
+                return index, free, probes
+            index += step
+            if index >= capacity:
+                index -= capacity
+        return None, free, probes
+
+    # Put node in the first empty or tombstone slot of its probe sequence in self.buckets
+    def _place(self, node, h):
+        capacity = self.capacity
+        buckets = self.buckets
+        index = h % capacity
+        step = 1 + h % (capacity - 2)
+        # The probe sequence visits every slot once, and max_load_factor below 1 keeps one free
+        for _ in range(capacity):
+            if buckets[index] is None or buckets[index] is TOMBSTONE:
+                break
+            index += step
+            if index >= capacity:
+                index -= capacity
+        else:
+            raise RuntimeError("hash table is full")
+        if buckets[index] is TOMBSTONE:
+            self.tombstones -= 1
+        buckets[index] = node
+        return index
+
+    # Start moving every entry into a new array of new_capacity slots, rounded up to a prime.
+    # Tombstones are not moved, so a resize to the same capacity cleans them up.
+    def _resize(self, new_capacity):
+        started = perf_counter()
+        # A resize still in progress is finished first
+        self.resize.step(self._move_slot, count=None)
+        new_capacity = next_prime(new_capacity)
+        old_buckets, old_capacity = self.buckets, self.capacity
+        self.capacity = new_capacity
+        self.buckets = [None] * new_capacity
+        self.tombstones = 0
+        self.resize.begin(old_buckets, old_capacity, new_capacity, started)
+
+    # Grow or shrink when size is out of the load factor bounds, and rebuild at the same capacity
+    # when live entries plus tombstones go above max_load_factor
+    def _check_load(self, size):
+        new_capacity = self.resize.new_capacity(size, self.capacity)
+        if new_capacity is None and size + self.tombstones > self.capacity * self.resize.max_load_factor:
+            new_capacity = self.capacity
+        if new_capacity is not None:
+            self._resize(new_capacity)
+
+    # Move the entry of an old slot to the new array. The old slot keeps its entry so that
+    # probe sequences through it still work until the whole old array is dropped.
+    def _move_slot(self, old_index):
+        node = self.resize.old_buckets[old_index]
+        if node is not None and node is not TOMBSTONE:
+            self._place(node, self.hash_function(node.key))
+
+    # Slot of key in self.buckets and the first reusable slot of its probe sequence. While resizing
+    # a key still in an old slot that has not been moved yet is moved over first.
+    def _locate(self, h, key):
+        self.operations += 1
+        resize = self.resize
+        resize.step(self._move_slot)
+        index, free, probes = self._lookup(self.buckets, self.capacity, h, key)
+        self.probes += probes
+        if index is not None or resize.old_buckets is None:
+            return index, free
+        old_buckets = resize.old_buckets
+        index, _, probes = self._lookup(old_buckets, resize.old_capacity, h, key)
+        self.probes += probes
+        if index is None or index < resize.index:
+            # Not there, or already moved and since removed from the new array
+            return None, free
+        node = old_buckets[index]
+        old_buckets[index] = TOMBSTONE
+        return self._place(node, h), None
+
+    # Insert a key,value pair to the hashtable, replacing the value of an existing key
     # Input:  key - string
     # 		  value - anything
     # Output: void
     def insertDH(self, key, value):
-        # 2. Compute index of key
-        index = self.hash1(key)
-        prev = self.buckets[index]
-        count = 1
-        while self.buckets[index] is not None:
-            index = self.hash1(key) + count * self.hash2(key)
-            count += 1
-        # Add a new node at the end of the list with provided key/value
-        self.buckets[index] = Node(key, value)
-        # 1. Increment size
+        h = self.hash_function(key)
+        index, free = self._locate(h, key)
+        if index is not None:
+            self.buckets[index].value = value
+            return
+        buckets = self.buckets
+        self._check_load(self.size + 1)
+        if self.buckets is buckets and free is not None:
+            # The probe sequence is unchanged, so the slot found by the lookup can be used
+            if self.buckets[free] is TOMBSTONE:
+                self.tombstones -= 1
+            self.buckets[free] = Node(key, value)
+        else:
+            self._place(Node(key, value), h)
         self.size += 1
 
+    # Slot of key in self.buckets, or None if it is not there
+    def _index(self, key):
+        return self._locate(self.hash_function(key), key)[0]
+
     # Find a data value based on key
     # Input:  key - string
-    # Output: value stored under "key" or None if not found
+    # Output: data value of "key" or None if not found
     def find(self, key):
-        # 1. Compute hash
-        index = self.hash1(key)
-        count = 1
-        while self.buckets[index] is not None and self.buckets[index].key != key:
-            index = self.hash1(key) + count * self.hash2(key)
-        # 4. Now, node is the requested key/value pair or None
-        if self.buckets[index] is None:
-            # Not found
-            return None
-        else:
-            # Found - return the data value
-            return index
+        index = self._index(key)
+        return None if index is None else self.buckets[index].value
 
+    # Remove the entry stored at key, leaving a tombstone in its slot
+    # Input:  key - string
+    # Output: removed data value or None if not found
     def removeDH(self, key):
-        # 2. Compute index of key
-        index = self.find(key)
-
+        index = self._index(key)
         if index is None:
             return None
-        else:
-            # 4. The key was found.
-            self.size -= 1
-            result = self.buckets[index].value
-            # Delete this element in linked list
-            self.buckets[index] = None
-            # Return the deleted result
-            return result
+        result = self.buckets[index].value
+        self.buckets[index] = TOMBSTONE
+        self.size -= 1
+        self.tombstones += 1
+        self._check_load(self.size)
+        return result
+
+    # Names shared by all the hash tables, so callers need not know which table they have
+    def insert(self, key, value):
+        self.insertDH(key, value)
+
+    def remove(self, key):
+        return self.removeDH(key)
 
+    # Finish any resize in progress and grow (or clean up tombstones) at once to hold size entries,
+    # so that the probe sequence of every key stays fixed for a whole batch operation
+    def _reserve(self, size):
+        self.finish_resize()
+        new_capacity = self.resize.capacity_for(size, self.capacity)
+        if new_capacity != self.capacity or size + self.tombstones > self.capacity * self.resize.max_load_factor:
+            self._resize(new_capacity)
+            self.finish_resize()
+
+    # Insert many key,value pairs, hashing them all first and probing in order of home slot.
+    # Existing keys get their value replaced; for a key repeated in the batch the last value wins.
+    # Input:  items - iterable of (key, value)
+    # Output: void
+    def insert_many(self, items):
+        items = list(items)
+        self._reserve(self.size + len(items))
+        hashes, order = hash_batch(self.hash_function, [key for key, _ in items], self.capacity)
+        buckets, capacity, lookup = self.buckets, self.capacity, self._lookup
+        probes = 0
+        for position in order:
+            key, value = items[position]
+            index, free, count = lookup(buckets, capacity, hashes[position], key)
+            probes += count
+            if index is not None:
+                buckets[index].value = value
+                continue
+            if buckets[free] is TOMBSTONE:
+                self.tombstones -= 1
+            buckets[free] = Node(key, value)
+            self.size += 1
+        self.probes += probes
+        self.operations += len(items)
+
+    # Find many keys, hashing them all first and probing in order of home slot
+    # Input:  keys - iterable of keys
+    # Output: list of the value stored under each key, or None if not found, in input order
+    def find_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        buckets, capacity, lookup = self.buckets, self.capacity, self._lookup
+        results = [None] * len(keys)
+        probes = 0
+        for position in order:
+            index, _, count = lookup(buckets, capacity, hashes[position], keys[position])
+            probes += count
+            if index is not None:
+                results[position] = buckets[index].value
+        self.probes += probes
+        self.operations += len(keys)
+        return results
+
+    # Remove many keys, hashing them all first and probing in order of home slot
+    # Input:  keys - iterable of keys
+    # Output: list of the removed value for each key, or None if not found, in input order
+    def remove_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        buckets, capacity, lookup = self.buckets, self.capacity, self._lookup
+        results = [None] * len(keys)
+        probes = 0
+        for position in order:
+            index, _, count = lookup(buckets, capacity, hashes[position], keys[position])
+            probes += count
+            if index is not None:
+                results[position] = buckets[index].value
+                buckets[index] = TOMBSTONE
+                self.size -= 1
+                self.tombstones += 1
+        self.probes += probes
+        self.operations += len(keys)
+        self._check_load(self.size)
+        return results
+
+    # Finish a resize in progress, so that every entry is in self.buckets
+    def finish_resize(self):
+        self.resize.step(self._move_slot, count=None)
+
+    # Probe lengths: how many slots a lookup of each stored key inspects (average and max), and
+    # the slots actually inspected per find, insertDH and removeDH call so far
+    def probe_stats(self):
+        self.finish_resize()
+        lengths = [self._lookup(self.buckets, self.capacity, self.hash_function(node.key), node.key)[2]
+                   for node in self.buckets if node is not None and node is not TOMBSTONE]
+        return {'entries': len(lengths),
+                'average_probe_length': sum(lengths) / len(lengths) if lengths else 0.0,
+                'max_probe_length': max(lengths, default=0),
+                'tombstones': self.tombstones,
+                'operations': self.operations,
+                'probes_per_operation': self.probes / self.operations if self.operations else 0.0}
 
     def __str__(self):
+        self.finish_resize()
         elements = []
-        for i in range(self.capacity):
-            node = self.buckets[i]
-            while node:
+        for node in self.buckets:
+            if node is not None and node is not TOMBSTONE:
                 elements.append((node.key, node.value))
-                node = node.next
         return str(elements)
 
+    # Write the entries to a binary snapshot file, see the snapshot module
+    # Input:  path - file to write
+    def save(self, path):
+        from snapshot import save_table
+        self.finish_resize()
+        nodes = [node for node in self.buckets if node is not None and node is not TOMBSTONE]
+        keys, values = [node.key for node in nodes], [node.value for node in nodes]
+        save_table(self, path, keys, values)
+
+    # Rebuild a table saved with save, hashing the keys again with the given hash function
+    # Input:  path - file written by save
+    #         hash_function, seed - as for the constructor
+    # Output: the new table
+    @classmethod
+    def load(cls, path, hash_function='power', seed=0):
+        from snapshot import load_table
+        return load_table(cls, path, hash_function, seed)
+
     def __len__(self):
         return self.size
 
     def __contains__(self, key):
-        try:
-            self.find(key)
-            return True
-        except KeyError:
-            return False
+        return self._index(key) is not None
 
     def printAll(self):
+        self.finish_resize()
         for i, bucket in enumerate(self.buckets):
             print(i, end=" ")
-            if bucket is not None:
+            if bucket is not None and bucket is not TOMBSTONE:
                 node = bucket
 
                 print(f"--> Key: {node.key}, Value: {node.value}", end=" ")
-            print("\n")
\ No newline at end of file
+            print("\n")
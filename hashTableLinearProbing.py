@@ -0,0 +1,305 @@
+from time import perf_counter
+
+from hashFunctions import get_hash_function, hash_batch
+from hashTableResize import IncrementalResize
+
+
+# Value of an old-array slot whose entry was moved to the new array ahead of the sequential migration
+MOVED = object()
+
+
+# Hash table with linear probing and Robin Hood displacement.
+# Entries live in three parallel flat lists - keys, values and full hashes - instead of one Node
+# object per entry; a slot is empty when its hash is None. On insert an entry that is further from
+# its home slot than the resident entry takes the slot and the resident moves on, which keeps
+# probe lengths short and lets a lookup stop as soon as it is further from home than the entry it
+# is looking at. Deletion shifts the following entries back instead of leaving tombstones.
+class HashTableLP:
+    # Initialize hash table
+    # Input:  hash_function - name from hashFunctions.HASH_FUNCTIONS or a callable key -> int
+    #         seed - seed for a named hash function
+    #         max_load_factor - grow once size / capacity goes above this, below 1 so a slot stays empty
+    #         min_load_factor - shrink on remove once size / capacity drops below this, 0 to never shrink
+    #         rehash_step - slots moved to the new array per operation while resizing
+    def __init__(self, INITIAL_CAPACITY = 50, hash_function='power', seed=0,
+                 max_load_factor=0.8, min_load_factor=0.0, rehash_step=4):
+        if not 0 < max_load_factor < 1:
+            raise ValueError("max_load_factor must be between 0 and 1 for open addressing")
+        self.capacity = INITIAL_CAPACITY
+        self.size = 0
+        self.keys = [None] * self.capacity
+        self.values = [None] * self.capacity
+        self.hashes = [None] * self.capacity
+        self.hash_function = get_hash_function(hash_function, seed)
+        self.resize = IncrementalResize(INITIAL_CAPACITY, max_load_factor, min_load_factor, rehash_step)
+        # Slots inspected by find, insertLP and removeLP, and the number of those calls
+        self.probes = 0
+        self.operations = 0
+
+    # Generate a hash for a given key
+    # Input:  key - string, or any key the hash function supports
+    # Output: Index from 0 to self.capacity
+    def hash(self, key):
+        return self.hash_function(key) % self.capacity
+
+    # Slot of key in the given arrays, or None if it is not there
+    def _lookup(self, keys, hashes, capacity, h, key):
+        index = h % capacity
+        distance = 0
+        while distance < capacity:
+            slot_hash = hashes[index]
+            # An empty slot, or an entry closer to its home than key would be, ends the probe
+            if slot_hash is None or (index - slot_hash) % capacity < distance:
+                self.probes += distance + 1
+                return None
+            if slot_hash == h and keys[index] == key:
+                self.probes += distance + 1
+                return index
+            index = (index + 1) % capacity
+            distance += 1
+        # Every slot was inspected
+        self.probes += capacity
+        return None
+
+    # Robin Hood insert of an entry known not to be in the table
+    # Output: number of slots inspected
+    def _place(self, h, key, value):
+        keys, values, hashes, capacity = self.keys, self.values, self.hashes, self.capacity
+        index = start = h % capacity
+        distance = 0
+        # max_load_factor below 1 keeps a slot empty, so the probe ends within capacity slots
+        for _ in range(capacity):
+            slot_hash = hashes[index]
+            if slot_hash is None:
+                keys[index], values[index], hashes[index] = key, value, h
+                return (index - start) % capacity + 1
+            slot_distance = (index - slot_hash) % capacity
+            if slot_distance < distance:
+                # Take the slot from the entry closer to its home and carry that one on
+                keys[index], key = key, keys[index]
+                values[index], value = value, values[index]
+                hashes[index], h = h, slot_hash
+                distance = slot_distance
+            index = (index + 1) % capacity
+            distance += 1
+        raise RuntimeError("hash table is full")
+
+    # Start moving every entry into new arrays of new_capacity slots
+    def _resize(self, new_capacity):
+        started = perf_counter()
+        # A resize still in progress is finished first
+        self.resize.step(self._move_slot, count=None)
+        old_buckets, old_capacity = (self.keys, self.values, self.hashes), self.capacity
+        self.capacity = new_capacity
+        self.keys = [None] * new_capacity
+        self.values = [None] * new_capacity
+        self.hashes = [None] * new_capacity
+        self.resize.begin(old_buckets, old_capacity, new_capacity, started)
+
+    # Move the entry of an old slot to the new arrays. The old slot keeps its entry so that
+    # probe sequences through it still work until the old arrays are dropped.
+    def _move_slot(self, old_index):
+        keys, values, hashes = self.resize.old_buckets
+        if hashes[old_index] is not None and values[old_index] is not MOVED:
+            self._place(hashes[old_index], keys[old_index], values[old_index])
+
+    # Slot of key in the current arrays, moving it over from the old arrays first while resizing
+    def _locate(self, h, key):
+        self.operations += 1
+        resize = self.resize
+        resize.step(self._move_slot)
+        index = self._lookup(self.keys, self.hashes, self.capacity, h, key)
+        if index is not None or resize.old_buckets is None:
+            return index
+        keys, values, hashes = resize.old_buckets
+        index = self._lookup(keys, hashes, resize.old_capacity, h, key)
+        if index is None or index < resize.index or values[index] is MOVED:
+            # Not there, or already moved and since removed from the new arrays
+            return None
+        self._place(h, key, values[index])
+        values[index] = MOVED
+        return self._lookup(self.keys, self.hashes, self.capacity, h, key)
+
+    # Insert a key,value pair to the hashtable, replacing the value of an existing key
+    # Input:  key - string
+    # 		  value - anything
+    # Output: void
+    def insertLP(self, key, value):
+        h = self.hash_function(key)
+        index = self._locate(h, key)
+        if index is not None:
+            self.values[index] = value
+            return
+        # Grow once the load factor would go above the threshold
+        new_capacity = self.resize.new_capacity(self.size + 1, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        if self.size >= self.capacity:
+            # Checked before _place, whose Robin Hood swaps would drop an entry of a full table
+            raise RuntimeError("hash table is full")
+        self.probes += self._place(h, key, value)
+        self.size += 1
+
+    # Find a data value based on key
+    # Input:  key - string
+    # Output: value stored under "key" or None if not found
+    def find(self, key):
+        index = self._locate(self.hash_function(key), key)
+        if index is None:
+            return None
+        return self.values[index]
+
+    # Remove the entry stored at key, shifting the entries after it back one slot
+    # Input:  key - string
+    # Output: removed data value or None if not found
+    def removeLP(self, key):
+        index = self._locate(self.hash_function(key), key)
+        if index is None:
+            return None
+        result = self._remove_slot(index)
+        # Shrink once the load factor drops below the threshold
+        new_capacity = self.resize.new_capacity(self.size, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        return result
+
+    # Empty a slot, shifting the entries after it back one slot
+    # Output: the value that was in the slot
+    def _remove_slot(self, index):
+        keys, values, hashes, capacity = self.keys, self.values, self.hashes, self.capacity
+        result = values[index]
+        following = (index + 1) % capacity
+        # Every entry up to the next empty slot or entry at its home moves one slot closer to home
+        while hashes[following] is not None and (following - hashes[following]) % capacity:
+            keys[index], values[index], hashes[index] = keys[following], values[following], hashes[following]
+            index = following
+            following = (following + 1) % capacity
+        keys[index] = values[index] = hashes[index] = None
+        self.size -= 1
+        return result
+
+    # Names shared by all the hash tables, so callers need not know which table they have
+    def insert(self, key, value):
+        self.insertLP(key, value)
+
+    def remove(self, key):
+        return self.removeLP(key)
+
+    # Finish any resize in progress and grow at once to hold size entries, so that the home slot
+    # of every key stays fixed for a whole batch operation
+    def _reserve(self, size):
+        self.finish_resize()
+        new_capacity = self.resize.capacity_for(size, self.capacity)
+        if new_capacity != self.capacity:
+            self._resize(new_capacity)
+            self.finish_resize()
+
+    # Insert many key,value pairs, hashing them all first and probing in order of home slot.
+    # Existing keys get their value replaced; for a key repeated in the batch the last value wins.
+    # Input:  items - iterable of (key, value)
+    #         hashes - the hashes of the keys if they are already known, in the order of items
+    # Output: void
+    def insert_many(self, items, hashes=None):
+        items = list(items)
+        self._reserve(self.size + len(items))
+        hashes, order = hash_batch(self.hash_function, [key for key, _ in items], self.capacity, hashes)
+        keys, values, capacity = self.keys, self.values, self.capacity
+        for position in order:
+            key, value = items[position]
+            h = hashes[position]
+            index = self._lookup(keys, self.hashes, capacity, h, key)
+            if index is not None:
+                values[index] = value
+            else:
+                if self.size >= capacity:
+                    raise RuntimeError("hash table is full")
+                self.probes += self._place(h, key, value)
+                self.size += 1
+        self.operations += len(items)
+
+    # Find many keys, hashing them all first and probing in order of home slot
+    # Input:  keys - iterable of keys
+    # Output: list of the value stored under each key, or None if not found, in input order
+    def find_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        results = [None] * len(keys)
+        for position in order:
+            index = self._lookup(self.keys, self.hashes, self.capacity, hashes[position], keys[position])
+            if index is not None:
+                results[position] = self.values[index]
+        self.operations += len(keys)
+        return results
+
+    # Remove many keys, hashing them all first and probing in order of home slot
+    # Input:  keys - iterable of keys
+    # Output: list of the removed value for each key, or None if not found, in input order
+    def remove_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        results = [None] * len(keys)
+        for position in order:
+            index = self._lookup(self.keys, self.hashes, self.capacity, hashes[position], keys[position])
+            if index is not None:
+                results[position] = self._remove_slot(index)
+        self.operations += len(keys)
+        # Shrink once the load factor drops below the threshold
+        new_capacity = self.resize.new_capacity(self.size, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        return results
+
+    # Finish a resize in progress, so that every entry is in the current arrays
+    def finish_resize(self):
+        self.resize.step(self._move_slot, count=None)
+
+    # Probe lengths: how many slots a lookup of each stored key inspects (average and max), and
+    # the slots actually inspected per find, insertLP and removeLP call so far
+    def probe_stats(self):
+        self.finish_resize()
+        capacity = self.capacity
+        lengths = [(index - h) % capacity + 1 for index, h in enumerate(self.hashes) if h is not None]
+        return {'entries': len(lengths),
+                'average_probe_length': sum(lengths) / len(lengths) if lengths else 0.0,
+                'max_probe_length': max(lengths, default=0),
+                'operations': self.operations,
+                'probes_per_operation': self.probes / self.operations if self.operations else 0.0}
+
+    def __str__(self):
+        self.finish_resize()
+        return str([(key, value) for key, value, h in zip(self.keys, self.values, self.hashes) if h is not None])
+
+    # Write the entries to a binary snapshot file, see the snapshot module
+    # Input:  path - file to write
+    def save(self, path):
+        from snapshot import save_table
+        self.finish_resize()
+        keys = [key for key, h in zip(self.keys, self.hashes) if h is not None]
+        values = [value for value, h in zip(self.values, self.hashes) if h is not None]
+        save_table(self, path, keys, values, [h for h in self.hashes if h is not None])
+
+    # Rebuild a table saved with save. The saved hashes are reused if the given hash function
+    # produces them, else the keys are hashed again.
+    # Input:  path - file written by save
+    #         hash_function, seed - as for the constructor
+    # Output: the new table
+    @classmethod
+    def load(cls, path, hash_function='power', seed=0):
+        from snapshot import load_table
+        return load_table(cls, path, hash_function, seed)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self._locate(self.hash_function(key), key) is not None
+
+    def printAll(self):
+        self.finish_resize()
+        for i, h in enumerate(self.hashes):
+            print(i, end=" ")
+            if h is not None:
+                print(f"--> Key: {self.keys[i]}, Value: {self.values[i]}", end=" ")
+            print("\n")
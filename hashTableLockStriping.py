@@ -0,0 +1,266 @@
+import threading
+from time import perf_counter
+
+from hashFunctions import get_hash_function, hash_batch
+from hashTableResize import IncrementalResize
+
+
+class Node:
+    __slots__ = ('key', 'value', 'hash', 'next')
+
+    def __init__(self, key, value, h, next_node):
+        self.key = key
+        self.value = value
+        self.hash = h
+        self.next = next_node
+
+
+# Hash table with separate chaining that can be shared between threads.
+# Writers lock one of a fixed number of stripes: bucket i belongs to stripe i % stripes, and the
+# capacity is always a multiple of the number of stripes, so all keys of a bucket stay in the same
+# stripe across resizes and writers of different stripes never touch the same chain.
+# Lookups take no lock. A node's next link never changes once the node is in a chain: inserts add
+# a node at the head, and removes copy the nodes in front of the removed one, so a reader walking a
+# chain always sees a consistent one. A resize locks every stripe, in order, copies the chains into
+# a new bucket array and publishes it with a single assignment; readers still holding the old
+# array see the table as it was before the resize.
+# The table only grows. Keys are unique: inserting an existing key replaces its value.
+class HashTableStriped:
+    # Initialize hash table
+    # Input:  INITIAL_CAPACITY - rounded up to a multiple of stripes
+    #         hash_function - name from hashFunctions.HASH_FUNCTIONS or a callable key -> int
+    #         seed - seed for a named hash function
+    #         max_load_factor - grow once size / capacity goes above this
+    #         stripes - number of locks
+    def __init__(self, INITIAL_CAPACITY = 64, hash_function='power', seed=0, max_load_factor=1.0, stripes=16):
+        if stripes < 1:
+            raise ValueError("stripes must be positive")
+        self.stripes = stripes
+        capacity = -(-max(INITIAL_CAPACITY, 1) // stripes) * stripes
+        self.buckets = [None] * capacity
+        self.hash_function = get_hash_function(hash_function, seed)
+        self.resize = IncrementalResize(capacity, max_load_factor)
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        # Entries, and lock acquisitions that had to wait for another thread, per stripe
+        self.counts = [0] * stripes
+        self.contended = [0] * stripes
+
+    @property
+    def capacity(self):
+        return len(self.buckets)
+
+    @property
+    def size(self):
+        return sum(self.counts)
+
+    # Generate a hash for a given key
+    # Input:  key - string, or any key the hash function supports
+    # Output: Index from 0 to self.capacity
+    def hash(self, key):
+        return self.hash_function(key) % self.capacity
+
+    # Lock stripe, counting the acquisitions that are contended
+    # Output: the acquired lock
+    def _acquire(self, stripe):
+        lock = self.locks[stripe]
+        if not lock.acquire(False):
+            lock.acquire()
+            self.contended[stripe] += 1
+        return lock
+
+    # Node of key in the chain starting at node, or None
+    @staticmethod
+    def _search(node, h, key):
+        while node is not None and (node.hash != h or node.key != key):
+            node = node.next
+        return node
+
+    # Add or replace key in bucket index, with the stripe of the bucket locked
+    # Output: True if the key was added
+    def _put(self, buckets, index, h, key, value):
+        head = buckets[index]
+        node = self._search(head, h, key)
+        if node is not None:
+            node.value = value
+            return False
+        buckets[index] = Node(key, value, h, head)
+        self.counts[index % self.stripes] += 1
+        return True
+
+    # Remove key from bucket index, with the stripe of the bucket locked
+    # Output: the removed node, or None if key is not there
+    def _pop(self, buckets, index, h, key):
+        head = buckets[index]
+        node = self._search(head, h, key)
+        if node is None:
+            return None
+        # Copy the nodes in front of the removed one, so readers already on the chain are unaffected
+        rest = node.next
+        front = []
+        current = head
+        while current is not node:
+            front.append(current)
+            current = current.next
+        for previous in reversed(front):
+            rest = Node(previous.key, previous.value, previous.hash, rest)
+        buckets[index] = rest
+        self.counts[index % self.stripes] -= 1
+        return node
+
+    # Grow to new_capacity unless another thread resized from old_capacity already
+    def _resize(self, old_capacity, new_capacity):
+        for stripe in range(self.stripes):
+            self._acquire(stripe)
+        try:
+            if self.capacity != old_capacity:
+                return
+            started = perf_counter()
+            old_buckets = self.buckets
+            new_buckets = [None] * new_capacity
+
+            # Copy an old chain into the new array; the old nodes are left as they are for readers
+            def copy_bucket(old_index):
+                node = old_buckets[old_index]
+                while node is not None:
+                    index = node.hash % new_capacity
+                    new_buckets[index] = Node(node.key, node.value, node.hash, new_buckets[index])
+                    node = node.next
+
+            self.resize.begin(old_buckets, old_capacity, new_capacity, started)
+            self.resize.step(copy_bucket, count=None)
+            self.buckets = new_buckets
+        finally:
+            for lock in self.locks:
+                lock.release()
+
+    # Grow once the load factor goes above the threshold
+    def _check_load(self, size):
+        capacity = self.capacity
+        new_capacity = self.resize.new_capacity(size, capacity)
+        if new_capacity is not None:
+            self._resize(capacity, new_capacity)
+
+    # Insert a key,value pair to the hashtable, replacing the value of an existing key
+    # Input:  key - string
+    # 		  value - anything
+    # Output: void
+    def insert(self, key, value):
+        h = self.hash_function(key)
+        lock = self._acquire(h % self.stripes)
+        try:
+            # Read the bucket array under the lock, a resize cannot replace it meanwhile
+            buckets = self.buckets
+            added = self._put(buckets, h % len(buckets), h, key, value)
+        finally:
+            lock.release()
+        if added:
+            self._check_load(self.size)
+
+    # Find a data value based on key, without locking
+    # Input:  key - string
+    # Output: value stored under "key" or None if not found
+    def find(self, key):
+        h = self.hash_function(key)
+        buckets = self.buckets
+        node = self._search(buckets[h % len(buckets)], h, key)
+        return None if node is None else node.value
+
+    # Remove the entry stored at key
+    # Input:  key - string
+    # Output: removed data value or None if not found
+    def remove(self, key):
+        h = self.hash_function(key)
+        lock = self._acquire(h % self.stripes)
+        try:
+            buckets = self.buckets
+            node = self._pop(buckets, h % len(buckets), h, key)
+        finally:
+            lock.release()
+        return None if node is None else node.value
+
+    # Keys of a batch grouped by stripe, in bucket order within a stripe
+    # Output: (hashes, list of the key positions of every stripe)
+    def _by_stripe(self, keys):
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        groups = [[] for _ in range(self.stripes)]
+        for position in order:
+            groups[hashes[position] % self.stripes].append(position)
+        return hashes, groups
+
+    # Insert many key,value pairs, locking each stripe once
+    # Input:  items - iterable of (key, value)
+    # Output: void
+    def insert_many(self, items):
+        items = list(items)
+        capacity = self.capacity
+        new_capacity = self.resize.capacity_for(self.size + len(items), capacity)
+        if new_capacity != capacity:
+            self._resize(capacity, new_capacity)
+        hashes, groups = self._by_stripe([key for key, _ in items])
+        for stripe, positions in enumerate(groups):
+            if not positions:
+                continue
+            lock = self._acquire(stripe)
+            try:
+                buckets = self.buckets
+                for position in positions:
+                    h = hashes[position]
+                    key, value = items[position]
+                    self._put(buckets, h % len(buckets), h, key, value)
+            finally:
+                lock.release()
+        self._check_load(self.size)
+
+    # Find many keys, without locking
+    # Input:  keys - iterable of keys
+    # Output: list of the value stored under each key, or None if not found, in input order
+    def find_many(self, keys):
+        keys = list(keys)
+        buckets = self.buckets
+        capacity = len(buckets)
+        hashes, order = hash_batch(self.hash_function, keys, capacity)
+        results = [None] * len(keys)
+        for position in order:
+            h = hashes[position]
+            node = self._search(buckets[h % capacity], h, keys[position])
+            if node is not None:
+                results[position] = node.value
+        return results
+
+    # Remove many keys, locking each stripe once
+    # Input:  keys - iterable of keys
+    # Output: list of the removed value for each key, or None if not found, in input order
+    def remove_many(self, keys):
+        keys = list(keys)
+        hashes, groups = self._by_stripe(keys)
+        results = [None] * len(keys)
+        for stripe, positions in enumerate(groups):
+            if not positions:
+                continue
+            lock = self._acquire(stripe)
+            try:
+                buckets = self.buckets
+                for position in positions:
+                    h = hashes[position]
+                    node = self._pop(buckets, h % len(buckets), h, keys[position])
+                    if node is not None:
+                        results[position] = node.value
+            finally:
+                lock.release()
+        return results
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        h = self.hash_function(key)
+        buckets = self.buckets
+        return self._search(buckets[h % len(buckets)], h, key) is not None
+
+    def printAll(self):
+        for i, node in enumerate(self.buckets):
+            print(i, end=" ")
+            while node is not None:
+                print(f"--> Key: {node.key}, Value: {node.value}", end=" ")
+                node = node.next
+            print("\n")
@@ -0,0 +1,93 @@
+from time import perf_counter
+
+
+# Load-factor-driven, incremental resizing shared by the hash tables.
+# When a table grows past max_load_factor (or, if min_load_factor is set, shrinks below it) it
+# allocates a new bucket array and keeps the old one next to it. Every following operation moves
+# the next rehash_step old buckets over, so no single operation pays for a full O(n) rehash.
+class IncrementalResize:
+    # Input:  initial_capacity - the table never shrinks below this capacity
+    #         max_load_factor - grow once size / capacity goes above this
+    #         min_load_factor - shrink once size / capacity drops below this, 0 to never shrink
+    #         rehash_step - old buckets moved per table operation while resizing
+    #         growth_factor - capacity multiplier of a grow, divisor of a shrink
+    def __init__(self, initial_capacity, max_load_factor, min_load_factor=0.0, rehash_step=4, growth_factor=2):
+        if max_load_factor <= 0:
+            raise ValueError("max_load_factor must be positive")
+        if min_load_factor * growth_factor >= max_load_factor:
+            raise ValueError("min_load_factor * growth_factor must be below max_load_factor")
+        self.initial_capacity = initial_capacity
+        self.max_load_factor = max_load_factor
+        self.min_load_factor = min_load_factor
+        self.rehash_step = max(1, rehash_step)
+        self.growth_factor = growth_factor
+        # The bucket array being emptied, and the next of its buckets to move
+        self.old_buckets = None
+        self.old_capacity = 0
+        self.index = 0
+        self.grows = 0
+        self.shrinks = 0
+        # Rebuilds at the same capacity, e.g. to drop tombstones
+        self.cleanups = 0
+        # Seconds spent on each finished resize, allocation and every incremental step included
+        self.resize_times = []
+        self._elapsed = 0.0
+
+    @property
+    def resizing(self):
+        return self.old_buckets is not None
+
+    # Input:  size, capacity - the table after the operation about to run
+    # Output: the capacity to resize to, or None if the load factor is within bounds
+    def new_capacity(self, size, capacity):
+        if size > capacity * self.max_load_factor:
+            return capacity * self.growth_factor
+        if self.min_load_factor and capacity > self.initial_capacity and size < capacity * self.min_load_factor:
+            return max(self.initial_capacity, capacity // self.growth_factor)
+        return None
+
+    # Output: the capacity a table needs to hold size entries under max_load_factor, never below capacity
+    def capacity_for(self, size, capacity):
+        while size > capacity * self.max_load_factor:
+            capacity *= self.growth_factor
+        return capacity
+
+    # Start moving old_buckets into a freshly allocated array
+    # Input:  started - perf_counter() before the new array was allocated
+    def begin(self, old_buckets, old_capacity, new_capacity, started):
+        self.old_buckets = old_buckets
+        self.old_capacity = old_capacity
+        self.index = 0
+        if new_capacity > old_capacity:
+            self.grows += 1
+        elif new_capacity < old_capacity:
+            self.shrinks += 1
+        else:
+            self.cleanups += 1
+        self._elapsed = perf_counter() - started
+
+    # Move old buckets with move(bucket_index)
+    # Input:  move - the table's function that moves one old bucket into the new array
+    #         bucket - an old bucket the caller needs moved now, if it has not been moved yet
+    #         count - number of buckets to move in order, None for all that are left
+    def step(self, move, bucket=None, count=-1):
+        if self.old_buckets is None:
+            return
+        start = perf_counter()
+        if bucket is not None and bucket >= self.index:
+            move(bucket)
+        if count == -1:
+            count = self.rehash_step
+        end = self.old_capacity if count is None else min(self.index + count, self.old_capacity)
+        while self.index < end:
+            move(self.index)
+            self.index += 1
+        self._elapsed += perf_counter() - start
+        if self.index >= self.old_capacity:
+            self.resize_times.append(self._elapsed)
+            self.old_buckets = None
+
+    def stats(self):
+        return {'resizes': len(self.resize_times), 'grows': self.grows, 'shrinks': self.shrinks,
+                'cleanups': self.cleanups, 'resize_times': list(self.resize_times), 'resizing': self.resizing,
+                'max_load_factor': self.max_load_factor, 'min_load_factor': self.min_load_factor}
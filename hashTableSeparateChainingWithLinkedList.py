@@ -1,5 +1,13 @@
+from time import perf_counter
+
+from hashFunctions import get_hash_function, hash_batch
+from hashTableResize import IncrementalResize
+
+
 # Node data structure - essentially a LinkedList node
 class Node:
+    __slots__ = ('key', 'value', 'next')
+
     def __init__(self, key, value):
         self.key = key
         self.value = value
@@ -15,29 +23,70 @@ class Node:
 # Hash table with separate chaining
 class HashTable:
     # Initialize hash table
-    def __init__(self, INITIAL_CAPACITY = 50):
+    # Input:  hash_function - name from hashFunctions.HASH_FUNCTIONS or a callable key -> int
+    #         seed - seed for a named hash function
+    #         max_load_factor - grow once size / capacity goes above this
+    #         min_load_factor - shrink on remove once size / capacity drops below this, 0 to never shrink
+    #         rehash_step - buckets moved to the new array per operation while resizing
+    def __init__(self, INITIAL_CAPACITY = 50, hash_function='power', seed=0,
+                 max_load_factor=1.0, min_load_factor=0.0, rehash_step=4):
         self.capacity = INITIAL_CAPACITY
         self.size = 0
         self.buckets = [None] * self.capacity
+        self.hash_function = get_hash_function(hash_function, seed)
+        self.resize = IncrementalResize(INITIAL_CAPACITY, max_load_factor, min_load_factor, rehash_step)
 
     # Generate a hash for a given key
-    # Input:  key - string
+    # Input:  key - string, or any key the hash function supports
     # Output: Index from 0 to self.capacity
     def hash(self, key):
-        hashsum = 0
-        # For each character in the key
-        for index, c in enumerate(key):
-            # Add (index + length of key) ^ (current char code)
-            hashsum += (index + len(key)) ** ord(c)
-            # Perform modulus to keep hashsum in range [0, self.capacity - 1]
-            hashsum = hashsum % self.capacity
-        return hashsum
+        return self.hash_function(key) % self.capacity
+
+    # Start moving every bucket into a new array of new_capacity buckets
+    def _resize(self, new_capacity):
+        started = perf_counter()
+        # A resize still in progress is finished first
+        self.resize.step(self._move_bucket, count=None)
+        old_buckets, old_capacity = self.buckets, self.capacity
+        self.capacity = new_capacity
+        self.buckets = [None] * new_capacity
+        self.resize.begin(old_buckets, old_capacity, new_capacity, started)
+
+    # Move the chain of an old bucket to the end of the chains of the new array, keeping its order
+    def _move_bucket(self, old_index):
+        old_buckets = self.resize.old_buckets
+        node = old_buckets[old_index]
+        old_buckets[old_index] = None
+        while node is not None:
+            next_node = node.next
+            node.next = None
+            index = self.hash(node.key)
+            tail = self.buckets[index]
+            if tail is None:
+                self.buckets[index] = node
+            else:
+                while tail.next is not None:
+                    tail = tail.next
+                tail.next = node
+            node = next_node
+
+    # While resizing, move the old bucket of key and the next few old buckets, so that
+    # key only has to be looked up in the new array
+    def _rehash_step(self, key):
+        resize = self.resize
+        if resize.old_buckets is not None:
+            resize.step(self._move_bucket, self.hash_function(key) % resize.old_capacity)
 
     # Insert a key,value pair to the hashtable
     # Input:  key - string
     # 		  value - anything
     # Output: void
     def insertSC(self, key, value):
+        # Grow once the load factor would go above the threshold
+        new_capacity = self.resize.new_capacity(self.size + 1, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        self._rehash_step(key)
         # 1. Increment size
         self.size += 1
         # 2. Compute index of key
@@ -57,33 +106,11 @@ class HashTable:
         # Add a new node at the end of the list with provided key/value
         prev.next = Node(key, value)
 
-    # Insert a key,value pair to the hashtable
-    # Input:  key - string
-    # 		  value - anything
-    # Output: void
-    def insertLP(self, key, value):
-        # 1. Increment size
-        self.size += 1
-        # 2. Compute index of key
-        index = self.hash(key)
-        prev = self.buckets[index]
-        # 3. If bucket is empty:
-        if self.buckets[index] is None:
-            # Create node, add it, return
-            self.buckets[index] = Node(key, value)
-            return
-
-        while self.buckets[index] is not None:
-            index = index + 1
-
-        # Add a new node at the end of the list with provided key/value
-        self.buckets[index] = Node(key, value)
-        prev.next = Node(key, value)
-
     # Find a data value based on key
     # Input:  key - string
     # Output: value stored under "key" or None if not found
     def find(self, key):
+        self._rehash_step(key)
         # 1. Compute hash
         index = self.hash(key)
         # 2. Go to first node in list at bucket
@@ -97,12 +124,13 @@ class HashTable:
             return None
         else:
             # Found - return the data value
-            return node
+            return node.value
 
     # Remove node stored at key
     # Input:  key - string
     # Output: removed data value or None if not found
     def removeSC(self, key):
+        self._rehash_step(key)
         # 1. Compute hash
         index = self.hash(key)
         node = self.buckets[index]
@@ -124,34 +152,108 @@ class HashTable:
                 self.buckets[index] = node.next  # May be None, or the next match
             else:
                 prev.next = prev.next.next  # LinkedList delete by skipping over
+            # Shrink once the load factor drops below the threshold
+            new_capacity = self.resize.new_capacity(self.size, self.capacity)
+            if new_capacity is not None:
+                self._resize(new_capacity)
             # Return the deleted result
             return result
 
-    def removeLP(self, key):
-        # 1. Compute hash
-        index = self.hash(key)
-        node = self.buckets[index]
-        prev = self.buckets[index]
-        # 2. Iterate to the requested node
-        while node is not None and node.key != key:
-            node = node.next
-        # Now, node is either the requested node or none
-        if node is None:
-            # 3. Key not found
-            return None
-        else:
-            # 4. The key was found.
-            self.size -= 1
-            result = node.value
-            # Delete this element in linked list
-            if prev is None:
-                self.buckets[index] = node.next  # May be None, or the next match
-            else:
-                prev.next = prev.next.next  # LinkedList delete by skipping over
-            # Return the deleted result
-            return result
+    # Names shared by all the hash tables, so callers need not know which table they have
+    def insert(self, key, value):
+        self.insertSC(key, value)
+
+    def remove(self, key):
+        return self.removeSC(key)
+
+    # Finish any resize in progress and grow at once to hold size entries, so that the bucket of
+    # every key stays fixed for a whole batch operation
+    def _reserve(self, size):
+        self.finish_resize()
+        new_capacity = self.resize.capacity_for(size, self.capacity)
+        if new_capacity != self.capacity:
+            self._resize(new_capacity)
+            self.finish_resize()
+
+    # Insert many key,value pairs, hashing them all first and appending to one bucket at a time
+    # Input:  items - iterable of (key, value)
+    # Output: void
+    def insert_many(self, items):
+        items = list(items)
+        self._reserve(self.size + len(items))
+        hashes, order = hash_batch(self.hash_function, [key for key, _ in items], self.capacity)
+        buckets, capacity = self.buckets, self.capacity
+        tail = None
+        tail_index = -1
+        for position in order:
+            index = hashes[position] % capacity
+            node = Node(*items[position])
+            if index != tail_index:
+                # First key of this bucket in the batch: walk to the end of its chain once
+                tail_index = index
+                tail = buckets[index]
+                if tail is None:
+                    buckets[index] = tail = node
+                    continue
+                while tail.next is not None:
+                    tail = tail.next
+            tail.next = tail = node
+        self.size += len(items)
+
+    # Find many keys, hashing them all first and visiting one bucket at a time
+    # Input:  keys - iterable of keys
+    # Output: list of the value stored under each key, or None if not found, in input order
+    def find_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        buckets, capacity = self.buckets, self.capacity
+        results = [None] * len(keys)
+        for position in order:
+            key = keys[position]
+            node = buckets[hashes[position] % capacity]
+            while node is not None and node.key != key:
+                node = node.next
+            if node is not None:
+                results[position] = node.value
+        return results
+
+    # Remove many keys, hashing them all first and visiting one bucket at a time
+    # Input:  keys - iterable of keys
+    # Output: list of the removed value for each key, or None if not found, in input order
+    def remove_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        buckets, capacity = self.buckets, self.capacity
+        results = [None] * len(keys)
+        for position in order:
+            key = keys[position]
+            index = hashes[position] % capacity
+            node = buckets[index]
+            prev = None
+            while node is not None and node.key != key:
+                prev = node
+                node = node.next
+            if node is not None:
+                if prev is None:
+                    buckets[index] = node.next
+                else:
+                    prev.next = node.next
+                self.size -= 1
+                results[position] = node.value
+        # Shrink once the load factor drops below the threshold
+        new_capacity = self.resize.new_capacity(self.size, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        return results
+
+    # Finish a resize in progress, so that every entry is in self.buckets
+    def finish_resize(self):
+        self.resize.step(self._move_bucket, count=None)
 
     def __str__(self):
+        self.finish_resize()
         elements = []
         for i in range(self.capacity):
             node = self.buckets[i]
@@ -160,6 +262,28 @@ class HashTable:
                 node = node.next
         return str(elements)
 
+    # Write the entries to a binary snapshot file, see the snapshot module
+    # Input:  path - file to write
+    def save(self, path):
+        from snapshot import save_table
+        self.finish_resize()
+        keys, values = [], []
+        for node in self.buckets:
+            while node is not None:
+                keys.append(node.key)
+                values.append(node.value)
+                node = node.next
+        save_table(self, path, keys, values)
+
+    # Rebuild a table saved with save, hashing the keys again with the given hash function
+    # Input:  path - file written by save
+    #         hash_function, seed - as for the constructor
+    # Output: the new table
+    @classmethod
+    def load(cls, path, hash_function='power', seed=0):
+        from snapshot import load_table
+        return load_table(cls, path, hash_function, seed)
+
     def __len__(self):
         return self.size
 
@@ -171,6 +295,7 @@ class HashTable:
             return False
 
     def printAll(self):
+        self.finish_resize()
         for i, bucket in enumerate(self.buckets):
             print(i, end=" ")
             if bucket is not None:
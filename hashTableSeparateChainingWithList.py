@@ -1,93 +1,300 @@
-# Node data structure - essentially a LinkedList node
-class Node:
-    def __init__(self, key, value):
-        self.key = key
-        self.value = value
+from array import array
+from time import perf_counter
 
-    def __str__(self):
-        return "<Node: (%s, %s)" % (self.key, self.value)
+from hashFunctions import get_hash_function, hash_batch
+from hashTableResize import IncrementalResize
 
-    def __repr__(self):
-        return str(self)
+# End of a chain, and the head of an empty bucket
+EMPTY = -1
 
 
-# Hash table with separate chaining
+# Hash table with separate chaining on flat arrays
+# Entries live contiguously in parallel lists - keys, values - and arrays of their full hashes and
+# of the next entry in the same bucket, so there is no object per entry and no list per bucket.
+# self.buckets is an array holding the first entry of every bucket's chain. Removing an entry moves
+# the last entry into its place, so the entries stay contiguous.
+# Hash functions must return integers in [0, 2 ** 64), as all of hashFunctions do.
 class HashTableSC:
     # Initialize hash table
-    def __init__(self, INITIAL_CAPACITY = 50):
+    # Input:  hash_function - name from hashFunctions.HASH_FUNCTIONS or a callable key -> int
+    #         seed - seed for a named hash function
+    #         max_load_factor - grow once size / capacity goes above this
+    #         min_load_factor - shrink on remove once size / capacity drops below this, 0 to never shrink
+    #         rehash_step - buckets moved to the new array per operation while resizing
+    def __init__(self, INITIAL_CAPACITY = 50, hash_function='power', seed=0,
+                 max_load_factor=1.0, min_load_factor=0.0, rehash_step=4):
         self.capacity = INITIAL_CAPACITY
         self.size = 0
-        self.buckets = [[] for _ in range(self.capacity)]
+        self.buckets = array('q', [EMPTY]) * self.capacity
+        self.keys = []
+        self.values = []
+        self.hashes = array('Q')
+        self.next = array('q')
+        self.hash_function = get_hash_function(hash_function, seed)
+        self.resize = IncrementalResize(INITIAL_CAPACITY, max_load_factor, min_load_factor, rehash_step)
 
     # Generate a hash for a given key
-    # Input:  key - string
+    # Input:  key - string, or any key the hash function supports
     # Output: Index from 0 to self.capacity
     def hash(self, key):
-        hashsum = 0
-        # For each character in the key
-        for index, c in enumerate(key):
-            # Add (index + length of key) ^ (current char code)
-            hashsum += (index + len(key)) ** ord(c)
-            # Perform modulus to keep hashsum in range [0, self.capacity - 1]
-            hashsum = hashsum % self.capacity
-        return hashsum
+        return self.hash_function(key) % self.capacity
+
+    # Start moving every bucket into a new array of new_capacity buckets. Only the chain links
+    # change; the entries stay where they are.
+    def _resize(self, new_capacity):
+        started = perf_counter()
+        # A resize still in progress is finished first
+        self.resize.step(self._move_bucket, count=None)
+        old_buckets, old_capacity = self.buckets, self.capacity
+        self.capacity = new_capacity
+        self.buckets = array('q', [EMPTY]) * new_capacity
+        self.resize.begin(old_buckets, old_capacity, new_capacity, started)
+
+    # Append entry to the end of the chain of bucket index in self.buckets
+    def _append(self, index, entry):
+        following = self.next
+        following[entry] = EMPTY
+        current = self.buckets[index]
+        if current == EMPTY:
+            self.buckets[index] = entry
+            return
+        while following[current] != EMPTY:
+            current = following[current]
+        following[current] = entry
+
+    # Move the chain of an old bucket to the chains of the new array, keeping its order
+    def _move_bucket(self, old_index):
+        old_buckets = self.resize.old_buckets
+        entry = old_buckets[old_index]
+        old_buckets[old_index] = EMPTY
+        hashes, following, capacity = self.hashes, self.next, self.capacity
+        while entry != EMPTY:
+            next_entry = following[entry]
+            self._append(hashes[entry] % capacity, entry)
+            entry = next_entry
+
+    # While resizing, move the old bucket of hash h and the next few old buckets, so that
+    # the key only has to be looked up in the new array
+    def _rehash_step(self, h):
+        resize = self.resize
+        if resize.old_buckets is not None:
+            resize.step(self._move_bucket, h % resize.old_capacity)
+
+    # Entry of key in the chain of bucket index and the entry before it
+    # Output: (entry or EMPTY, previous entry or EMPTY if it is the head)
+    def _search(self, index, h, key):
+        hashes, keys, following = self.hashes, self.keys, self.next
+        previous = EMPTY
+        entry = self.buckets[index]
+        while entry != EMPTY and (hashes[entry] != h or keys[entry] != key):
+            previous = entry
+            entry = following[entry]
+        return entry, previous
+
+    # Point whatever links to entry - a bucket head or the entry before it in its chain, in the new
+    # or, while resizing, the old bucket array - at target instead
+    def _relink(self, entry, target):
+        h = self.hashes[entry]
+        following = self.next
+        for heads, capacity in ((self.buckets, self.capacity), (self.resize.old_buckets, self.resize.old_capacity)):
+            if heads is None:
+                continue
+            index = h % capacity
+            current = heads[index]
+            if current == entry:
+                heads[index] = target
+                return
+            while current != EMPTY:
+                if following[current] == entry:
+                    following[current] = target
+                    return
+                current = following[current]
+
+    # Unlink entry from the chain of bucket index and fill its place with the last entry
+    # Output: the value of the removed entry
+    def _remove_entry(self, index, entry, previous):
+        keys, values, hashes, following = self.keys, self.values, self.hashes, self.next
+        if previous == EMPTY:
+            self.buckets[index] = following[entry]
+        else:
+            following[previous] = following[entry]
+        result = values[entry]
+        last = len(keys) - 1
+        if entry != last:
+            self._relink(last, entry)
+            keys[entry], values[entry], hashes[entry], following[entry] = \
+                keys[last], values[last], hashes[last], following[last]
+        keys.pop()
+        values.pop()
+        hashes.pop()
+        following.pop()
+        self.size -= 1
+        return result
+
+    # Add an entry at the end of the entry arrays and of the chain of its bucket
+    def _add_entry(self, h, key, value):
+        entry = len(self.keys)
+        self.keys.append(key)
+        self.values.append(value)
+        self.hashes.append(h)
+        self.next.append(EMPTY)
+        self._append(h % self.capacity, entry)
+        self.size += 1
 
     # Insert a key,value pair to the hashtable
     # Input:  key - string
     # 		  value - anything
     # Output: void
     def insertSC(self, key, value):
-        # 1. Increment size
-        self.size += 1
-        # 2. Compute index of key
-        index = self.hash(key)
-        bucket = self.buckets[index]
-        # Go to the node corresponding to the hash
-        bucket.append(Node(key, value))
+        # Grow once the load factor would go above the threshold
+        new_capacity = self.resize.new_capacity(self.size + 1, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        h = self.hash_function(key)
+        self._rehash_step(h)
+        self._add_entry(h, key, value)
 
     # Find a data value based on key
     # Input:  key - string
     # Output: value stored under "key" or None if not found
     def find(self, key):
-        # 1. Compute hash
-        index = self.hash(key)
-        # 2. Go to first node in list at bucket
-        bucket = self.buckets[index]
-        for node in bucket:
-            if node.key is None:
-                return None
-            else:
-                # Found - return the data value
-                return node
+        h = self.hash_function(key)
+        self._rehash_step(h)
+        entry, _ = self._search(h % self.capacity, h, key)
+        if entry == EMPTY:
+            return None
+        return self.values[entry]
 
-    # Remove node stored at key
+    # Remove the entry stored at key
     # Input:  key - string
     # Output: removed data value or None if not found
     def removeSC(self, key):
-        # 1. Compute hash
-        index = self.hash(key)
-        bucket = self.buckets[index]
-        # 2. Iterate to the requested node
-        for node in bucket:
-            if key in node.key:
-                bucket.remove(node)
-                return node
-        return f"{key} not found"
+        h = self.hash_function(key)
+        self._rehash_step(h)
+        index = h % self.capacity
+        entry, previous = self._search(index, h, key)
+        if entry == EMPTY:
+            return None
+        result = self._remove_entry(index, entry, previous)
+        # Shrink once the load factor drops below the threshold
+        new_capacity = self.resize.new_capacity(self.size, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        return result
+
+    # Names shared by all the hash tables, so callers need not know which table they have
+    def insert(self, key, value):
+        self.insertSC(key, value)
+
+    def remove(self, key):
+        return self.removeSC(key)
+
+    # Finish any resize in progress and grow at once to hold size entries, so that the bucket of
+    # every key stays fixed for a whole batch operation
+    def _reserve(self, size):
+        self.finish_resize()
+        new_capacity = self.resize.capacity_for(size, self.capacity)
+        if new_capacity != self.capacity:
+            self._resize(new_capacity)
+            self.finish_resize()
+
+    # Insert many key,value pairs, hashing them all first and appending to one bucket at a time
+    # Input:  items - iterable of (key, value)
+    #         hashes - the hashes of the keys if they are already known, in the order of items
+    # Output: void
+    def insert_many(self, items, hashes=None):
+        items = list(items)
+        self._reserve(self.size + len(items))
+        hashes, order = hash_batch(self.hash_function, [key for key, _ in items], self.capacity, hashes)
+        keys, values, following, capacity = self.keys, self.values, self.next, self.capacity
+        entry = len(keys)
+        # Entries are added bucket by bucket, so a bucket's new entries are contiguous
+        keys.extend(items[position][0] for position in order)
+        values.extend(items[position][1] for position in order)
+        self.hashes.extend(hashes[position] for position in order)
+        following.extend([EMPTY] * len(order))
+        tail_index = EMPTY
+        for position in order:
+            index = hashes[position] % capacity
+            if index != tail_index:
+                tail_index = index
+                self._append(index, entry)
+            else:
+                following[entry - 1] = entry
+            entry += 1
+        self.size += len(items)
+
+    # Find many keys, hashing them all first and visiting one bucket at a time
+    # Input:  keys - iterable of keys
+    # Output: list of the value stored under each key, or None if not found, in input order
+    def find_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        capacity, values, search = self.capacity, self.values, self._search
+        results = [None] * len(keys)
+        for position in order:
+            h = hashes[position]
+            entry, _ = search(h % capacity, h, keys[position])
+            if entry != EMPTY:
+                results[position] = values[entry]
+        return results
+
+    # Remove many keys, hashing them all first and visiting one bucket at a time
+    # Input:  keys - iterable of keys
+    # Output: list of the removed value for each key, or None if not found, in input order
+    def remove_many(self, keys):
+        keys = list(keys)
+        self.finish_resize()
+        hashes, order = hash_batch(self.hash_function, keys, self.capacity)
+        capacity = self.capacity
+        results = [None] * len(keys)
+        for position in order:
+            h = hashes[position]
+            index = h % capacity
+            entry, previous = self._search(index, h, keys[position])
+            if entry != EMPTY:
+                results[position] = self._remove_entry(index, entry, previous)
+        # Shrink once the load factor drops below the threshold
+        new_capacity = self.resize.new_capacity(self.size, self.capacity)
+        if new_capacity is not None:
+            self._resize(new_capacity)
+        return results
+
+    # Finish a resize in progress, so that every entry is in self.buckets
+    def finish_resize(self):
+        self.resize.step(self._move_bucket, count=None)
+
+    # Write the entries to a binary snapshot file, see the snapshot module. The entry arrays hold
+    # every entry even while resizing.
+    # Input:  path - file to write
+    def save(self, path):
+        from snapshot import save_table
+        save_table(self, path, self.keys, self.values, self.hashes)
+
+    # Rebuild a table saved with save. The saved hashes are reused if the given hash function
+    # produces them, else the keys are hashed again.
+    # Input:  path - file written by save
+    #         hash_function, seed - as for the constructor
+    # Output: the new table
+    @classmethod
+    def load(cls, path, hash_function='power', seed=0):
+        from snapshot import load_table
+        return load_table(cls, path, hash_function, seed)
 
     def __len__(self):
         return self.size
 
     def __contains__(self, key):
-        try:
-            self.find(key)
-            return True
-        except KeyError:
-            return False
+        h = self.hash_function(key)
+        self._rehash_step(h)
+        return self._search(h % self.capacity, h, key)[0] != EMPTY
 
     def printAll(self):
-        for i, bucket in enumerate(self.buckets):
+        self.finish_resize()
+        for i, entry in enumerate(self.buckets):
             print(i, end=" ")
-            if bucket is not None:
-                for node in bucket:
-                    print(f"--> Key: {node.key}, Value: {node.value}", end=" ")
-            print("\n")
\ No newline at end of file
+            while entry != EMPTY:
+                print(f"--> Key: {self.keys[entry]}, Value: {self.values[entry]}", end=" ")
+                entry = self.next[entry]
+            print("\n")
@@ -0,0 +1,417 @@
+import os
+import pickle
+import struct
+import threading
+import zlib
+
+from BPlusTree import BPlusTree
+
+LOG_MAGIC = b'BPTWAL01'
+CHECKPOINT_MAGIC = b'BPTCKPT1'
+DURABILITY = ('commit', 'batch', 'interval')
+
+# Record operations, each replayed with the tree method of the same name
+SET, INSERT, CHANGE, DELETE = 1, 2, 3, 4
+
+_record = struct.Struct('<IIB')  # payload length, crc32 of operation and payload, operation
+_lsn = struct.Struct('<Q')
+_length = struct.Struct('<I')
+_int = struct.Struct('<q')
+_float = struct.Struct('<d')
+
+
+def _encode(obj, out):
+    """Append a key or value to the bytearray out: a type tag, then ints, floats, strings and bytes
+    in a fixed binary form, and anything else pickled."""
+    kind = type(obj)
+    if obj is None:
+        out += b'n'
+    elif kind is int and -2 ** 63 <= obj < 2 ** 63:
+        out += b'i'
+        out += _int.pack(obj)
+    elif kind is float:
+        out += b'f'
+        out += _float.pack(obj)
+    elif kind is str or kind is bytes:
+        data = obj.encode() if kind is str else obj
+        out += b's' if kind is str else b'b'
+        out += _length.pack(len(data))
+        out += data
+    else:
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        out += b'p'
+        out += _length.pack(len(data))
+        out += data
+
+
+def _decode(data, offset):
+    """Read a key or value written by ``_encode``.
+    :return: the object and the offset after it
+    """
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b'n':
+        return None, offset
+    if tag == b'i':
+        return _int.unpack_from(data, offset)[0], offset + _int.size
+    if tag == b'f':
+        return _float.unpack_from(data, offset)[0], offset + _float.size
+    (size,) = _length.unpack_from(data, offset)
+    offset += _length.size
+    raw = bytes(data[offset:offset + size])
+    if tag == b's':
+        return raw.decode(), offset + size
+    if tag == b'b':
+        return raw, offset + size
+    if tag == b'p':
+        return pickle.loads(raw), offset + size
+    raise ValueError(f'unknown value tag {tag!r}')
+
+
+def encode_record(operation, key, value=None, out=None):
+    """Append one log record to out (a new bytearray if None) and return it."""
+    out = bytearray() if out is None else out
+    start = len(out)
+    out += bytes(_record.size)
+    _encode(key, out)
+    if operation != DELETE:
+        _encode(value, out)
+    payload = memoryview(out)[start + _record.size:]
+    crc = zlib.crc32(payload, zlib.crc32(bytes((operation,))))
+    _record.pack_into(out, start, len(payload), crc, operation)
+    payload.release()
+    return out
+
+
+def decode_records(data, offset=0):
+    """Yield (end offset, operation, key, value) for the records of data starting at offset.
+    Stops at the end of the data or at the first torn or corrupt record."""
+    while offset + _record.size <= len(data):
+        size, crc, operation = _record.unpack_from(data, offset)
+        start, end = offset + _record.size, offset + _record.size + size
+        if end > len(data) or zlib.crc32(data[start:end], zlib.crc32(bytes((operation,)))) != crc:
+            return
+        key, position = _decode(data, start)
+        value = _decode(data, position)[0] if operation != DELETE else None
+        yield end, operation, key, value
+        offset = end
+
+
+def write_checkpoint(path, lsn, items):
+    """Write the (key, value) pairs of a tree to path, replacing the file atomically.
+    :param lsn: the log sequence number the pairs are consistent with
+    """
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        out = bytearray(CHECKPOINT_MAGIC + _lsn.pack(lsn))
+        for key, value in items:
+            encode_record(SET, key, value, out)
+            if len(out) >= 1 << 20:
+                file.write(out)
+                out.clear()
+        file.write(out)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+    _sync_directory(path)
+
+
+def read_checkpoint(path):
+    """Read a checkpoint written by ``write_checkpoint``.
+    :return: the log sequence number and the list of (key, value) pairs in key order
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(CHECKPOINT_MAGIC):
+        raise ValueError(f'{path} is not a B+ tree checkpoint')
+    (lsn,) = _lsn.unpack_from(data, len(CHECKPOINT_MAGIC))
+    offset = len(CHECKPOINT_MAGIC) + _lsn.size
+    pairs, end = [], offset
+    for end, _, key, value in decode_records(data, offset):
+        pairs.append((key, value))
+    if end != len(data):
+        raise ValueError(f'{path} is corrupt at byte {end}')
+    return lsn, pairs
+
+
+def _sync_directory(path):
+    if hasattr(os, 'O_DIRECTORY'):
+        descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+
+class WriteAheadLog(object):
+    """Append-only log of tree mutations with group commit.
+    Records are buffered by ``append`` and written out by ``commit``. Whichever committing thread
+    finds no write in progress becomes the leader: it writes every record buffered so far and
+    fsyncs once, while the threads that committed meanwhile wait and are covered by the same fsync.
+    Log sequence numbers (LSNs) count the bytes ever appended and keep growing across truncations.
+    The durability level decides when a commit returns:
+        'commit': once its record is fsynced, so an acknowledged commit survives an OS crash
+        'batch': once its record is written to the OS, with an fsync every ``batch_size`` records
+        'interval': once its record is written to the OS, with an fsync every ``interval`` seconds
+    The last two survive a crash of the process; an OS crash loses at most the records since the
+    last fsync.
+    Attributes:
+        appended_lsn, written_lsn, durable_lsn: end of the records appended, written and fsynced
+        records, syncs: records appended and fsyncs done since the log was opened
+    """
+
+    def __init__(self, path, durability='commit', batch_size=64, interval=0.05, start_lsn=0):
+        if durability not in DURABILITY:
+            raise ValueError(f'durability must be one of {DURABILITY}')
+        self.path = path
+        self.durability = durability
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.base_lsn, data = self._open(start_lsn)
+        header = end = len(LOG_MAGIC) + _lsn.size
+        for end, _, _, _ in decode_records(data, header):
+            pass
+        # Cut off a record torn by a crash, so new records follow the last intact one
+        self.file = open(path, 'r+b')
+        self.file.truncate(end)
+        self.file.seek(end)
+        self.appended_lsn = self.written_lsn = self.durable_lsn = self.base_lsn + end - header
+        self.records = self.syncs = 0
+        self._synced_records = 0
+        self._buffer = bytearray()
+        self._flushing = False
+        self._condition = threading.Condition(threading.Lock())
+        self._closed = threading.Event()
+        self._flusher = None
+        if durability == 'interval':
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def _open(self, start_lsn):
+        """Read the log file, writing a fresh header first if it is missing or cut short.
+        :return: the LSN of the first record and the file contents
+        """
+        header = len(LOG_MAGIC) + _lsn.size
+        data = b''
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as file:
+                data = file.read()
+        if len(data) < header:
+            data = LOG_MAGIC + _lsn.pack(start_lsn)
+            with open(self.path, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            _sync_directory(self.path)
+        elif not data.startswith(LOG_MAGIC):
+            raise ValueError(f'{self.path} is not a B+ tree log')
+        return _lsn.unpack_from(data, len(LOG_MAGIC))[0], data
+
+    def replay(self):
+        """Yield (lsn, operation, key, value) for every intact record in the log file."""
+        with open(self.path, 'rb') as file:
+            data = file.read()
+        header = len(LOG_MAGIC) + _lsn.size
+        base = _lsn.unpack_from(data, len(LOG_MAGIC))[0]
+        for end, operation, key, value in decode_records(data, header):
+            yield base + end - header, operation, key, value
+
+    def append(self, operation, key, value=None):
+        """Buffer a record.
+        :return: its LSN, to pass to ``commit``
+        """
+        return self.append_records(encode_record(operation, key, value))
+
+    def append_records(self, data, count=1):
+        """Buffer count records already encoded with ``encode_record``.
+        :return: the LSN of the last, to pass to ``commit``
+        """
+        with self._condition:
+            self._buffer += data
+            self.appended_lsn += len(data)
+            self.records += count
+            return self.appended_lsn
+
+    def commit(self, lsn):
+        """Return once the record with this LSN is as durable as the durability level asks."""
+        if self.durability == 'commit':
+            self._flush(lsn, True)
+        else:
+            self._flush(lsn, self.durability == 'batch' and self.records - self._synced_records >= self.batch_size)
+
+    def sync(self):
+        """Write and fsync every record appended so far."""
+        self._flush(self.appended_lsn, True)
+
+    def _flush(self, lsn, sync):
+        with self._condition:
+            while (self.durable_lsn if sync else self.written_lsn) < lsn:
+                if self._flushing:
+                    self._condition.wait()
+                    continue
+                # Lead a group: write out everything buffered, then let the others see the result
+                self._flushing = True
+                data, end, records = bytes(self._buffer), self.appended_lsn, self.records
+                self._buffer.clear()
+                self._condition.release()
+                try:
+                    if data:
+                        self.file.write(data)
+                        self.file.flush()
+                    if sync:
+                        os.fsync(self.file.fileno())
+                finally:
+                    self._condition.acquire()
+                    self._flushing = False
+                    self._condition.notify_all()
+                self.written_lsn = end
+                if sync:
+                    self.durable_lsn = end
+                    self._synced_records = records
+                    self.syncs += 1
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.interval):
+            self.sync()
+
+    def truncate(self):
+        """Drop every record, after a checkpoint made them redundant. The next record keeps its LSN."""
+        self.sync()
+        with self._condition:
+            while self._flushing:
+                self._condition.wait()
+            self.base_lsn = self.appended_lsn
+            self.file.seek(0)
+            self.file.truncate()
+            self.file.write(LOG_MAGIC + _lsn.pack(self.base_lsn))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def stats(self):
+        return {'durability': self.durability, 'records': self.records, 'syncs': self.syncs,
+                'records_per_sync': self.records / self.syncs if self.syncs else 0.0,
+                'appended_lsn': self.appended_lsn, 'durable_lsn': self.durable_lsn}
+
+    def close(self):
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.sync()
+        self.file.close()
+
+
+class LoggedBPlusTree(BPlusTree):
+    """In-memory B+ tree whose mutations are made durable by a write-ahead log.
+    ``insert``, ``__setitem__``, ``change``, ``delete`` and the batch methods encode a record before
+    they change the tree, append it to ``path + '.wal'`` once the change succeeded, so a change that
+    raises is never replayed, and return once the log has committed it (see ``WriteAheadLog`` for the
+    durability levels). Mutations are applied one at a time in log order,
+    so several threads can share the tree for writing, and their commits share fsyncs.
+    ``checkpoint`` writes the whole tree to ``path`` and truncates the log. Opening a tree recovers
+    it: the last checkpoint is loaded and the log records after it are replayed.
+    Attributes:
+        path: the checkpoint file; the log is ``path + '.wal'``
+        log (WriteAheadLog): the log of this tree
+    """
+
+    def __init__(self, path, maximum=4, durability='commit', batch_size=64, interval=0.05, timing=False):
+        super(LoggedBPlusTree, self).__init__(maximum, timing)
+        self.path = path
+        self._lock = threading.Lock()
+        checkpoint_lsn = 0
+        if os.path.exists(path):
+            checkpoint_lsn, pairs = read_checkpoint(path)
+            BPlusTree.insert_many(self, pairs, replace=True)
+        self.log = WriteAheadLog(path + '.wal', durability, batch_size, interval, checkpoint_lsn)
+        # A crash between writing a checkpoint and truncating the log leaves records it already holds
+        for lsn, operation, key, value in self.log.replay():
+            if lsn > checkpoint_lsn:
+                self._apply(operation, key, value)
+
+    def _apply(self, operation, key, value):
+        if operation == SET:
+            BPlusTree.__setitem__(self, key, value)
+        elif operation == INSERT:
+            BPlusTree.insert(self, key, value)
+        elif operation == CHANGE:
+            BPlusTree.change(self, key, value)
+        elif key in self.find(key):
+            BPlusTree.delete(self, key)
+
+    def __setitem__(self, key, value, leaf=None):
+        if leaf is not None:
+            # insert adding a key it has already logged
+            return super(LoggedBPlusTree, self).__setitem__(key, value, leaf)
+        record = encode_record(SET, key, value)
+        with self._lock:
+            super(LoggedBPlusTree, self).__setitem__(key, value)
+            lsn = self.log.append_records(record)
+        self.log.commit(lsn)
+
+    def insert(self, key, value):
+        record = encode_record(INSERT, key, value)
+        with self._lock:
+            result = super(LoggedBPlusTree, self).insert(key, value)
+            lsn = self.log.append_records(record)
+        self.log.commit(lsn)
+        return result
+
+    def change(self, key, value):
+        record = encode_record(CHANGE, key, value)
+        with self._lock:
+            result = super(LoggedBPlusTree, self).change(key, value)
+            lsn = self.log.append_records(record)
+        self.log.commit(lsn)
+        return result
+
+    def delete(self, key, node=None):
+        if node is not None:
+            # rebalance removing the separator of a merged node
+            return super(LoggedBPlusTree, self).delete(key, node)
+        record = encode_record(DELETE, key)
+        with self._lock:
+            super(LoggedBPlusTree, self).delete(key)
+            lsn = self.log.append_records(record)
+        self.log.commit(lsn)
+
+    def insert_many(self, batch, replace=False):
+        """Insert a batch of key/value pairs as one commit; see ``BPlusTree.insert_many``."""
+        batch = list(batch)
+        operation = SET if replace else INSERT
+        records = bytearray()
+        for key, value in batch:
+            encode_record(operation, key, value, records)
+        with self._lock:
+            inserted = super(LoggedBPlusTree, self).insert_many(batch, replace)
+            lsn = self.log.append_records(records, len(batch))
+        self.log.commit(lsn)
+        return inserted
+
+    def delete_many(self, keys):
+        """Delete a batch of keys as one commit; see ``BPlusTree.delete_many``."""
+        keys = list(keys)
+        records = bytearray()
+        for key in keys:
+            encode_record(DELETE, key, out=records)
+        with self._lock:
+            deleted = super(LoggedBPlusTree, self).delete_many(keys)
+            lsn = self.log.append_records(records, len(keys))
+        self.log.commit(lsn)
+        return deleted
+
+    def checkpoint(self):
+        """Write the whole tree to ``path`` and truncate the log."""
+        with self._lock:
+            self.log.sync()
+            write_checkpoint(self.path, self.log.appended_lsn, self.items())
+            self.log.truncate()
+
+    def close(self):
+        """Close the log. Every committed record is fsynced; no checkpoint is taken."""
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
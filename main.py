@@ -1,5 +1,3 @@
-import numpy as np
-
 from BPlusTree import BPlusTree
 from hashTableSeparateChainingWithLinkedList import HashTable
 from hashTableSeparateChainingWithList import HashTableSC
@@ -0,0 +1,422 @@
+import mmap
+import os
+import pickle
+import struct
+from collections import OrderedDict
+from collections.abc import MutableSequence
+from contextlib import contextmanager
+from functools import wraps
+
+from BPlusTree import BPlusTree, Node, Leaf, TreeStats
+
+PAGE_SIZE = 8192  # SQL Server page size
+MAGIC = b'BPTPAGES'
+VERSION = 1
+NIL = -1
+
+_length = struct.Struct('<I')
+
+
+class BufferPool(object):
+    """Caches the pages of one index file as live node objects.
+    Pages are read through an mmap of the file. The least recently used pages are evicted once the
+    pool holds more than ``capacity`` pages, and pages changed by a write operation are written
+    back when they are evicted or flushed.
+    Pages touched by an operation stay pinned until the outermost operation ends, so the tree logic
+    can keep plain references to nodes while it works.
+    Attributes:
+        reads, writes: pages read from and written to the file
+        hits, misses: page requests served from the pool or not
+        evictions: pages dropped from the pool to stay within ``capacity``
+    """
+
+    def __init__(self, file, page_size=PAGE_SIZE, capacity=256):
+        self.file = file
+        self.page_size = page_size
+        self.capacity = capacity if capacity > 1 else 1
+        self.frames = OrderedDict()
+        self.dirty = set()
+        self.node_type = self.leaf_type = None
+        self.next_page = 1
+        self.free_head = NIL
+        self.reads = self.writes = self.hits = self.misses = self.evictions = 0
+        self._depth = 0
+        self._writing = False
+        self.mm = None
+        self._map(max(os.fstat(file.fileno()).st_size, page_size * 16))
+
+    def _map(self, size):
+        if self.mm is not None:
+            self.mm.close()
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), size)
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def stats(self):
+        return {'reads': self.reads, 'writes': self.writes, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hit_rate, 'resident': len(self.frames),
+                'pages': self.next_page}
+
+    @contextmanager
+    def operation(self, write=False):
+        """Pin every page touched inside the block, and release the pool when the outermost block ends.
+        Pages touched by a write operation are written back when they leave the pool."""
+        if self._depth == 0:
+            self._writing = write
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self._writing = False
+                self.release()
+
+    def get(self, page_id):
+        """Return the node stored in the page, loading it from the file if it is not resident."""
+        node = self.frames.get(page_id)
+        if node is None:
+            self.misses += 1
+            node = self.frames[page_id] = self._load(page_id)
+        else:
+            self.hits += 1
+            self.frames.move_to_end(page_id)
+        if self._writing:
+            self.dirty.add(page_id)
+        return node
+
+    def allocate(self, node):
+        """Assign a page to a new node, reusing a freed page if there is one."""
+        if self.free_head != NIL:
+            page_id = self.free_head
+            self.free_head = self._read(page_id)[1]
+        else:
+            page_id = self.next_page
+            self.next_page += 1
+            if self.next_page * self.page_size > len(self.mm):
+                self._map(len(self.mm) * 2)
+        self.frames[page_id] = node
+        self.dirty.add(page_id)
+        return page_id
+
+    def free(self, page_id):
+        """Return the page of a node that was merged away to the free list."""
+        self.frames.pop(page_id, None)
+        self.dirty.discard(page_id)
+        self._write(page_id, ('free', self.free_head))
+        self.free_head = page_id
+
+    def release(self):
+        """Evict least recently used pages until the pool is within its capacity."""
+        if self._depth:
+            return
+        while len(self.frames) > self.capacity:
+            page_id, node = self.frames.popitem(last=False)
+            self.evictions += 1
+            if page_id in self.dirty:
+                self.dirty.remove(page_id)
+                self._write_node(node)
+
+    def flush(self):
+        """Write every changed page back to the file."""
+        for page_id in list(self.dirty):
+            self._write_node(self.frames[page_id])
+        self.dirty.clear()
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+
+    def _load(self, page_id):
+        image = self._read(page_id)
+        if image[0] == 'free':
+            raise ValueError(f'page {page_id} is not in use')
+        is_leaf, parent_id, keys, values, prev_id, next_id = image
+        if is_leaf:
+            node = self.leaf_type.__new__(self.leaf_type)
+            node.values = values
+            node._prev_id = prev_id
+            node._next_id = next_id
+        else:
+            node = self.node_type.__new__(self.node_type)
+            node._child_ids = values
+        node.page_id = page_id
+        node.keys = keys
+        node._parent_id = parent_id
+        return node
+
+    def _write_node(self, node):
+        if isinstance(node, Leaf):
+            image = (True, node._parent_id, node.keys, node.values, node._prev_id, node._next_id)
+        else:
+            image = (False, node._parent_id, node.keys, node._child_ids, NIL, NIL)
+        self._write(node.page_id, image)
+
+    def _read(self, page_id):
+        self.reads += 1
+        offset = page_id * self.page_size
+        (size,) = _length.unpack_from(self.mm, offset)
+        return pickle.loads(self.mm[offset + _length.size:offset + _length.size + size])
+
+    def _write(self, page_id, image):
+        data = pickle.dumps(image, pickle.HIGHEST_PROTOCOL)
+        if len(data) + _length.size > self.page_size:
+            raise ValueError(f'page {page_id} needs {len(data) + _length.size} bytes, more than the '
+                             f'page size of {self.page_size}; use a smaller maximum')
+        offset = page_id * self.page_size
+        data = _length.pack(len(data)) + data
+        # Pages fetched by a write operation are only flagged as possibly changed; skip identical images.
+        if self.mm[offset:offset + len(data)] != data:
+            self.writes += 1
+            self.mm[offset:offset + len(data)] = data
+
+
+class _ChildList(MutableSequence):
+    """List of child pages of an index node that hands out the child nodes through the buffer pool."""
+
+    def __init__(self, ids, pool):
+        self.ids = ids
+        self.pool = pool
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return _ChildList(self.ids[i], self.pool)
+        return self.pool.get(self.ids[i])
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            self.ids[i] = _page_ids(value)
+        else:
+            self.ids[i] = value.page_id
+
+    def __delitem__(self, i):
+        del self.ids[i]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for page_id in self.ids:
+            yield self.pool.get(page_id)
+
+    def insert(self, i, value):
+        self.ids.insert(i, value.page_id)
+
+
+def _page_ids(nodes):
+    if isinstance(nodes, _ChildList):
+        return nodes.ids[:]
+    return [node.page_id for node in nodes]
+
+
+def _page_id(node):
+    return NIL if node is None else node.page_id
+
+
+def _node_property(name):
+    def get(self):
+        page_id = getattr(self, name)
+        return None if page_id == NIL else self.pool.get(page_id)
+
+    def set(self, node):
+        setattr(self, name, _page_id(node))
+
+    return property(get, set)
+
+
+class PagedNode(Node):
+    """Index node whose parent and children are referenced by page id."""
+    __slots__ = ('page_id', '_parent_id', '_child_ids')
+    pool: BufferPool = None
+
+    def __init__(self, parent=None):
+        self.page_id = self.pool.allocate(self)
+        super(PagedNode, self).__init__(parent)
+
+    parent = _node_property('_parent_id')
+
+    @property
+    def values(self):
+        return _ChildList(self._child_ids, self.pool)
+
+    @values.setter
+    def values(self, nodes):
+        self._child_ids = _page_ids(nodes)
+
+    def fusion(self):
+        super(PagedNode, self).fusion()
+        self.pool.free(self.page_id)
+
+
+class PagedLeaf(Leaf):
+    """Leaf whose parent and neighbours are referenced by page id."""
+    __slots__ = ('page_id', '_parent_id', '_prev_id', '_next_id')
+    pool: BufferPool = None
+
+    def __init__(self, parent=None, prev_node=None, next_node=None):
+        self.page_id = self.pool.allocate(self)
+        super(PagedLeaf, self).__init__(parent, prev_node, next_node)
+
+    parent = _node_property('_parent_id')
+    prev = _node_property('_prev_id')
+    next = _node_property('_next_id')
+
+    def fusion(self):
+        super(PagedLeaf, self).fusion()
+        self.pool.free(self.page_id)
+
+
+def _operation(method, write=False):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.pool.operation(write):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class PagedBPlusTree(BPlusTree):
+    """B+ tree stored in fixed-size pages of a single file.
+    Every node is serialized into its own page; page 0 holds the tree header. Nodes are read through
+    a buffer pool of ``pool_size`` pages, so the tree does not have to fit in memory. Insert, split,
+    fusion and borrow work exactly as in ``BPlusTree``.
+    Keys and values are pickled, and a node must fit into one page, so ``maximum`` has to be chosen
+    for the size of the keys and values. ``bulk_load`` builds the whole tree in memory before it
+    writes the pages out.
+    An existing file is reopened with the ``maximum`` and ``page_size`` it was created with; they
+    default to 4 and ``PAGE_SIZE`` for a new file.
+    :raise ValueError: reopening a file with a ``maximum`` or ``page_size`` other than its own
+    """
+
+    def __init__(self, path, maximum=None, pool_size=256, page_size=None, timing=False):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.path = path
+        self.file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            header = self._read_header()
+            for name, given in (('maximum', maximum), ('page_size', page_size)):
+                if given is not None and given != header[name]:
+                    self.file.close()
+                    raise ValueError(f'{path} was created with {name} {header[name]}, not {given}')
+            page_size = header['page_size']
+        else:
+            maximum = 4 if maximum is None else maximum
+            page_size = PAGE_SIZE if page_size is None else page_size
+        self.pool = BufferPool(self.file, page_size, pool_size)
+        self.node_type = type('PagedNode', (PagedNode,), {'__slots__': (), 'pool': self.pool})
+        self.leaf_type = type('PagedLeaf', (PagedLeaf,), {'__slots__': (), 'pool': self.pool})
+        self.pool.node_type, self.pool.leaf_type = self.node_type, self.leaf_type
+        if exists:
+            self.maximum = header['maximum']
+            self.minimum = self.maximum // 2
+            self.depth = header['depth']
+            self._root_id = header['root']
+            self.pool.next_page = header['next_page']
+            self.pool.free_head = header['free_head']
+            self.stats = TreeStats(self, timing)
+            self.stats.size, self.stats.nodes, self.stats.leaves = header['size'], header['nodes'], header['leaves']
+        else:
+            with self.pool.operation(write=True):
+                super(PagedBPlusTree, self).__init__(maximum, timing)
+            self.flush()
+
+    def _read_header(self):
+        data = self.file.read(PAGE_SIZE)
+        if not data.startswith(MAGIC):
+            raise ValueError(f'{self.path} is not a B+ tree page file')
+        (size,) = _length.unpack_from(data, len(MAGIC))
+        header = pickle.loads(data[len(MAGIC) + _length.size:len(MAGIC) + _length.size + size])
+        if header['version'] != VERSION:
+            raise ValueError(f'unsupported page file version {header["version"]}')
+        return header
+
+    def _write_header(self):
+        header = pickle.dumps({'version': VERSION, 'page_size': self.pool.page_size, 'maximum': self.maximum,
+                               'depth': self.depth, 'root': self._root_id, 'next_page': self.pool.next_page,
+                               'free_head': self.pool.free_head, 'size': self.stats.size,
+                               'nodes': self.stats.nodes, 'leaves': self.stats.leaves})
+        data = MAGIC + _length.pack(len(header)) + header
+        self.pool.mm[:len(data)] = data
+
+    @property
+    def root(self):
+        return self.pool.get(self._root_id)
+
+    @root.setter
+    def root(self, node):
+        self._root_id = node.page_id
+
+    @classmethod
+    def bulk_load(cls, items, maximum=4, fill_factor=1.0, presorted=False, **kwargs):
+        tree = super(PagedBPlusTree, cls).bulk_load(items, maximum, fill_factor, presorted, **kwargs)
+        # The build runs outside of an operation and never evicts, so every built page is still resident.
+        tree.pool.dirty.update(tree.pool.frames)
+        tree.pool.release()
+        return tree
+
+    find = _operation(BPlusTree.find)
+    __getitem__ = _operation(BPlusTree.__getitem__)
+    query = _operation(BPlusTree.query)
+    change = _operation(BPlusTree.change, write=True)
+    __setitem__ = _operation(BPlusTree.__setitem__, write=True)
+    insert = _operation(BPlusTree.insert, write=True)
+    show = _operation(BPlusTree.show)
+
+    delete = _operation(BPlusTree.delete, write=True)
+    insert_many = _operation(BPlusTree.insert_many, write=True)
+    delete_many = _operation(BPlusTree.delete_many, write=True)
+
+    def _node_pages(self):
+        """Page ids of every node of the tree."""
+        page_ids, level = [], [self.root]
+        while level:
+            page_ids += [node.page_id for node in level]
+            level = [child for node in level if not isinstance(node, Leaf) for child in node.values]
+        return page_ids
+
+    def _repack(self, method, fill_factor):
+        with self.pool.operation(write=True):
+            before = set(self._node_pages())
+            method(self, fill_factor)
+            for page_id in before.difference(self._node_pages()):
+                self.pool.free(page_id)
+
+    def rebuild(self, fill_factor=None):
+        """``BPlusTree.rebuild``, returning the pages of the old nodes to the free list afterwards."""
+        self._repack(BPlusTree.rebuild, fill_factor)
+
+    def reorganize(self, fill_factor=None):
+        """``BPlusTree.reorganize``, returning the pages of emptied leaves and old index nodes to the free list."""
+        self._repack(BPlusTree.reorganize, fill_factor)
+
+    def collapse_root(self):
+        root = self._root_id
+        super(PagedBPlusTree, self).collapse_root()
+        self.pool.free(root)
+
+    def range(self, lo=None, hi=None, inclusive=True, reverse=False):
+        for item in super(PagedBPlusTree, self).range(lo, hi, inclusive, reverse):
+            yield item
+            self.pool.release()
+
+    def flush(self):
+        """Write all changed pages and the header to the file."""
+        self.pool.flush()
+        self._write_header()
+        self.pool.mm.flush()
+
+    def close(self):
+        self.flush()
+        self.pool.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,284 @@
+"""Binary snapshots of the in-memory indexes, for ``BPlusTree.save``/``load`` and the hash tables.
+
+A snapshot starts with ``MAGIC``, the format version and the kind of index. Sequences of keys or
+values are stored as columns: a tag, the item count and the payload size, then ints and floats as
+one raw ``array``, strings and bytes as the narrowest ``array`` of lengths followed by one blob,
+and anything else pickled as a whole list. Columns load with a few C-level calls instead of one
+per item.
+
+A tree is stored level by level, leaves first, after its options: whether its leaves are
+prefix-compressed, its fill factor and its split policy (from version 2 of the format). Every level
+holds the key count of each node and one column with the keys of all its nodes; the leaf level also
+holds a values column per leaf and the offset of each. Loading rebuilds every level in one
+sequential pass, handing each node the next key count + 1 nodes of the level below as its children.
+With ``lazy`` the file is mapped with ``mmap`` and the values of a leaf are only decoded the first
+time they are used.
+
+A hash table stores its capacity and load factor settings and one column each of keys, values and,
+for the tables that keep them, full hashes.
+"""
+import mmap
+import pickle
+import struct
+from array import array
+from itertools import accumulate
+
+from BPlusTree import SPLIT_POLICIES, CompressedLeaf, Leaf, TypedLeaf
+
+MAGIC = b'IDXSNAP\x00'
+VERSION = 2
+TREE, TABLE = 0, 1
+
+_header = struct.Struct('<8sHB')  # magic, version, kind
+_tree = struct.Struct('<IIQ1s')  # maximum, depth, size, key typecode or NUL
+_tree_options = struct.Struct('<?dB')  # compress, fill factor, index of the split policy; version 2
+_table = struct.Struct('<QQddI')  # initial capacity, capacity, max and min load factor, rehash step
+_column = struct.Struct('<cIQ')  # tag, item count, payload size
+_count = struct.Struct('<Q')
+
+
+def encode_column(items, out):
+    """Append a column holding the items to the bytearray out."""
+    if isinstance(items, array):
+        tag, payload = items.typecode.encode(), items.tobytes()
+    else:
+        items = items if isinstance(items, list) else list(items)
+        tag, payload = _column_payload(items)
+    out += _column.pack(tag, len(items), len(payload))
+    out += payload
+
+
+def _column_payload(items):
+    kinds = set(map(type, items))
+    if kinds == {int}:
+        try:
+            return b'q', array('q', items).tobytes()
+        except OverflowError:
+            pass
+    elif kinds == {float}:
+        return b'd', array('d', items).tobytes()
+    elif kinds == {str} or kinds == {bytes}:
+        sizes = list(map(len, items))
+        longest = max(sizes)
+        typecode = 'B' if longest < 1 << 8 else 'H' if longest < 1 << 16 else 'I'
+        lengths = typecode.encode() + array(typecode, sizes).tobytes()
+        if kinds == {str}:
+            # Character lengths, so the whole blob can be decoded at once and sliced
+            return b's', lengths + ''.join(items).encode()
+        return b'b', lengths + b''.join(items)
+    return b'p', pickle.dumps(items, pickle.HIGHEST_PROTOCOL)
+
+
+def decode_column(data, offset, typecode=None):
+    """Read the column at offset of data (bytes or an mmap).
+    :param typecode: return the items as an ``array`` of this typecode instead of a list
+    :return: the items and the offset after the column
+    """
+    tag, count, size = _column.unpack_from(data, offset)
+    offset += _column.size
+    end = offset + size
+    if tag in (b's', b'b'):
+        lengths = array(chr(data[offset]))
+        offset += 1
+        lengths.frombytes(data[offset:offset + lengths.itemsize * count])
+        blob = data[offset + lengths.itemsize * count:end]
+        blob = blob.decode() if tag == b's' else bytes(blob)
+        ends = list(accumulate(lengths))
+        items = [blob[start:stop] for start, stop in zip([0] + ends, ends)]
+    elif tag == b'p':
+        items = pickle.loads(data[offset:end])
+    else:
+        items = array(tag.decode())
+        items.frombytes(data[offset:end])
+        if typecode != items.typecode:
+            items = items.tolist()
+    if typecode is not None and not isinstance(items, array):
+        items = array(typecode, items)
+    return items, end
+
+
+def _check_header(data, kind, path):
+    """:return: the format version and the offset after the header"""
+    magic, version, found = _header.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not an index snapshot')
+    if not 1 <= version <= VERSION:
+        raise ValueError(f'unsupported snapshot version {version}')
+    if found != kind:
+        raise ValueError(f'{path} holds a {("tree", "hash table")[found]}, not a {("tree", "hash table")[kind]}')
+    return version, _header.size
+
+
+class LazyLeaf(Leaf):
+    """Leaf of a tree loaded with ``lazy``, whose values are decoded from the snapshot on first use."""
+    __slots__ = ('_values', '_source')
+
+    def __init__(self, parent=None, prev_node=None, next_node=None):
+        self._source = None
+        super(LazyLeaf, self).__init__(parent, prev_node, next_node)
+
+    @property
+    def values(self):
+        if self._source is not None:
+            data, offset = self._source
+            self._values = decode_column(data, offset)[0]
+            self._source = None
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        self._source = None
+
+
+def save_tree(tree, path):
+    """Write a BPlusTree to a snapshot file."""
+    levels = [[tree.root]]
+    while not isinstance(levels[-1][0], Leaf):
+        levels.append([child for node in levels[-1] for child in node.values])
+    leaves = levels.pop()
+    typecode = tree.leaf_type.typecode if issubclass(tree.leaf_type, TypedLeaf) else '\x00'
+    out = bytearray(_header.pack(MAGIC, VERSION, TREE))
+    out += _tree.pack(tree.maximum, tree.depth, tree.stats.size, typecode.encode())
+    out += _tree_options.pack(issubclass(tree.leaf_type, CompressedLeaf), tree.fill_factor,
+                              SPLIT_POLICIES.index(tree.split_policy))
+    for nodes in [leaves] + levels[::-1]:
+        out += _count.pack(len(nodes))
+        out += array('I', [len(node.keys) for node in nodes]).tobytes()
+        keys = [key for node in nodes for key in node.keys]
+        encode_column(array(typecode, keys) if typecode != '\x00' else keys, out)
+        if nodes is leaves:
+            # Offsets of the value columns relative to the first one, and their total size
+            values = bytearray()
+            offsets = array('Q')
+            for leaf in leaves:
+                offsets.append(len(values))
+                encode_column(leaf.values, values)
+            out += offsets.tobytes()
+            out += _count.pack(len(values))
+            out += values
+    with open(path, 'wb') as file:
+        file.write(out)
+
+
+def load_tree(cls, path, lazy=False):
+    """Rebuild a tree of class cls from a snapshot file written by ``save_tree``.
+    :param lazy: map the file and decode the values of a leaf only when they are first used
+    """
+    with open(path, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if lazy else file.read()
+    version, offset = _check_header(data, TREE, path)
+    maximum, depth, size, typecode = _tree.unpack_from(data, offset)
+    offset += _tree.size
+    compress, fill_factor, split_policy = False, 1.0, 0
+    if version >= 2:
+        compress, fill_factor, split_policy = _tree_options.unpack_from(data, offset)
+        offset += _tree_options.size
+    typecode = typecode.decode() if typecode != b'\x00' else None
+    if lazy and (typecode is not None or compress or cls.leaf_type is not Leaf):
+        raise ValueError('lazy loading needs a tree with plain leaves')
+    # Only options that differ from the defaults are passed, so subclasses without them still load
+    options = {}
+    if typecode is not None:
+        options['typecode'] = typecode
+    if compress:
+        options['compress'] = True
+    if fill_factor != 1.0:
+        options['fill_factor'] = fill_factor
+    if split_policy:
+        options['split_policy'] = SPLIT_POLICIES[split_policy]
+    tree = cls(maximum=maximum, **options)
+    if lazy:
+        tree.leaf_type = LazyLeaf
+    leaf_type = tree.leaf_type
+
+    below = None
+    for level in range(depth + 1):
+        (count,) = _count.unpack_from(data, offset)
+        offset += _count.size
+        counts = array('I')
+        counts.frombytes(data[offset:offset + 4 * count])
+        offset += 4 * count
+        keys, offset = decode_column(data, offset, typecode if level == 0 else None)
+        starts = [0] + list(accumulate(counts))
+        if level == 0:
+            offsets = array('Q')
+            offsets.frombytes(data[offset:offset + 8 * count])
+            (values_size,) = _count.unpack_from(data, offset + 8 * count)
+            offset += 8 * count + _count.size
+            nodes, leaf = [], None
+            for i in range(count):
+                leaf = leaf_type(prev_node=leaf)
+                leaf.keys = keys[starts[i]:starts[i + 1]]
+                if lazy:
+                    leaf._source = (data, offset + offsets[i])
+                else:
+                    leaf.values = decode_column(data, offset + offsets[i])[0]
+                nodes.append(leaf)
+            offset += values_size
+            tree.stats.leaves = count
+        else:
+            nodes, child = [], 0
+            for i in range(count):
+                node = tree.node_type()
+                node.keys = keys[starts[i]:starts[i + 1]]
+                node.values = below[child:child + len(node.keys) + 1]
+                child += len(node.keys) + 1
+                for grandchild in node.values:
+                    grandchild.parent = node
+                nodes.append(node)
+            tree.stats.nodes += count
+        below = nodes
+
+    tree.root = below[0]
+    tree.depth = depth
+    tree.stats.size = size
+    return tree
+
+
+def save_table(table, path, keys, values, hashes=None):
+    """Write the entries of a hash table to a snapshot file.
+    :param keys, values: lists of the keys and values of every entry, in the same order
+    :param hashes: the full hashes of the keys, for tables that keep them
+    """
+    resize = table.resize
+    out = bytearray(_header.pack(MAGIC, VERSION, TABLE))
+    name = type(table).__name__.encode()
+    out += _count.pack(len(name)) + name
+    out += _table.pack(resize.initial_capacity, table.capacity, resize.max_load_factor,
+                       resize.min_load_factor, resize.rehash_step)
+    encode_column(keys, out)
+    encode_column(values, out)
+    encode_column(array('Q', hashes) if hashes is not None else [], out)
+    with open(path, 'wb') as file:
+        file.write(out)
+
+
+def load_table(cls, path, hash_function='power', seed=0):
+    """Rebuild a hash table of class cls from a snapshot file written by ``save_table``.
+    Saved hashes are reused when the given hash function reproduces them for a sample of the keys
+    and the table's ``insert_many`` accepts them; otherwise the keys are hashed again."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    _, offset = _check_header(data, TABLE, path)
+    (size,) = _count.unpack_from(data, offset)
+    offset += _count.size
+    name = data[offset:offset + size].decode()
+    offset += size
+    if name != cls.__name__:
+        raise ValueError(f'{path} holds a {name}, not a {cls.__name__}')
+    initial_capacity, capacity, max_load_factor, min_load_factor, rehash_step = _table.unpack_from(data, offset)
+    offset += _table.size
+    keys, offset = decode_column(data, offset)
+    values, offset = decode_column(data, offset)
+    hashes, offset = decode_column(data, offset)
+    table = cls(initial_capacity, hash_function, seed, max_load_factor, min_load_factor, rehash_step)
+    if capacity != table.capacity:
+        table._resize(capacity)
+        table.finish_resize()
+    sample = range(0, len(hashes), max(1, len(hashes) // 16))
+    if hashes and all(table.hash_function(keys[i]) == hashes[i] for i in sample):
+        table.insert_many(zip(keys, values), hashes)
+    else:
+        table.insert_many(zip(keys, values))
+    return table
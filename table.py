@@ -0,0 +1,514 @@
+"""Tables of rows with secondary indexes, and a planner that picks the access path of a query.
+
+A ``Table`` keeps every row once, as a tuple in column order, under a row id (RID) that is never
+reused, like a heap in SQL Server. ``create_index`` adds a secondary index on one or more columns:
+
+- a tree index is a ``BPlusTree`` keyed by the tuple of the index columns followed by the RID, the
+  way SQL Server makes the keys of a non-unique index unique, so rows with equal keys sit next to
+  each other and any leading run of the columns can be scanned in order; each column value is
+  stored as (value is None, value), so NULLs sort after every other value without being compared;
+- a hash index maps the tuple of the index columns to a dict of the RIDs holding it, in one of the
+  hash tables.
+
+Both keep the values of their ``include`` columns with every RID, so a query that only uses index
+and included columns is answered from the index alone (a covering index) without fetching rows.
+
+Predicates are (column, operator, value) tuples that must all hold, where the operator is one of
+``OPERATORS`` and ``between`` takes a (low, high) pair that includes both ends. A NULL (None) value
+satisfies no predicate. ``Table.plan`` considers
+
+- a hash lookup on a hash index with an equality predicate on each of its columns,
+- a range scan of a tree index over its leading run of columns with equality predicates, followed
+  by at most one column with range predicates,
+
+and picks the one that matches the most index columns, a hash lookup over a range scan that
+matches as many, and a covering index among equals; with no usable index it scans every row. The
+chosen index narrows the rows down; every predicate is still checked on each of them.
+
+The index changes of a statement are collected per index and applied at its end with a single
+``insert_many``/``delete_many`` for a tree, or ``find_many``/``insert_many``/``remove_many`` for a
+hash table. Inside ``with table.batch():`` they are held until the outermost block ends.
+"""
+import operator
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+from BPlusTree import BPlusTree
+from hashTableSeparateChainingWithList import HashTableSC
+
+OPERATORS = ('=', '<', '<=', '>', '>=', 'between')
+HASH, RANGE, SCAN = 'hash', 'range', 'scan'
+
+_tests = {
+    '=': operator.eq,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'between': lambda value, bounds: bounds[0] <= value <= bounds[1],
+}
+
+Plan = namedtuple('Plan', ['access', 'index', 'prefix', 'low', 'high', 'covering'])
+Plan.__doc__ = """Access path chosen by ``Table.plan``.
+    access: ``HASH``, ``RANGE`` or ``SCAN``
+    index: the index used, None for a scan
+    prefix: values of the leading index columns looked up or scanned for equality
+    low, high: (value, inclusive) bounds on the index column after the prefix, or None
+    covering: the index holds every column the query needs, so no rows are fetched
+"""
+
+
+class Index(object):
+    """Secondary index of a table.
+    Attributes:
+        name (str): name of the index in ``Table.indexes``.
+        columns (tuple): the key columns, in key order.
+        include (tuple): further columns whose values are stored with every RID.
+    """
+    kind = None
+
+    def __init__(self, name, columns, include=()):
+        self.name = name
+        self.columns = tuple(columns)
+        self.include = tuple(column for column in include if column not in self.columns)
+        self.stored = frozenset(self.columns + self.include)
+
+    def covers(self, columns):
+        """Whether every one of the columns can be read from the index."""
+        return self.stored.issuperset(columns)
+
+    def apply(self, removes, adds):
+        """Remove the (key, rid) pairs of removes, then store the included values of adds, a dict
+        of (key, rid) -> tuple of included values.
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        include = f" include {list(self.include)}" if self.include else ""
+        return f"<{self.kind} index {self.name} on {list(self.columns)}{include}>"
+
+
+def _sortable(key):
+    """The tree key of a tuple of column values, comparable whichever of them are None."""
+    return tuple((value is None, value) for value in key)
+
+
+class TreeIndex(Index):
+    """Index in a ``BPlusTree`` keyed by (*key, rid), for equality on a leading run of the columns
+    and ranges on the column after it."""
+    kind = 'tree'
+
+    def __init__(self, name, columns, include=(), maximum=64):
+        super(TreeIndex, self).__init__(name, columns, include)
+        self.tree = BPlusTree(maximum)
+
+    def apply(self, removes, adds):
+        tree = self.tree
+        if removes:
+            tree.delete_many([_sortable(key) + (rid,) for key, rid in removes])
+        if not adds:
+            return
+        pairs = [(_sortable(key) + (rid,), included) for (key, rid), included in adds.items()]
+        if tree.stats.size == 0:
+            # Building the index on an existing table
+            self.tree = BPlusTree.bulk_load(pairs, tree.maximum)
+        else:
+            tree.insert_many(pairs, replace=True)
+
+    def scan(self, prefix=(), low=None, high=None):
+        """Yield (key, rid, included) in key order for the keys that start with prefix and whose
+        next column is within the bounds.
+        :param prefix: values of the leading columns
+        :param low, high: (value, inclusive) bounds on the column after the prefix, or None
+        """
+        length = len(prefix)
+        prefix = _sortable(prefix)
+        start = prefix + _sortable((low[0],)) if low is not None else prefix
+        bounded = low is not None or high is not None
+        for key, included in self.tree.range(lo=start or None):
+            if key[:length] != prefix:
+                return
+            if length < len(self.columns):
+                null, value = key[length]
+                if null:
+                    # NULLs sort last and satisfy no bound
+                    if bounded:
+                        return
+                elif high is not None and (high[0] < value or (value == high[0] and not high[1])):
+                    return
+                elif low is not None and not low[1] and value == low[0]:
+                    continue
+            yield tuple(value for _, value in key[:-1]), key[-1], included
+
+
+class HashIndex(Index):
+    """Index in a hash table mapping each key to a dict of rid -> included values, for equality on
+    all of the columns."""
+    kind = 'hash'
+
+    def __init__(self, name, columns, include=(), table_type=HashTableSC, hash_function='builtin', **kwargs):
+        super(HashIndex, self).__init__(name, columns, include)
+        self.table = table_type(hash_function=hash_function, **kwargs)
+
+    def apply(self, removes, adds):
+        table = self.table
+        emptied = []
+        if removes:
+            by_key = defaultdict(list)
+            for key, rid in removes:
+                by_key[key].append(rid)
+            for (key, rids), posting in zip(by_key.items(), table.find_many(by_key)):
+                if posting is not None:
+                    for rid in rids:
+                        posting.pop(rid, None)
+                    if not posting:
+                        emptied.append((key, posting))
+        if adds:
+            by_key = defaultdict(dict)
+            for (key, rid), included in adds.items():
+                by_key[key][rid] = included
+            new = []
+            for (key, rids), posting in zip(by_key.items(), table.find_many(by_key)):
+                if posting is None:
+                    new.append((key, rids))
+                else:
+                    posting.update(rids)
+            if new:
+                table.insert_many(new)
+        # Postings refilled by adds stay
+        emptied = [key for key, posting in emptied if not posting]
+        if emptied:
+            table.remove_many(emptied)
+
+    def lookup(self, key):
+        """Yield (key, rid, included) for every row holding key."""
+        posting = self.table.find_many([key])[0]
+        if posting:
+            for rid, included in list(posting.items()):
+                yield key, rid, included
+
+
+INDEX_KINDS = {'tree': TreeIndex, 'hash': HashIndex}
+
+
+def _matches(row, predicates):
+    """Whether every predicate holds for row, a tuple read with the predicates' positions.
+    :param predicates: list of (position, test, value)
+    """
+    for position, test, value in predicates:
+        found = row[position]
+        if found is None or not test(found, value):
+            return False
+    return True
+
+
+class Table(object):
+    """Rows of a fixed list of columns, stored once, with secondary indexes.
+    Attributes:
+        columns (tuple): the column names, in row order.
+        rows (dict): every row as a tuple in column order, by RID.
+        indexes (dict): the indexes by name.
+    """
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        if len(set(self.columns)) != len(self.columns):
+            raise ValueError('column names must be unique')
+        self.position = {column: i for i, column in enumerate(self.columns)}
+        self.rows = {}
+        self.indexes = {}
+        self.next_rid = 0
+        self._pending = {}
+        self._batching = 0
+
+    def _positions(self, columns):
+        try:
+            return [self.position[column] for column in columns]
+        except KeyError as error:
+            raise ValueError(f'unknown column {error.args[0]!r}') from None
+
+    def _row(self, row):
+        """The tuple of a row given as a sequence in column order or a dict by column name."""
+        if isinstance(row, dict):
+            self._positions(row)
+            return tuple(row.get(column) for column in self.columns)
+        row = tuple(row)
+        if len(row) != len(self.columns):
+            raise ValueError(f'expected {len(self.columns)} values, got {len(row)}')
+        return row
+
+    # Index maintenance
+
+    def create_index(self, name, columns, kind='tree', include=(), **kwargs):
+        """Create an index and fill it with the rows already in the table.
+        :param columns: the key column, or a sequence of them
+        :param kind: 'tree' or 'hash'
+        :param include: further columns stored with every RID, so the index can cover queries
+        :param kwargs: further arguments for the index, ``maximum`` for a tree and ``table_type``,
+            ``hash_function`` and the table's own arguments for a hash index
+        :rtype: Index
+        """
+        if name in self.indexes:
+            raise ValueError(f'index {name!r} already exists')
+        if kind not in INDEX_KINDS:
+            raise ValueError(f'unknown index kind {kind!r}, expected one of {sorted(INDEX_KINDS)}')
+        columns = (columns,) if isinstance(columns, str) else tuple(columns)
+        if not columns:
+            raise ValueError('an index needs at least one column')
+        self._positions(columns + tuple(include))
+        self._flush(force=True)
+        index = INDEX_KINDS[kind](name, columns, include, **kwargs)
+        index.apply((), {(key, rid): included for key, rid, included in self._entries(index, self.rows.items())})
+        self.indexes[name] = index
+        return index
+
+    def drop_index(self, name):
+        self._flush(force=True)
+        del self.indexes[name]
+
+    def _entries(self, index, rows):
+        """Yield (key, rid, included) of index for (rid, row) pairs."""
+        key_positions = self._positions(index.columns)
+        include_positions = self._positions(index.include)
+        for rid, row in rows:
+            yield (tuple(row[i] for i in key_positions), rid,
+                   tuple(row[i] for i in include_positions))
+
+    def _queue(self, index, removes=(), adds=()):
+        """Add index changes to the pending ones; a later change of the same (key, rid) wins."""
+        pending_removes, pending_adds = self._pending.setdefault(index.name, (set(), {}))
+        for key, rid, _ in removes:
+            pending_adds.pop((key, rid), None)
+            pending_removes.add((key, rid))
+        for key, rid, included in adds:
+            pending_removes.discard((key, rid))
+            pending_adds[key, rid] = included
+
+    def _flush(self, force=False):
+        """Apply the pending index changes, one batch per index, unless a batch holds them. The
+        changes of an index stay pending until they are applied, so if one raises, those of it and
+        of the indexes after it are kept."""
+        if self._batching and not force:
+            return
+        pending = self._pending
+        for name in list(pending):
+            removes, adds = pending[name]
+            self.indexes[name].apply(removes, adds)
+            del pending[name]
+
+    @contextmanager
+    def batch(self):
+        """Hold the index changes of every statement in the block and apply them when it ends.
+        Queries in the block apply the changes held so far first."""
+        self._batching += 1
+        try:
+            yield self
+        finally:
+            self._batching -= 1
+            self._flush()
+
+    # Statements
+
+    def insert(self, row):
+        """Add a row, a sequence in column order or a dict by column name.
+        :return: the RID of the row
+        """
+        return self.insert_many([row])[0]
+
+    def insert_many(self, rows):
+        """Add rows and update every index once for all of them.
+        :return: the RIDs of the rows
+        """
+        added = []
+        for row in rows:
+            added.append((self.next_rid, self._row(row)))
+            self.next_rid += 1
+        self.rows.update(added)
+        for index in self.indexes.values():
+            self._queue(index, adds=self._entries(index, added))
+        try:
+            self._flush()
+        except Exception:
+            self._roll_back_insert(added)
+            raise
+        return [rid for rid, _ in added]
+
+    def _roll_back_insert(self, added):
+        """Take rows out again after applying their index changes failed: their adds are dropped
+        from the indexes still pending, and removes are queued for those that took them."""
+        for rid, _ in added:
+            del self.rows[rid]
+        for index in self.indexes.values():
+            if index.name in self._pending:
+                pending_adds = self._pending[index.name][1]
+                for key, rid, _ in self._entries(index, added):
+                    pending_adds.pop((key, rid), None)
+            else:
+                self._queue(index, removes=self._entries(index, added))
+
+    def update(self, where=(), changes=None, index=None):
+        """Set columns of the rows matching the predicates; only the indexes storing a changed
+        column are updated.
+        :param changes: dict of column -> new value
+        :return: the number of rows updated
+        """
+        changes = changes or {}
+        changed = dict(zip(self._positions(changes), changes.values()))
+        rids = [rid for rid, _ in self._select(where, (), index)]
+        old = [(rid, self.rows[rid]) for rid in rids]
+        new = []
+        for rid, row in old:
+            row = list(row)
+            for position, value in changed.items():
+                row[position] = value
+            new.append((rid, tuple(row)))
+        self.rows.update(new)
+        for index in self.indexes.values():
+            if not index.stored.isdisjoint(changes):
+                self._queue(index, self._entries(index, old), self._entries(index, new))
+        self._flush()
+        return len(new)
+
+    def delete(self, where=(), index=None):
+        """Delete the rows matching the predicates.
+        :return: the number of rows deleted
+        """
+        rids = [rid for rid, _ in self._select(where, (), index)]
+        old = [(rid, self.rows.pop(rid)) for rid in rids]
+        for index in self.indexes.values():
+            self._queue(index, removes=self._entries(index, old))
+        self._flush()
+        return len(old)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Queries
+
+    def _predicates(self, where):
+        """Check the predicates and resolve their columns to positions in a row."""
+        resolved = []
+        for column, op, value in where:
+            if op not in _tests:
+                raise ValueError(f'unknown operator {op!r}, expected one of {list(OPERATORS)}')
+            if op == 'between' and len(value) != 2:
+                raise ValueError('between expects a (low, high) pair')
+            resolved.append((self._positions([column])[0], _tests[op], value))
+        return resolved
+
+    @staticmethod
+    def _bounds(where):
+        """Equality values and the tightest (value, inclusive) low and high bound of each column."""
+        equal, low, high = {}, {}, {}
+
+        def tighten(bounds, column, value, inclusive, beyond):
+            current = bounds.get(column)
+            if current is None or beyond(value, current[0]) or (value == current[0] and not inclusive):
+                bounds[column] = (value, inclusive)
+
+        for column, op, value in where:
+            if op == '=':
+                equal.setdefault(column, value)
+            elif op == 'between':
+                tighten(low, column, value[0], True, operator.gt)
+                tighten(high, column, value[1], True, operator.lt)
+            elif op in ('>', '>='):
+                tighten(low, column, value, op == '>=', operator.gt)
+            else:
+                tighten(high, column, value, op == '<=', operator.lt)
+        return equal, low, high
+
+    def _index_plan(self, index, equal, low, high, needed):
+        """The plan of one index, or None if its leading column has no usable predicate."""
+        covering = index.covers(needed)
+        if index.kind == 'hash':
+            if all(column in equal for column in index.columns):
+                return Plan(HASH, index, tuple(equal[column] for column in index.columns), None, None, covering)
+            return None
+        prefix = []
+        for column in index.columns:
+            if column not in equal:
+                break
+            prefix.append(equal[column])
+        bounds = (None, None)
+        if len(prefix) < len(index.columns):
+            column = index.columns[len(prefix)]
+            bounds = (low.get(column), high.get(column))
+        if not prefix and bounds == (None, None):
+            return None
+        return Plan(RANGE, index, tuple(prefix), bounds[0], bounds[1], covering)
+
+    def plan(self, where=(), columns=None, index=None):
+        """Choose the access path of a query.
+        :param where: sequence of (column, operator, value) predicates that must all hold
+        :param columns: the columns the query returns, None for all of them
+        :param index: name of an index to use instead of choosing one, or ``SCAN`` for a full scan
+        :rtype: Plan
+        """
+        where = list(where)
+        self._predicates(where)
+        needed = set(self.columns if columns is None else columns)
+        needed.update(column for column, _, _ in where)
+        self._positions(needed)
+        if index == SCAN:
+            return Plan(SCAN, None, (), None, None, False)
+        equal, low, high = self._bounds(where)
+        if index is not None:
+            plan = self._index_plan(self.indexes[index], equal, low, high, needed)
+            if plan is None:
+                raise ValueError(f'index {index!r} cannot be used for these predicates')
+            return plan
+        best, best_rank = Plan(SCAN, None, (), None, None, False), None
+        for candidate in self.indexes.values():
+            plan = self._index_plan(candidate, equal, low, high, needed)
+            if plan is None:
+                continue
+            # Most index columns matched, then hash lookups over scans, then both bounds over one,
+            # then covering
+            bounded = (plan.low is not None) + (plan.high is not None)
+            rank = (len(plan.prefix) + (bounded > 0), plan.access == HASH, bounded, plan.covering)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = plan, rank
+        return best
+
+    def _select(self, where, columns, index=None):
+        """Yield (rid, values of columns) of the rows matching the predicates."""
+        where = list(where)
+        plan = self.plan(where, columns, index)
+        self._flush(force=True)
+        predicates = self._predicates(where)
+        if plan.access == SCAN:
+            positions = self._positions(columns)
+            for rid, row in list(self.rows.items()):
+                if _matches(row, predicates):
+                    yield rid, tuple(row[i] for i in positions)
+            return
+
+        found = plan.index.lookup(plan.prefix) if plan.access == HASH else \
+            plan.index.scan(plan.prefix, plan.low, plan.high)
+        if plan.covering:
+            # Rows are read from the index, with the stored columns in index order
+            stored = plan.index.columns + plan.index.include
+            at = {column: i for i, column in enumerate(stored)}
+            predicates = [(at[self.columns[position]], test, value) for position, test, value in predicates]
+            positions = [at[column] for column in columns]
+            for key, rid, included in found:
+                row = key + included
+                if _matches(row, predicates):
+                    yield rid, tuple(row[i] for i in positions)
+        else:
+            positions = self._positions(columns)
+            for _, rid, _ in found:
+                row = self.rows[rid]
+                if _matches(row, predicates):
+                    yield rid, tuple(row[i] for i in positions)
+
+    def select(self, where=(), columns=None, index=None):
+        """Rows matching the predicates, as tuples of the columns, in the order of the access path.
+        :param where: sequence of (column, operator, value) predicates that must all hold
+        :param columns: the columns to return, None for all of them
+        :param index: name of an index to use instead of choosing one, or ``SCAN`` for a full scan
+        :rtype: list[tuple]
+        """
+        columns = self.columns if columns is None else tuple(columns)
+        return [values for _, values in self._select(where, columns, index)]
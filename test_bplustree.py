@@ -0,0 +1,1038 @@
+from BPlusTree import BPlusTree, CompressedLeaf, Leaf, PrefixKeys
+from cachedBPlusTree import ClockCache, CachedBPlusTree, LRUCache
+from concurrentBPlusTree import ConcurrentBPlusTree
+from ghostBPlusTree import GHOST, GhostBPlusTree
+from loggedBPlusTree import LoggedBPlusTree, write_checkpoint
+from pagedBPlusTree import PagedBPlusTree
+import snapshot
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+
+def check_tree(test, tree, minimum=None):
+    """Assert the structural invariants of a B+ tree and return its keys in leaf-chain order.
+    :param minimum: the fewest keys a node other than the root may hold, ``tree.minimum`` if None
+    """
+    leaves = []
+    minimum = tree.minimum if minimum is None else minimum
+
+    def walk(node, low, high, depth):
+        if node is not tree.root:
+            test.assertGreaterEqual(len(node.keys), minimum)
+        test.assertLessEqual(len(node.keys), tree.maximum)
+        test.assertEqual(list(node.keys), sorted(node.keys))
+        for key in node.keys:
+            test.assertTrue(low is None or low <= key)
+            test.assertTrue(high is None or key < high)
+        if isinstance(node, Leaf):
+            test.assertEqual(depth, tree.depth)
+            test.assertEqual(len(node.keys), len(node.values))
+            leaves.append(node)
+            return
+        test.assertEqual(len(node.values), len(node.keys) + 1)
+        bounds = [low] + list(node.keys) + [high]
+        for i, child in enumerate(node.values):
+            test.assertIs(child.parent, node)
+            walk(child, bounds[i], bounds[i + 1], depth + 1)
+
+    test.assertIsNone(tree.root.parent)
+    walk(tree.root, None, None, 0)
+
+    leaf = tree.leftmost_leaf()
+    test.assertIsNone(leaf.prev)
+    chained = []
+    while leaf is not None:
+        chained.append(leaf)
+        test.assertTrue(leaf.next is None or leaf.next.prev is leaf)
+        leaf = leaf.next
+    test.assertEqual([id(leaf) for leaf in chained], [id(leaf) for leaf in leaves])
+    return [key for leaf in leaves for key in leaf.keys]
+
+
+class TestBulkLoad(unittest.TestCase):
+    def test_matches_inserts(self):
+        keys = random.sample(range(10000), 2000)
+        tree = BPlusTree.bulk_load([(k, str(k)) for k in keys], maximum=5)
+        self.assertEqual(check_tree(self, tree), sorted(keys))
+        for k in keys:
+            self.assertEqual(tree[k], str(k))
+
+    def test_presorted_and_duplicates(self):
+        items = [(1, 'a'), (2, 'b'), (2, 'c'), (3, 'd')]
+        tree = BPlusTree.bulk_load(iter(items), presorted=True)
+        self.assertEqual(check_tree(self, tree), [1, 2, 3])
+        self.assertEqual(tree[2], 'c')
+        with self.assertRaises(ValueError):
+            BPlusTree.bulk_load([(2, 'b'), (1, 'a')], presorted=True)
+
+    def test_fill_factor(self):
+        tree = BPlusTree.bulk_load([(k, k) for k in range(1000)], maximum=10, fill_factor=0.7)
+        check_tree(self, tree)
+        leaf = tree.leftmost_leaf()
+        while leaf.next is not None:
+            self.assertEqual(len(leaf.keys), 7)
+            leaf = leaf.next
+        with self.assertRaises(ValueError):
+            BPlusTree.bulk_load([], fill_factor=0)
+
+    def test_small_inputs(self):
+        for n in range(0, 40):
+            tree = BPlusTree.bulk_load([(k, k) for k in range(n)], maximum=4)
+            self.assertEqual(check_tree(self, tree), list(range(n)))
+
+    def test_modifiable_after_load(self):
+        tree = BPlusTree.bulk_load([(k, k) for k in range(0, 2000, 2)], maximum=6)
+        for k in range(1, 2000, 2):
+            tree[k] = k
+        self.assertEqual(check_tree(self, tree), list(range(2000)))
+        keys = list(range(2000))
+        random.shuffle(keys)
+        for k in keys[:1500]:
+            tree.delete(k)
+        self.assertEqual(check_tree(self, tree), sorted(keys[1500:]))
+
+
+class TestSearch(unittest.TestCase):
+    def test_large_fanout(self):
+        tree = BPlusTree(256)
+        keys = random.sample(range(100000), 20000)
+        for k in keys:
+            tree[k] = k
+        self.assertEqual(check_tree(self, tree), sorted(keys))
+        for k in keys[:1000]:
+            self.assertEqual(tree.query(k), k)
+            self.assertEqual(tree.query(-k - 1), None)
+
+    def test_missing_and_overwrite(self):
+        tree = BPlusTree()
+        for k in 'dbeac':
+            tree[k] = k.upper()
+        tree['b'] = 'B2'
+        self.assertEqual(check_tree(self, tree), list('abcde'))
+        self.assertEqual(tree['b'], 'B2')
+        self.assertEqual(tree.insert('a', 'x'), (False, tree.find('a')))
+        self.assertEqual(tree.change('z', 'x'), (False, tree.find('z')))
+        with self.assertRaises(ValueError):
+            tree['z']
+        with self.assertRaises(ValueError):
+            tree.delete('z')
+
+
+class TestRange(unittest.TestCase):
+    def setUp(self):
+        self.tree = BPlusTree.bulk_load([(k, str(k)) for k in range(0, 200, 2)], maximum=4)
+
+    def test_iteration(self):
+        self.assertEqual(list(self.tree), list(range(0, 200, 2)))
+        self.assertEqual(list(self.tree.keys()), list(range(0, 200, 2)))
+        self.assertEqual(list(self.tree.items())[:2], [(0, '0'), (2, '2')])
+        self.assertEqual(list(BPlusTree()), [])
+
+    def test_bounds(self):
+        keys = lambda *args, **kwargs: [k for k, _ in self.tree.range(*args, **kwargs)]
+        self.assertEqual(keys(10, 20), [10, 12, 14, 16, 18, 20])
+        self.assertEqual(keys(11, 19), [12, 14, 16, 18])
+        self.assertEqual(keys(10, 20, inclusive=False), [12, 14, 16, 18])
+        self.assertEqual(keys(10, 20, inclusive=(True, False)), [10, 12, 14, 16, 18])
+        self.assertEqual(keys(hi=4), [0, 2, 4])
+        self.assertEqual(keys(lo=194), [194, 196, 198])
+        self.assertEqual(keys(-50, -1), [])
+        self.assertEqual(keys(500, 600), [])
+
+    def test_reverse(self):
+        keys = lambda *args, **kwargs: [k for k, _ in self.tree.range(*args, reverse=True, **kwargs)]
+        self.assertEqual(keys(), list(range(198, -1, -2)))
+        self.assertEqual(keys(10, 20), [20, 18, 16, 14, 12, 10])
+        self.assertEqual(keys(11, 19), [18, 16, 14, 12])
+        self.assertEqual(keys(10, 20, inclusive=False), [18, 16, 14, 12])
+        self.assertEqual(keys(hi=5), [4, 2, 0])
+
+
+class TestStats(unittest.TestCase):
+    def test_counts_per_tree(self):
+        tree, other = BPlusTree(4), BPlusTree(4)
+        for k in range(100):
+            tree[k] = k
+        other[0] = 0
+        self.assertGreater(tree.stats.splits, tree.stats.parent_splits)
+        self.assertGreater(tree.stats.parent_splits, 0)
+        self.assertEqual(other.output(), (0, 0, 0, 0, 0))
+        for k in range(90):
+            tree.delete(k)
+        check_tree(self, tree)
+        self.assertGreater(tree.stats.fusions, 0)
+        self.assertGreater(tree.stats.borrows, 0)
+        self.assertEqual(tree.output()[2:], (tree.stats.fusions, tree.stats.parent_fusions, tree.depth))
+
+    def test_shape(self):
+        tree = BPlusTree.bulk_load([(k, k) for k in range(1000)], maximum=10, fill_factor=0.5)
+        for k in range(1000, 1200):
+            tree.insert(k, k)
+        for k in range(0, 1000, 3):
+            tree.delete(k)
+        leaves, nodes, stack = 0, 0, [tree.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Leaf):
+                leaves += 1
+            else:
+                nodes += 1
+                stack.extend(node.values)
+        snapshot = tree.stats.snapshot()
+        self.assertEqual(snapshot['size'], len(check_tree(self, tree)))
+        self.assertEqual((snapshot['leaves'], snapshot['nodes']), (leaves, nodes))
+        self.assertAlmostEqual(snapshot['fill_factor'], snapshot['size'] / (leaves * 10))
+
+    def test_reset_and_timing(self):
+        tree = BPlusTree(4, timing=True)
+        for k in range(50):
+            tree.insert(k, k)
+        tree.query(3)
+        tree.delete(3)
+        snapshot = tree.stats.snapshot()
+        self.assertEqual(snapshot['calls']['insert'], 50)
+        self.assertEqual(snapshot['calls']['delete'], 1)
+        self.assertGreater(snapshot['times']['find'], 0)
+        tree.stats.reset()
+        self.assertEqual(tree.stats.splits, 0)
+        self.assertEqual(tree.stats.calls['insert'], 0)
+        self.assertEqual(tree.stats.size, 49)
+        self.assertGreater(snapshot['splits'], 0)
+
+
+class TestBatch(unittest.TestCase):
+    def batches(self):
+        for _ in range(5):
+            start = random.randrange(5000)
+            batch = [(k, random.random()) for k in range(start, start + 300)]
+            yield batch + [(random.randrange(5000), random.random()) for _ in range(300)]
+
+    def test_insert_many_matches_insert(self):
+        for maximum in (3, 4, 7, 32):
+            batched, single = BPlusTree(maximum), BPlusTree(maximum)
+            for batch in self.batches():
+                added = sum(single.insert(k, v)[0] for k, v in batch)
+                self.assertEqual(batched.insert_many(batch), added)
+            self.assertEqual(list(batched.items()), list(single.items()))
+            self.assertEqual(batched.stats.size, len(check_tree(self, batched)))
+
+    def test_insert_many_replace(self):
+        batched, single = BPlusTree(5), BPlusTree(5)
+        for batch in self.batches():
+            batched.insert_many(batch, replace=True)
+            for k, v in batch:
+                single[k] = v
+        self.assertEqual(list(batched.items()), list(single.items()))
+        check_tree(self, batched)
+
+    def test_delete_many(self):
+        for maximum in (3, 4, 7, 32):
+            tree = BPlusTree.bulk_load([(k, k) for k in range(5000)], maximum=maximum)
+            remaining = set(range(5000))
+            for _ in range(5):
+                start = random.randrange(5000)
+                batch = list(range(start, start + 700)) + [random.randrange(6000) for _ in range(300)]
+                self.assertEqual(tree.delete_many(batch), len(remaining & set(batch)))
+                remaining -= set(batch)
+                self.assertEqual(check_tree(self, tree), sorted(remaining))
+            self.assertEqual(tree.delete_many(range(6000)), len(remaining))
+            self.assertEqual(check_tree(self, tree), [])
+            self.assertEqual(tree.depth, 0)
+
+
+class TestTypedKeys(unittest.TestCase):
+    def test_int_keys(self):
+        tree = BPlusTree(8, typecode='q')
+        keys = random.sample(range(-10 ** 12, 10 ** 12), 3000)
+        for k in keys:
+            tree[k] = k
+        tree.insert_many([(k, k) for k in range(5000)])
+        for k in keys[:2000]:
+            tree.delete(k)
+        tree.delete_many(range(0, 5000, 3))
+        expected = sorted(set(keys[2000:]) | (set(range(5000)) - set(range(0, 5000, 3))))
+        self.assertEqual(check_tree(self, tree), expected)
+        self.assertEqual(type(tree.leftmost_leaf().keys).__name__, 'array')
+        with self.assertRaises(TypeError):
+            tree['a'] = 1
+
+    def test_float_keys(self):
+        tree = BPlusTree.bulk_load([(k / 4, k) for k in range(1000)], maximum=16, typecode='d')
+        self.assertEqual(tree[2.5], 10)
+        self.assertEqual([k for k, _ in tree.range(1, 2)], [1.0, 1.25, 1.5, 1.75, 2.0])
+        with self.assertRaises(ValueError):
+            BPlusTree(typecode='x')
+
+    def test_slots(self):
+        self.assertFalse(hasattr(BPlusTree().root, '__dict__'))
+
+
+class TestPagedBPlusTree(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'index.pages')
+
+    def test_insert_delete_reopen(self):
+        keys = random.sample(range(100000), 3000)
+        with PagedBPlusTree(self.path, maximum=8, pool_size=16, page_size=1024) as tree:
+            for k in keys:
+                tree[k] = str(k)
+            for k in keys[:1000]:
+                tree.delete(k)
+            self.assertGreater(tree.pool.evictions, 0)
+            self.assertGreater(tree.pool.writes, 0)
+            self.assertEqual(check_tree(self, tree), sorted(keys[1000:]))
+
+        with PagedBPlusTree(self.path, pool_size=16) as tree:
+            self.assertEqual(tree.maximum, 8)
+            self.assertEqual(tree.stats.size, 2000)
+            self.assertEqual(tree.query(keys[0]), None)
+            for k in keys[1000:1500]:
+                self.assertEqual(tree[k], str(k))
+            self.assertEqual(list(tree.range(hi=500)), [(k, str(k)) for k in sorted(keys[1000:]) if k <= 500])
+            self.assertLess(tree.pool.reads, 3000)
+            self.assertEqual(check_tree(self, tree), sorted(keys[1000:]))
+
+        with PagedBPlusTree(self.path, maximum=8, page_size=1024) as tree:
+            self.assertEqual(tree.stats.size, 2000)
+        with self.assertRaises(ValueError):
+            PagedBPlusTree(self.path, maximum=16)
+        with self.assertRaises(ValueError):
+            PagedBPlusTree(self.path, page_size=4096)
+
+    def test_bulk_load_and_free_pages(self):
+        tree = PagedBPlusTree.bulk_load([(k, k) for k in range(2000)], maximum=8, path=self.path, pool_size=8)
+        pages = tree.pool.next_page
+        for k in range(1500):
+            tree.delete(k)
+        for k in range(1500):
+            tree[k] = k
+        self.assertEqual(check_tree(self, tree), list(range(2000)))
+        self.assertLess(tree.pool.next_page, pages * 2)
+        tree.close()
+
+    def test_rebuild_and_reorganize(self):
+        with PagedBPlusTree(self.path, maximum=8, pool_size=8, page_size=1024) as tree:
+            for k in range(2000):
+                tree[k] = k
+            for k in range(0, 2000, 3):
+                tree.delete(k)
+            pages = tree.pool.next_page
+            tree.reorganize()
+            self.assertEqual(tree.stats.leaves, 167)
+            tree.rebuild(0.5)
+            tree.rebuild()
+            # Old pages go back to the free list and are reused by the next rebuild
+            self.assertLess(tree.pool.next_page, pages * 2)
+        with PagedBPlusTree(self.path, pool_size=8) as tree:
+            self.assertEqual(check_tree(self, tree), [k for k in range(2000) if k % 3])
+
+    def test_page_overflow(self):
+        with self.assertRaises(ValueError):
+            with PagedBPlusTree(self.path, maximum=8, pool_size=1, page_size=256) as tree:
+                for k in range(100):
+                    tree[k] = str(k) * 100
+
+
+class TestConcurrent(unittest.TestCase):
+    def setUp(self):
+        # Switch threads often so that operations interleave in the middle of splits and merges
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+
+    def run_threads(self, targets):
+        errors = []
+        start = threading.Barrier(len(targets))
+
+        def run(target):
+            try:
+                start.wait()
+                target()
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+            self.assertFalse(thread.is_alive(), 'thread deadlocked')
+        if errors:
+            raise errors[0]
+
+    def test_stress(self):
+        tree = ConcurrentBPlusTree(maximum=4)
+        # Keys divisible by 10 stay in the tree the whole time, every writer owns the other keys
+        # that are congruent to its number modulo 9
+        pinned = list(range(0, 2000, 10))
+        for k in pinned:
+            tree[k] = k
+        writers = 4
+        expected = [set() for _ in range(writers)]
+        done = threading.Event()
+
+        def writer(w):
+            rng = random.Random(w)
+            keys = [k for k in range(2000) if k % 10 and k % 9 == w]
+            for _ in range(4000):
+                k = rng.choice(keys)
+                if k in expected[w]:
+                    tree.delete(k)
+                    expected[w].discard(k)
+                else:
+                    self.assertTrue(tree.insert(k, k)[0])
+                    expected[w].add(k)
+
+        def reader(r):
+            rng = random.Random(100 + r)
+            while not done.is_set():
+                k = rng.choice(pinned)
+                self.assertEqual(tree[k], k)
+                lo = rng.randrange(2000)
+                keys = [key for key, _ in tree.range(lo, lo + 200, reverse=r % 2 == 1)]
+                self.assertEqual(keys, sorted(keys, reverse=r % 2 == 1))
+                self.assertEqual(len(keys), len(set(keys)))
+                self.assertTrue(set(k for k in pinned if lo <= k <= lo + 200) <= set(keys))
+
+        def writers_then_stop():
+            try:
+                self.run_threads([lambda w=w: writer(w) for w in range(writers)])
+            finally:
+                done.set()
+
+        self.run_threads([writers_then_stop] + [lambda r=r: reader(r) for r in range(3)])
+        keys = sorted(set(pinned).union(*expected))
+        self.assertEqual(check_tree(self, tree), keys)
+        self.assertEqual(tree.stats.size, len(keys))
+        self.assertEqual(list(tree.keys()), keys)
+        self.assertGreater(tree.pessimistic, 0)
+
+    def test_shared_keys(self):
+        tree = ConcurrentBPlusTree(maximum=5)
+
+        def churn(seed):
+            rng = random.Random(seed)
+            for _ in range(20000):
+                k = rng.randrange(300)
+                if rng.random() < 0.5:
+                    tree[k] = seed
+                else:
+                    try:
+                        tree.delete(k)
+                    except ValueError:
+                        pass
+
+        self.run_threads([lambda s=s: churn(s) for s in range(4)])
+        keys = check_tree(self, tree)
+        self.assertEqual(tree.stats.size, len(keys))
+        self.assertEqual(list(tree.range(reverse=True)), [(k, tree[k]) for k in reversed(keys)])
+
+    def test_single_thread_matches_tree(self):
+        tree, reference = ConcurrentBPlusTree(maximum=4), BPlusTree(maximum=4)
+        keys = random.sample(range(5000), 1500)
+        for k in keys:
+            tree[k] = reference[k] = str(k)
+        for k in keys[:700]:
+            tree.delete(k)
+            reference.delete(k)
+        self.assertEqual(check_tree(self, tree), check_tree(self, reference))
+        self.assertEqual(list(tree.range(100, 3000, (False, True))), list(reference.range(100, 3000, (False, True))))
+        self.assertEqual(list(tree.range(100, 3000, False, reverse=True)),
+                         list(reference.range(100, 3000, False, reverse=True)))
+        self.assertEqual(tree.insert_many([(k, k) for k in range(20)]), len(set(range(20)) - set(keys[700:])))
+        self.assertEqual(tree.delete_many(range(20)), 20)
+        with self.assertRaises(ValueError):
+            ConcurrentBPlusTree(typecode='q')
+
+
+class TestLoggedBPlusTree(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'index.ckpt')
+
+    def test_recover_after_crash(self):
+        # The child process dies without closing the log or taking a checkpoint
+        code = ('import os, sys\n'
+                'from loggedBPlusTree import LoggedBPlusTree\n'
+                'tree = LoggedBPlusTree(sys.argv[1], maximum=4)\n'
+                'for k in range(300):\n'
+                '    tree[k] = str(k)\n'
+                'tree.checkpoint()\n'
+                'tree.delete_many(range(0, 300, 3))\n'
+                'tree.change(1, "one")\n'
+                'tree.insert(1000, ("a", 1.5, None))\n'
+                'tree.insert(1, "ignored")\n'
+                'tree.delete(2)\n'
+                'os._exit(1)\n')
+        subprocess.run([sys.executable, '-c', code, self.path], check=False,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        with LoggedBPlusTree(self.path, maximum=4) as tree:
+            expected = {k: str(k) for k in range(300) if k % 3 and k != 2}
+            expected[1] = 'one'
+            expected[1000] = ('a', 1.5, None)
+            self.assertEqual(check_tree(self, tree), sorted(expected))
+            self.assertEqual(dict(tree.items()), expected)
+            self.assertEqual(tree.stats.size, len(expected))
+
+    def test_checkpoint_truncates_log(self):
+        with LoggedBPlusTree(self.path, durability='batch', batch_size=16) as tree:
+            tree.insert_many([(k, k) for k in range(500)])
+            size = os.path.getsize(self.path + '.wal')
+            tree.checkpoint()
+            self.assertLess(os.path.getsize(self.path + '.wal'), size)
+            lsn = tree.log.appended_lsn
+            tree[1000] = b'\x00\x01'
+            self.assertGreater(tree.log.appended_lsn, lsn)
+        with LoggedBPlusTree(self.path) as tree:
+            self.assertEqual(tree.stats.size, 501)
+            self.assertEqual(tree[1000], b'\x00\x01')
+
+    def test_torn_record(self):
+        with LoggedBPlusTree(self.path) as tree:
+            for k in range(50):
+                tree[k] = k
+        with open(self.path + '.wal', 'ab') as file:
+            file.write(b'\x20\x00\x00\x00garbage')
+        with LoggedBPlusTree(self.path) as tree:
+            self.assertEqual(list(tree.keys()), list(range(50)))
+            tree[50] = 50
+        with LoggedBPlusTree(self.path) as tree:
+            self.assertEqual(list(tree.keys()), list(range(51)))
+
+    def test_failed_changes_are_not_logged(self):
+        with LoggedBPlusTree(self.path) as tree:
+            tree.insert(1, 'a')
+            with self.assertRaises(TypeError):
+                tree.insert('x', 'b')
+            with self.assertRaises(TypeError):
+                tree.insert_many([(3, 'd'), ('y', 'e')])
+            with self.assertRaises(TypeError):
+                tree.delete_many([4, 'z'])
+            with self.assertRaises(ValueError):
+                tree.delete(5)
+            with self.assertRaises(TypeError):
+                tree[6] = threading.Lock()
+            self.assertIsNone(tree.query(6))
+            tree.insert(2, 'c')
+            self.assertEqual(tree.log.records, 2)
+        with LoggedBPlusTree(self.path) as tree:
+            self.assertEqual(list(tree.items()), [(1, 'a'), (2, 'c')])
+
+    def test_replay_skips_checkpointed_records(self):
+        with LoggedBPlusTree(self.path) as tree:
+            for k in range(100):
+                tree.insert(k, k)
+            # A crash after writing the checkpoint but before truncating the log
+            write_checkpoint(self.path, tree.log.appended_lsn, tree.items())
+        with LoggedBPlusTree(self.path) as tree:
+            self.assertEqual(check_tree(self, tree), list(range(100)))
+            self.assertEqual(tree.stats.size, 100)
+
+    def test_group_commit(self):
+        with LoggedBPlusTree(self.path, maximum=16) as tree:
+            start = threading.Barrier(8)
+
+            def write(t):
+                start.wait()
+                for k in range(t, 800, 8):
+                    tree[k] = k
+
+            threads = [threading.Thread(target=write, args=(t,)) for t in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(tree.log.records, 800)
+            self.assertEqual(tree.log.durable_lsn, tree.log.appended_lsn)
+            self.assertLess(tree.log.syncs, 800)
+        with LoggedBPlusTree(self.path, maximum=16) as tree:
+            self.assertEqual(check_tree(self, tree), list(range(800)))
+
+    def test_interval(self):
+        with LoggedBPlusTree(self.path, durability='interval', interval=0.01) as tree:
+            tree[1] = 1
+            for _ in range(200):
+                if tree.log.durable_lsn == tree.log.appended_lsn:
+                    break
+                threading.Event().wait(0.01)
+            self.assertEqual(tree.log.durable_lsn, tree.log.appended_lsn)
+        with self.assertRaises(ValueError):
+            LoggedBPlusTree(self.path, durability='never')
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'index.snap')
+
+    def shape(self, tree):
+        output = io.StringIO()
+        tree.show(file=output)
+        return output.getvalue()
+
+    def test_round_trip(self):
+        tree = BPlusTree(maximum=5)
+        keys = random.sample(range(100000), 3000)
+        for k in keys:
+            tree['k%06d' % k] = 'value %d' % k
+        for k in keys[:1000]:
+            tree.delete('k%06d' % k)
+        tree.save(self.path)
+        loaded = BPlusTree.load(self.path)
+        self.assertEqual(check_tree(self, loaded), check_tree(self, tree))
+        self.assertEqual(self.shape(loaded), self.shape(tree))
+        self.assertEqual(list(loaded.items()), list(tree.items()))
+        for name in ('size', 'nodes', 'leaves'):
+            self.assertEqual(getattr(loaded.stats, name), getattr(tree.stats, name))
+        self.assertEqual(loaded.depth, tree.depth)
+        # The loaded tree keeps working
+        for k in keys[1000:2000]:
+            loaded.delete('k%06d' % k)
+        loaded['new'] = 'new'
+        self.assertEqual(len(check_tree(self, loaded)), 1001)
+
+    def test_values_of_any_type(self):
+        tree = BPlusTree(maximum=4)
+        for k in range(200):
+            tree[k] = (k, str(k)) if k % 3 else k * 0.5 if k % 2 else None
+        tree[2 ** 70] = b'big'
+        tree.save(self.path)
+        self.assertEqual(list(BPlusTree.load(self.path).items()), list(tree.items()))
+        empty = BPlusTree()
+        empty.save(self.path)
+        self.assertEqual(check_tree(self, BPlusTree.load(self.path)), [])
+
+    def test_typed_keys(self):
+        tree = BPlusTree.bulk_load([(k, -k) for k in range(1000)], maximum=8, typecode='q')
+        tree.save(self.path)
+        loaded = BPlusTree.load(self.path)
+        self.assertEqual(loaded.leaf_type, tree.leaf_type)
+        self.assertEqual(loaded.leftmost_leaf().keys.typecode, 'q')
+        self.assertEqual(check_tree(self, loaded), list(range(1000)))
+        with self.assertRaises(ValueError):
+            BPlusTree.load(self.path, lazy=True)
+
+    def test_lazy(self):
+        tree = BPlusTree.bulk_load([(k, str(k)) for k in range(1000)], maximum=8)
+        tree.save(self.path)
+        loaded = BPlusTree.load(self.path, lazy=True)
+        leaves = []
+        leaf = loaded.leftmost_leaf()
+        while leaf is not None:
+            leaves.append(leaf)
+            leaf = leaf.next
+        self.assertTrue(all(leaf._source is not None for leaf in leaves))
+        self.assertEqual(loaded[500], '500')
+        self.assertEqual(sum(leaf._source is None for leaf in leaves), 1)
+        for k in range(0, 1000, 2):
+            loaded.delete(k)
+        loaded[1001] = 'x'
+        self.assertEqual(check_tree(self, loaded), list(range(1, 1000, 2)) + [1001])
+        self.assertEqual(loaded[999], '999')
+
+    def test_tree_options(self):
+        tree = BPlusTree(8, compress=True, fill_factor=0.7, split_policy='append')
+        for i in range(500):
+            tree[f'key{i:04d}'] = i
+        tree.save(self.path)
+        loaded = BPlusTree.load(self.path)
+        self.assertIs(loaded.leaf_type, CompressedLeaf)
+        self.assertIsInstance(loaded.leftmost_leaf().keys, PrefixKeys)
+        self.assertEqual((loaded.fill_factor, loaded.split_policy), (0.7, 'append'))
+        self.assertEqual(list(loaded.items()), list(tree.items()))
+        loaded['key0500'] = 500
+        self.assertEqual(check_tree(self, loaded, minimum=1), [f'key{i:04d}' for i in range(501)])
+        with self.assertRaises(ValueError):
+            BPlusTree.load(self.path, lazy=True)
+
+        # Version 1 snapshots, without the options, load with the defaults
+        BPlusTree.bulk_load([(k, k) for k in range(100)], 8).save(self.path)
+        with open(self.path, 'rb') as file:
+            data = bytearray(file.read())
+        start = snapshot._header.size + snapshot._tree.size
+        del data[start:start + snapshot._tree_options.size]
+        data[:snapshot._header.size] = snapshot._header.pack(snapshot.MAGIC, 1, snapshot.TREE)
+        with open(self.path, 'wb') as file:
+            file.write(data)
+        loaded = BPlusTree.load(self.path)
+        self.assertEqual((loaded.leaf_type, loaded.fill_factor, loaded.split_policy), (Leaf, 1.0, 'half'))
+        self.assertEqual(check_tree(self, loaded), list(range(100)))
+
+    def test_not_a_snapshot(self):
+        with open(self.path, 'wb') as file:
+            file.write(b'not a snapshot at all')
+        with self.assertRaises(ValueError):
+            BPlusTree.load(self.path)
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(5)
+        # Repeated keys, values with inner spaces and a last line without a newline
+        self.data = b''.join(f'key{rng.randrange(2000)}  value {i} \n'.encode() for i in range(5000)) + b'end tail'
+        self.expected = BPlusTree(8)
+        self.expected.readfile(io.BytesIO(self.data), progress=lambda rows: None)
+
+    def test_matches_readfile(self):
+        for workers in (0, 2):
+            stages = []
+            tree = BPlusTree.ingest(io.BytesIO(self.data), 8, chunk_size=4096, workers=workers,
+                                    progress=lambda stage, rows: stages.append((stage, rows)))
+            self.assertEqual(check_tree(self, tree), list(self.expected.keys()))
+            self.assertEqual(list(tree.items()), list(self.expected.items()))
+            self.assertEqual(tree.stats.size, self.expected.stats.size)
+            self.assertEqual(stages[-1], ('merge', 5001))
+            self.assertIn(('parse', 5001), stages)
+
+    def test_merge_passes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            tree = BPlusTree.ingest(io.BytesIO(self.data), 8, chunk_size=1024, workers=0, fan_in=3,
+                                    temp_dir=directory)
+            self.assertEqual(os.listdir(directory), [])
+        self.assertEqual(list(tree.items()), list(self.expected.items()))
+
+    def test_bad_line(self):
+        with self.assertRaises(ValueError):
+            BPlusTree.ingest(io.BytesIO(b'a 1\nb\nc 3\n'), workers=0)
+
+
+class TestCompression(unittest.TestCase):
+    def keys(self, n):
+        rng = random.Random(11)
+        return [f'tenant{rng.randrange(8)}/path/{rng.randrange(10 ** 6):06d}' for _ in range(n)]
+
+    def test_prefix_keys(self):
+        keys = PrefixKeys(['abcx', 'abcy', 'abcz'])
+        self.assertEqual((keys.prefix, keys.suffixes), ('abc', ['x', 'y', 'z']))
+        self.assertEqual([keys.bisect_left(key) for key in ('ab', 'abcy', 'abd', 'b')], [0, 1, 3, 3])
+        self.assertEqual(keys.bisect_right('abcy'), 2)
+        keys.insert(0, 'aa')
+        self.assertEqual((keys.prefix, list(keys)), ('a', ['aa', 'abcx', 'abcy', 'abcz']))
+        right = keys[2:]
+        right.compact()
+        self.assertEqual((right.prefix, right.suffixes), ('abc', ['y', 'z']))
+        keys[0:1] = ['ab0', 'ab1']
+        del keys[-1]
+        self.assertEqual(list(keys + ['b']), ['ab0', 'ab1', 'abcx', 'abcy', 'b'])
+        self.assertEqual(PrefixKeys([b'key1', b'key2']).prefix, b'key')
+
+    def test_matches_plain_tree(self):
+        keys = self.keys(3000)
+        plain, compressed = BPlusTree(6), BPlusTree(6, compress=True)
+        for i, key in enumerate(keys):
+            plain[key] = i
+            compressed[key] = i
+        self.assertEqual(check_tree(self, compressed), list(plain.keys()))
+        self.assertEqual(list(compressed.items()), list(plain.items()))
+        # Separators are truncated to a prefix of the first key of the right leaf
+        leaf = compressed.leftmost_leaf()
+        self.assertTrue(leaf.keys[-1] < leaf.parent.keys[0] <= leaf.next.keys[0])
+        self.assertLess(len(leaf.parent.keys[0]), len(leaf.next.keys[0]))
+        self.assertGreater(len(leaf.keys.prefix), len('tenant'))
+        self.assertEqual(list(compressed.range('tenant3', 'tenant4')), list(plain.range('tenant3', 'tenant4')))
+        random.Random(2).shuffle(keys)
+        for key in keys[:2500]:
+            if plain.query(key) is not None:
+                plain.delete(key)
+                compressed.delete(key)
+        self.assertEqual(check_tree(self, compressed), list(plain.keys()))
+        self.assertIsNone(compressed.query('tenant9/none'))
+
+    def test_batches(self):
+        keys = self.keys(2000)
+        tree = BPlusTree.bulk_load(((key, key) for key in keys[:1000]), 8, compress=True)
+        check_tree(self, tree)
+        tree.insert_many((key, key) for key in keys[1000:])
+        tree.delete_many(keys[::3])
+        self.assertEqual(check_tree(self, tree), sorted(set(keys) - set(keys[::3])))
+        self.assertTrue(all(tree[key] == key for key in keys[1::3]))
+
+    def test_bytes_keys(self):
+        tree = BPlusTree(4, compress=True)
+        for i in range(200):
+            tree[b'prefix/%03d' % i] = i
+        self.assertEqual(check_tree(self, tree), [b'prefix/%03d' % i for i in range(200)])
+        self.assertEqual(tree[b'prefix/150'], 150)
+
+    def test_typecode_and_compress(self):
+        with self.assertRaises(ValueError):
+            BPlusTree(typecode='q', compress=True)
+
+
+class TestFillFactor(unittest.TestCase):
+    def test_append_split(self):
+        for fill_factor, leaves in ((1.0, 625), (0.5, 1249)):
+            tree = BPlusTree(16, fill_factor=fill_factor, split_policy='append')
+            for i in range(10000):
+                tree[i] = i
+            self.assertEqual(check_tree(self, tree, minimum=1), list(range(10000)))
+            self.assertEqual(tree.stats.leaves, leaves)
+        half = BPlusTree(16)
+        for i in range(10000):
+            half[i] = i
+        self.assertAlmostEqual(half.stats.fill_factor, 0.5, places=2)
+
+        tree = BPlusTree(16, split_policy='append')
+        for start in range(0, 10000, 100):
+            tree.insert_many((i, i) for i in range(start, start + 100))
+        self.assertEqual(tree.stats.leaves, 625)
+        # Inserts that are not appends still split in the middle
+        tree[-1] = -1
+        self.assertEqual(tree.leftmost_leaf().keys, [-1] + list(range(7)))
+        keys = list(range(10000))
+        random.Random(4).shuffle(keys)
+        for key in keys[:9000]:
+            tree.delete(key)
+        self.assertEqual(check_tree(self, tree, minimum=1), sorted([-1] + keys[9000:]))
+
+    def fragmented(self, **kwargs):
+        tree = BPlusTree(16, **kwargs)
+        keys = list(range(5000))
+        random.Random(6).shuffle(keys)
+        for key in keys:
+            tree[key] = str(key)
+        for key in keys[:3500]:
+            tree.delete(key)
+        return tree, sorted(keys[3500:])
+
+    def test_reorganize(self):
+        tree, keys = self.fragmented()
+        self.assertLess(tree.stats.fill_factor, 0.7)
+        tree.reorganize()
+        self.assertEqual(check_tree(self, tree), keys)
+        self.assertGreater(tree.stats.fill_factor, 0.99)
+        self.assertEqual(tree.stats.leaves, 94)
+        tree.reorganize(0.5)
+        self.assertEqual(tree.stats.leaves, 94)
+        for key in keys[::2]:
+            tree.delete(key)
+        tree.insert_many((key, str(key)) for key in range(5000, 6000))
+        self.assertEqual(check_tree(self, tree), keys[1::2] + list(range(5000, 6000)))
+
+    def test_rebuild(self):
+        for kwargs in ({}, {'typecode': 'q'}):
+            tree, keys = self.fragmented(fill_factor=0.75, **kwargs)
+            tree.rebuild()
+            self.assertEqual(check_tree(self, tree), keys)
+            self.assertEqual(tree.stats.leaves, 125)
+            self.assertEqual(tree.stats.snapshot()['nodes'], 11)
+            self.assertEqual([tree[key] for key in keys[:10]], [str(key) for key in keys[:10]])
+            tree.rebuild(1.0)
+            self.assertEqual(check_tree(self, tree), keys)
+            self.assertEqual(tree.stats.leaves, 94)
+
+    def test_compressed_rebuild(self):
+        tree = BPlusTree(8, compress=True)
+        for i in range(500):
+            tree[f'key{i:04d}'] = i
+        tree.rebuild()
+        tree.reorganize()
+        self.assertEqual(check_tree(self, tree), [f'key{i:04d}' for i in range(500)])
+
+    def test_bad_options(self):
+        with self.assertRaises(ValueError):
+            BPlusTree(split_policy='random')
+        with self.assertRaises(ValueError):
+            BPlusTree(fill_factor=0)
+        with self.assertRaises(ValueError):
+            BPlusTree().rebuild(1.5)
+
+
+class TestGhost(unittest.TestCase):
+    def test_churn(self):
+        rng = random.Random(8)
+        tree, expected = GhostBPlusTree(8), {}
+        for step in range(6000):
+            key = rng.randrange(1000)
+            if key in expected and rng.random() < 0.5:
+                tree.delete(key)
+                del expected[key]
+            elif rng.random() < 0.5:
+                tree[key] = step
+                expected[key] = step
+            else:
+                self.assertEqual(tree.insert(key, step)[0], key not in expected)
+                expected.setdefault(key, step)
+            if step % 1000 == 999:
+                self.assertGreater(tree.ghosts, 0)
+                tree.cleanup(tree.ghosts // 2)
+        self.assertEqual(list(tree.items()), sorted(expected.items()))
+        self.assertEqual(list(tree.range(100, 200, reverse=True)),
+                         sorted(((k, v) for k, v in expected.items() if 100 <= k <= 200), reverse=True))
+        self.assertEqual(tree.stats.size, len(expected) + tree.ghosts)
+        tree.cleanup()
+        self.assertEqual(tree.ghosts, 0)
+        self.assertEqual(check_tree(self, tree), sorted(expected))
+        self.assertEqual(tree.stats.size, len(expected))
+
+    def test_ghosts_hidden_and_revived(self):
+        tree = GhostBPlusTree.bulk_load(((i, i) for i in range(1000)), 16)
+        leaves = tree.stats.leaves
+        self.assertEqual(tree.delete_many(range(0, 1000, 2)), 500)
+        self.assertEqual(tree.delete_many(range(0, 10)), 5)
+        self.assertEqual(tree.ghosts, 505)
+        self.assertEqual(tree.stats.leaves, leaves)
+        self.assertIs(tree.find(0).values[0], GHOST)
+        self.assertIsNone(tree.query(0))
+        with self.assertRaises(ValueError):
+            tree[0]
+        with self.assertRaises(ValueError):
+            tree.delete(0)
+        self.assertFalse(tree.change(0, 'x')[0])
+        self.assertEqual(list(tree.keys()), [k for k in range(10, 1000) if k % 2])
+        self.assertEqual(len(list(tree.range(hi=500))), 245)
+
+        tree[0] = 'a'
+        self.assertTrue(tree.insert(2, 'b')[0])
+        self.assertEqual(tree.insert_many([(4, 'c'), (4, 'd'), (1000, 'e')]), 2)
+        self.assertEqual([tree[key] for key in (0, 2, 4, 1000)], ['a', 'b', 'c', 'e'])
+        self.assertEqual(tree.ghosts, 502)
+        self.assertEqual(tree.cleanup(100), 100)
+        self.assertEqual((tree.ghosts, tree.cleaned, tree.cleanups), (402, 100, 1))
+        check_tree(self, tree)
+        tree.rebuild()
+        self.assertEqual(tree.ghosts, 0)
+        self.assertEqual(tree.stats.size, 499)
+        self.assertEqual(check_tree(self, tree), [0, 2, 4] + list(range(11, 1000, 2)) + [1000])
+
+    def test_save_removes_ghosts(self):
+        tree = GhostBPlusTree.bulk_load(((i, str(i)) for i in range(300)), 8)
+        tree.delete_many(range(100))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tree.snap')
+            tree.save(path)
+            loaded = GhostBPlusTree.load(path)
+        self.assertEqual(tree.ghosts, 0)
+        self.assertEqual(list(loaded.items()), [(i, str(i)) for i in range(100, 300)])
+
+    def test_background_cleaner(self):
+        tree = GhostBPlusTree.bulk_load(((i, i) for i in range(20000)), 32)
+        tree.start_cleaner(interval=0.001, batch=500)
+        try:
+            for key in range(0, 20000, 3):
+                tree.delete(key)
+            self.assertEqual(sum(1 for _ in tree.items()), 13333)
+            for key in range(0, 300, 3):
+                tree[key] = -key
+        finally:
+            for _ in range(1000):
+                if not tree.ghosts:
+                    break
+                threading.Event().wait(0.005)
+            tree.stop_cleaner()
+        self.assertEqual(tree.ghosts, 0)
+        self.assertGreater(tree.cleanups, 1)
+        expected = [k for k in range(20000) if k % 3 or k < 300]
+        self.assertEqual(check_tree(self, tree), expected)
+
+
+class TestCache(unittest.TestCase):
+    def test_consistent_under_writes(self):
+        for policy, timing in (('lru', False), ('clock', False), ('lru', True)):
+            rng = random.Random(9)
+            tree, expected = CachedBPlusTree(4, timing, cache_size=50, cache_policy=policy), {}
+            for step in range(8000):
+                key, action = rng.randrange(400), rng.random()
+                if action < 0.5:
+                    self.assertEqual(tree.query(key), expected.get(key))
+                elif action < 0.6:
+                    if key in expected:
+                        self.assertEqual(tree[key], expected[key])
+                    else:
+                        with self.assertRaises(ValueError):
+                            tree[key]
+                elif action < 0.7:
+                    tree[key] = expected[key] = step
+                elif action < 0.75:
+                    self.assertEqual(tree.insert(key, step)[0], key not in expected)
+                    expected.setdefault(key, step)
+                elif action < 0.8:
+                    self.assertEqual(tree.change(key, step)[0], key in expected)
+                    if key in expected:
+                        expected[key] = step
+                elif action < 0.9:
+                    if key in expected:
+                        tree.delete(key)
+                        del expected[key]
+                elif action < 0.95:
+                    batch = [(rng.randrange(400), step) for _ in range(5)]
+                    tree.insert_many(batch, replace=True)
+                    expected.update(batch)
+                else:
+                    keys = [rng.randrange(400) for _ in range(5)]
+                    tree.delete_many(keys)
+                    for k in keys:
+                        expected.pop(k, None)
+            self.assertEqual([tree.query(key) for key in range(400)], [expected.get(key) for key in range(400)])
+            self.assertEqual(check_tree(self, tree), sorted(expected))
+            stats = tree.cache.stats()
+            self.assertLessEqual(stats['resident'], 50)
+            self.assertGreater(stats['hits'], 0)
+            self.assertGreater(stats['evictions'], 0)
+            self.assertGreater(stats['invalidations'], 0)
+
+    def test_counters(self):
+        tree = CachedBPlusTree.bulk_load(((i, str(i)) for i in range(100)), 8, cache_size=10)
+        for _ in range(3):
+            for key in range(5):
+                tree.query(key)
+        tree.query(1000)
+        tree.query(1000)
+        self.assertEqual((tree.cache.hits, tree.cache.misses), (11, 6))
+        tree[1000] = 'x'
+        self.assertEqual(tree[1000], 'x')
+        self.assertEqual(tree.cache.invalidations, 1)
+        tree.delete(0)
+        self.assertIsNone(tree.query(0))
+        self.assertEqual(tree.cache.hits, 13)
+        for key in range(100, 120):
+            tree.query(key)
+        self.assertEqual(tree.cache.evictions, 16)
+
+        tree = CachedBPlusTree.bulk_load(((i, i) for i in range(10)), 4, negative=False)
+        tree.query(-1)
+        tree.query(-1)
+        self.assertEqual((tree.cache.hits, len(tree.cache)), (0, 0))
+        with self.assertRaises(ValueError):
+            CachedBPlusTree(cache_policy='fifo')
+
+    def test_clock_second_chance(self):
+        cache = ClockCache(3)
+        for key in 'abc':
+            cache.put(key, key)
+        cache.get('a')
+        cache.put('d', 'd')
+        self.assertEqual(sorted(cache.slots), ['a', 'c', 'd'])
+        cache.discard('c')
+        cache.put('e', 'e')
+        self.assertEqual(sorted(cache.slots), ['a', 'd', 'e'])
+        self.assertEqual(cache.evictions, 1)
+        lru = LRUCache(2)
+        lru.put(1, 1)
+        lru.put(2, 2)
+        lru.get(1)
+        lru.put(3, 3)
+        self.assertEqual(list(lru.entries), [1, 3])
+
+
+class TestImport(unittest.TestCase):
+    def test_no_plotting_libraries(self):
+        code = ('import sys, BPlusTree, pagedBPlusTree\n'
+                'print(sorted({"graphviz", "matplotlib", "networkx", "numpy"} & set(sys.modules)))')
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,16 @@
 from hashTableSeparateChainingWithLinkedList import HashTable
+from hashTableSeparateChainingWithList import HashTableSC
+from hashTableDoubleHashing import HashTableDH, TOMBSTONE, is_prime
+from hashTableLinearProbing import HashTableLP
+from hashTableLockStriping import HashTableStriped
+from hashFunctions import HASH_FUNCTIONS, MERSENNE61, get_hash_function, key_bytes, power_hash
+import hashFunctions
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import sys
+import tempfile
+import threading
 import unittest
 
 
@@ -59,3 +71,460 @@ class TestHashTable(unittest.TestCase):
         self.assertEqual(self.ht.size, 2)
         self.assertEqual(None, self.ht.remove('A'))
         self.assertEqual(self.ht.size, 2)
+
+
+class TestHashFunctions(unittest.TestCase):
+    def test_strategies(self):
+        keys = ["hello", "", "ünïcödé", b"bytes", 42, -7, 2.5, ("tenant", 3), None]
+        for name, function in HASH_FUNCTIONS.items():
+            for key in keys:
+                self.assertEqual(function(key), function(key))
+                self.assertTrue(0 <= function(key) < 2 ** 64)
+            # Keys that compare equal must hash equal
+            self.assertEqual(function(1), function(1.0))
+            self.assertNotEqual(function(("ab", "c")), function(("a", "bc")))
+            self.assertNotEqual(get_hash_function(name, seed=1)("hello"), function("hello"))
+
+    def test_tables(self):
+        for table in (HashTable, HashTableSC, HashTableDH, HashTableLP):
+            index = lambda ht, key: ht.hash1(key) if table is HashTableDH else ht.hash(key)
+            for name in HASH_FUNCTIONS:
+                ht = table(hash_function=name)
+                self.assertTrue(0 <= index(ht, "key") < ht.capacity)
+            self.assertEqual(index(table(hash_function=lambda key: 7), "x"), 7)
+            with self.assertRaises(ValueError):
+                table(hash_function="md5")
+
+    def test_power_hash_uncached_bases(self):
+        # Long keys and large seeds reach bases past the cached power tables
+        for key, seed in (("x" * 3000, 0), ("hello", 10 ** 6), (bytes(range(256)) * 8, 77)):
+            n = len(key_bytes(key)) + seed
+            expected = sum(pow(index + n, c, MERSENNE61) for index, c in enumerate(key_bytes(key)))
+            self.assertEqual(power_hash(key, seed), expected % MERSENNE61)
+            self.assertEqual(get_hash_function('power', seed)(key), power_hash(key, seed))
+        self.assertLessEqual(len(hashFunctions._power_tables), hashFunctions.POWER_TABLES)
+
+    def test_int_keys(self):
+        ht = HashTable(hash_function='fnv1a')
+        for i in range(100):
+            ht.insertSC(i, str(i))
+        self.assertEqual(ht.find(42), "42")
+
+
+class TestResize(unittest.TestCase):
+    def lookup(self, ht, key):
+        return ht.find(key)
+
+    def test_grow(self):
+        for table in (HashTable, HashTableSC, HashTableDH):
+            ht = table(rehash_step=1)
+            insert = ht.insertDH if table is HashTableDH else ht.insertSC
+            for i in range(1000):
+                insert("key" + str(i), i)
+                # Every key stays reachable while old and new arrays are both live
+                if i % 97 == 0:
+                    for j in range(0, i + 1, 13):
+                        self.assertEqual(self.lookup(ht, "key" + str(j)), j)
+            self.assertEqual(len(ht), 1000)
+            self.assertGreater(ht.capacity, 1000 / ht.resize.max_load_factor - 1)
+            self.assertGreaterEqual(ht.resize.grows, 4)
+            self.assertEqual(ht.resize.stats()['resizes'], ht.resize.grows - ht.resize.resizing)
+            for i in range(1000):
+                self.assertEqual(self.lookup(ht, "key" + str(i)), i)
+            ht.finish_resize()
+            self.assertFalse(ht.resize.resizing)
+            self.assertEqual(len(ht.resize.resize_times), ht.resize.grows)
+
+    def test_incremental(self):
+        ht = HashTable(hash_function='fnv1a', rehash_step=2)
+        for i in range(50):
+            ht.insertSC(i, i)
+        self.assertFalse(ht.resize.resizing)
+        ht.insertSC(50, 50)
+        # The insert that started the resize moved at most its own bucket and rehash_step others
+        self.assertTrue(ht.resize.resizing)
+        self.assertEqual(ht.capacity, 100)
+        self.assertLessEqual(ht.resize.index, 2)
+        self.assertGreater(sum(node is not None for node in ht.resize.old_buckets), 10)
+        for i in range(60):
+            ht.find(i)
+        self.assertFalse(ht.resize.resizing)
+        self.assertEqual(len(ht.resize.resize_times), 1)
+        self.assertEqual(ht.resize.old_buckets, None)
+
+    def test_shrink(self):
+        for table in (HashTable, HashTableSC, HashTableDH):
+            ht = table(min_load_factor=0.1)
+            insert = ht.insertDH if table is HashTableDH else ht.insertSC
+            remove = ht.removeDH if table is HashTableDH else ht.removeSC
+            for i in range(500):
+                insert(i, i)
+            grown = ht.capacity
+            for i in range(495):
+                remove(i)
+            self.assertLess(ht.capacity, grown)
+            self.assertGreaterEqual(ht.resize.shrinks, 1)
+            self.assertEqual(len(ht), 5)
+            for i in range(495, 500):
+                self.assertEqual(self.lookup(ht, i), i)
+            # Never below the initial capacity
+            self.assertGreaterEqual(ht.capacity, ht.resize.initial_capacity)
+        # Without min_load_factor the table never shrinks
+        ht = HashTable()
+        for i in range(500):
+            ht.insertSC(i, i)
+        for i in range(500):
+            ht.removeSC(i)
+        self.assertEqual(ht.resize.shrinks, 0)
+
+    def test_thresholds(self):
+        with self.assertRaises(ValueError):
+            HashTable(max_load_factor=0)
+        with self.assertRaises(ValueError):
+            HashTableDH(max_load_factor=0.5, min_load_factor=0.3)
+
+
+class TestLinearProbing(unittest.TestCase):
+    def setUp(self):
+        self.ht = HashTableLP(hash_function='fnv1a')
+
+    def test_insert_find_remove(self):
+        self.ht.insertLP("key1", "value1")
+        self.ht.insertLP("key2", ["a", "list"])
+        self.assertEqual(len(self.ht), 2)
+        self.assertEqual(self.ht.find("key1"), "value1")
+        self.assertEqual(self.ht.find("key2"), ["a", "list"])
+        self.assertIsNone(self.ht.find("key3"))
+        self.assertIn("key1", self.ht)
+        self.assertNotIn("key3", self.ht)
+        # Inserting an existing key replaces its value
+        self.ht.insertLP("key1", "value2")
+        self.assertEqual(len(self.ht), 2)
+        self.assertEqual(self.ht.find("key1"), "value2")
+        self.assertEqual(self.ht.removeLP("key1"), "value2")
+        self.assertIsNone(self.ht.removeLP("key1"))
+        self.assertEqual(len(self.ht), 1)
+
+    def test_flat_arrays(self):
+        self.ht.insertLP("key", "value")
+        index = self.ht.keys.index("key")
+        self.assertEqual(self.ht.values[index], "value")
+        self.assertEqual(self.ht.hashes[index], self.ht.hash_function("key"))
+        self.assertEqual(self.ht.hashes.count(None), self.ht.capacity - 1)
+
+    def test_robin_hood(self):
+        # Every key hashes home to slot 0, 1 or 2 of a table that never grows
+        ht = HashTableLP(hash_function=lambda key: key % 3, max_load_factor=0.99)
+        for key in (0, 3, 6, 1, 4, 2):
+            ht.insertLP(key, key)
+        # Entries are ordered by home slot, so no entry is further from home than needed
+        self.assertEqual([h % 3 for h in ht.hashes[:6]], [0, 0, 0, 1, 1, 2])
+        self.assertEqual(ht.probe_stats()['max_probe_length'], 4)
+        # Backward shift: removing 0 pulls everything after it one slot closer to home
+        self.assertEqual(ht.removeLP(0), 0)
+        self.assertEqual(ht.keys[:6], [3, 6, 1, 4, 2, None])
+        for key in (3, 6, 1, 4, 2):
+            self.assertEqual(ht.find(key), key)
+        self.assertIsNone(ht.find(0))
+
+    def test_random_operations(self):
+        rng = random.Random(5)
+        ht = HashTableLP(hash_function='fnv1a', min_load_factor=0.2, rehash_step=1)
+        reference = {}
+        for i in range(20000):
+            key, operation = rng.randrange(2000), rng.random()
+            if operation < 0.5:
+                ht.insertLP(key, i)
+                reference[key] = i
+            elif operation < 0.75:
+                self.assertEqual(ht.find(key), reference.get(key))
+            else:
+                self.assertEqual(ht.removeLP(key), reference.pop(key, None))
+            self.assertEqual(len(ht), len(reference))
+        for key in range(2000):
+            self.assertEqual(ht.find(key), reference.get(key))
+        self.assertGreater(ht.resize.grows, 0)
+        stats = ht.probe_stats()
+        self.assertEqual(stats['entries'], len(reference))
+        self.assertLess(stats['average_probe_length'], 3)
+        self.assertGreater(stats['probes_per_operation'], 1)
+
+    def test_load_factor_bounds(self):
+        for max_load_factor in (1.0, 1.5):
+            with self.assertRaises(ValueError):
+                HashTableLP(INITIAL_CAPACITY=7, max_load_factor=max_load_factor)
+        # Probes stop after every slot even if the load factor check is bypassed and the table fills
+        ht = HashTableLP(INITIAL_CAPACITY=7, hash_function='fnv1a')
+        ht.resize.max_load_factor = 1.5
+        with self.assertRaises(RuntimeError):
+            for i in range(20):
+                ht.insertLP(i, i)
+        self.assertEqual(len(ht), 7)
+        self.assertEqual(sorted(ht.keys), list(range(7)))
+        self.assertIsNone(ht.find(100))
+
+
+class TestDoubleHashing(unittest.TestCase):
+    def value(self, ht, key):
+        self.assertEqual(ht.find(key), ht.find_many([key])[0])
+        return ht.find(key)
+
+    def test_prime_capacity(self):
+        ht = HashTableDH(hash_function='fnv1a')
+        self.assertEqual(ht.capacity, 53)
+        for i in range(1000):
+            ht.insertDH(i, i)
+            self.assertTrue(is_prime(ht.capacity))
+        self.assertTrue(0 < ht.hash2("key") < ht.capacity - 1)
+
+    def test_collisions(self):
+        # All keys share one home slot; lookups and inserts must still terminate
+        ht = HashTableDH(hash_function=lambda key: 7, max_load_factor=0.9)
+        for i in range(40):
+            ht.insertDH(i, str(i))
+        for i in range(40):
+            self.assertEqual(self.value(ht, i), str(i))
+        self.assertIsNone(ht.find(40))
+        self.assertEqual(ht.probe_stats()['max_probe_length'], 40)
+
+    def test_update_in_place(self):
+        ht = HashTableDH()
+        ht.insertDH("test_key", "test_value")
+        ht.insertDH("test_key", "test_value3")
+        self.assertEqual(len(ht), 1)
+        self.assertEqual(self.value(ht, "test_key"), "test_value3")
+
+    def test_tombstones(self):
+        ht = HashTableDH(hash_function=lambda key: key * 53, max_load_factor=0.9)
+        # 0, 1 and 2 all start at slot 0 and step 1 + key % 51
+        for i in range(3):
+            ht.insertDH(i, i)
+        self.assertEqual(ht.removeDH(0), 0)
+        self.assertIs(ht.buckets[0], TOMBSTONE)
+        self.assertEqual(ht.tombstones, 1)
+        # Keys probing past the removed slot are still found
+        self.assertEqual(self.value(ht, 1), 1)
+        self.assertNotIn(0, ht)
+        self.assertIsNone(ht.removeDH(0))
+        # A new key reuses the tombstone
+        ht.insertDH(3, 3)
+        self.assertEqual(ht.tombstones, 0)
+        self.assertEqual(ht.buckets[0].key, 3)
+
+    def test_cleanup(self):
+        ht = HashTableDH(hash_function='fnv1a', rehash_step=1)
+        # Churn through many distinct keys with only a few live at a time
+        for i in range(2000):
+            ht.insertDH(i, i)
+            if i >= 10:
+                self.assertEqual(ht.removeDH(i - 10), i - 10)
+        self.assertEqual(len(ht), 10)
+        self.assertEqual(ht.resize.grows, 0)
+        self.assertGreater(ht.resize.cleanups, 0)
+        self.assertLessEqual(ht.size + ht.tombstones, ht.capacity * ht.resize.max_load_factor)
+        for i in range(1990, 2000):
+            self.assertEqual(self.value(ht, i), i)
+        stats = ht.probe_stats()
+        self.assertEqual(stats['entries'], 10)
+        self.assertGreaterEqual(stats['average_probe_length'], 1)
+        self.assertEqual(stats['tombstones'], ht.tombstones)
+
+
+    def test_load_factor_bounds(self):
+        for max_load_factor in (1.0, 1.5):
+            with self.assertRaises(ValueError):
+                HashTableDH(INITIAL_CAPACITY=7, max_load_factor=max_load_factor)
+        ht = HashTableDH(INITIAL_CAPACITY=7, hash_function='fnv1a')
+        ht.resize.max_load_factor = 1.5
+        with self.assertRaises(RuntimeError):
+            for i in range(20):
+                ht.insertDH(i, i)
+        self.assertEqual(sorted(node.key for node in ht.buckets), list(range(7)))
+        self.assertIsNone(ht.find(100))
+
+
+class TestBatch(unittest.TestCase):
+    TABLES = [(HashTable, 'insertSC'), (HashTableSC, 'insertSC'), (HashTableDH, 'insertDH'), (HashTableLP, 'insertLP')]
+
+    def test_matches_single_key_operations(self):
+        rng = random.Random(13)
+        for table, _ in self.TABLES:
+            ht = table(hash_function='fnv1a', min_load_factor=0.1)
+            reference = {}
+            for round in range(20):
+                keys = [rng.randrange(3000) for _ in range(300)]
+                # Distinct keys, since the chaining tables keep duplicates
+                items = [(key, (round, key)) for key in dict.fromkeys(keys) if key not in reference]
+                ht.insert_many(items)
+                reference.update(items)
+                self.assertEqual(len(ht), len(reference))
+                probe = [rng.randrange(4000) for _ in range(300)]
+                self.assertEqual(ht.find_many(probe), [reference.get(key) for key in probe])
+                doomed = list(dict.fromkeys(rng.randrange(4000) for _ in range(200)))
+                self.assertEqual(ht.remove_many(doomed), [reference.pop(key, None) for key in doomed])
+                self.assertEqual(len(ht), len(reference))
+            self.assertEqual(ht.find_many(range(4000)), [reference.get(key) for key in range(4000)])
+            self.assertGreater(ht.resize.grows, 0)
+
+    def test_input_order_and_repeats(self):
+        for table, insert in self.TABLES:
+            ht = table(hash_function='fnv1a')
+            getattr(ht, insert)("old", 0)
+            ht.insert_many([("key" + str(i), i) for i in range(500)])
+            self.assertEqual(ht.find_many(["key499", "missing", "key0", "old"]), [499, None, 0, 0])
+            # A key repeated in a removal batch is only removed once
+            self.assertEqual(ht.remove_many(["key1", "key1", "missing"]), [1, None, None])
+            self.assertEqual(len(ht), 500)
+        for table in (HashTableDH, HashTableLP):
+            ht = table()
+            ht.insert_many([("a", 1), ("b", 2), ("a", 3)])
+            self.assertEqual(len(ht), 2)
+            self.assertEqual(ht.find_many(["a", "b"]), [3, 2])
+
+    def test_resize_in_progress(self):
+        for table, insert in self.TABLES:
+            ht = table(hash_function='fnv1a', rehash_step=1)
+            i = 0
+            while not ht.resize.resizing or i < 150:
+                getattr(ht, insert)(i, i)
+                i += 1
+            self.assertEqual(ht.find_many(range(i)), list(range(i)))
+            self.assertFalse(ht.resize.resizing)
+
+
+class TestFlatChaining(unittest.TestCase):
+    def test_find_compares_keys(self):
+        # Every key lands in the same bucket
+        ht = HashTableSC(hash_function=lambda key: 3)
+        ht.insertSC("a", 1)
+        ht.insertSC("b", 2)
+        self.assertEqual(ht.find("b"), 2)
+        self.assertEqual(ht.find("a"), 1)
+        self.assertIsNone(ht.find("c"))
+        self.assertNotIn("c", ht)
+        self.assertEqual(ht.removeSC("a"), 1)
+        self.assertIsNone(ht.removeSC("a"))
+        self.assertEqual(ht.find("b"), 2)
+
+    def test_flat_storage(self):
+        ht = HashTableSC(hash_function='fnv1a')
+        for i in range(100):
+            ht.insertSC(i, str(i))
+        # One slot per entry in each flat array, and no per-bucket objects
+        self.assertEqual((len(ht.keys), len(ht.values), len(ht.hashes), len(ht.next)), (100, 100, 100, 100))
+        self.assertEqual(ht.buckets.typecode, 'q')
+        # Removing an entry moves the last one into its place
+        ht.removeSC(5)
+        self.assertEqual(len(ht.keys), 99)
+        self.assertEqual(ht.keys[5], 99)
+        self.assertEqual(ht.find(99), "99")
+        for i in range(100):
+            self.assertEqual(ht.find(i), None if i == 5 else str(i))
+
+    def test_duplicates_keep_order(self):
+        ht = HashTableSC()
+        ht.insertSC("key", 1)
+        ht.insertSC("key", 2)
+        self.assertEqual(len(ht), 2)
+        self.assertEqual(ht.find("key"), 1)
+        self.assertEqual(ht.removeSC("key"), 1)
+        self.assertEqual(ht.find("key"), 2)
+
+
+class TestLockStriping(unittest.TestCase):
+    def test_single_thread_matches_dict(self):
+        ht = HashTableStriped(hash_function='fnv1a', stripes=4)
+        reference = {}
+        rng = random.Random(5)
+        for _ in range(5000):
+            key = rng.randrange(1500)
+            if rng.random() < 0.6:
+                ht.insert(key, -key)
+                reference[key] = -key
+            else:
+                self.assertEqual(ht.remove(key), reference.pop(key, None))
+        self.assertEqual(len(ht), len(reference))
+        self.assertEqual([ht.find(key) for key in range(1500)], [reference.get(key) for key in range(1500)])
+        self.assertEqual(ht.capacity % 4, 0)
+        self.assertGreater(ht.resize.grows, 0)
+        ht.insert_many([(key, key) for key in range(2000)])
+        self.assertEqual(ht.find_many([0, 1999, 2000]), [0, 1999, None])
+        self.assertEqual(ht.remove_many([5, 5, 2000]), [5, None, None])
+        self.assertEqual(len(ht), 1999)
+        self.assertTrue(1999 in ht and 5 not in ht)
+        with self.assertRaises(ValueError):
+            HashTableStriped(stripes=0)
+
+    def test_thread_pool_stress(self):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        ht = HashTableStriped(INITIAL_CAPACITY=8, hash_function='fnv1a', stripes=4)
+        # Pinned keys stay in the table, and must stay visible to lock-free lookups through resizes
+        pinned = ['pinned' + str(i) for i in range(100)]
+        ht.insert_many((key, key) for key in pinned)
+        workers = 6
+        start = threading.Barrier(workers + 2)
+        done = threading.Event()
+
+        def writer(w):
+            rng = random.Random(w)
+            keys = [str(w) + '/' + str(i) for i in range(400)]
+            present = {}
+            start.wait()
+            for _ in range(6000):
+                key = rng.choice(keys)
+                if key in present and rng.random() < 0.4:
+                    self.assertEqual(ht.remove(key), present.pop(key))
+                else:
+                    present[key] = rng.random()
+                    ht.insert(key, present[key])
+            return present
+
+        def reader():
+            start.wait()
+            while not done.is_set():
+                for key in pinned:
+                    self.assertEqual(ht.find(key), key)
+
+        with ThreadPoolExecutor(workers + 2) as pool:
+            readers = [pool.submit(reader) for _ in range(2)]
+            writes = [pool.submit(writer, w) for w in range(workers)]
+            expected = {key: key for key in pinned}
+            try:
+                for future in writes:
+                    expected.update(future.result(timeout=120))
+            finally:
+                done.set()
+            for future in readers:
+                future.result(timeout=120)
+        self.assertEqual(len(ht), len(expected))
+        self.assertEqual(ht.find_many(expected), list(expected.values()))
+        stored = []
+        for node in ht.buckets:
+            while node is not None:
+                stored.append(node.key)
+                node = node.next
+        self.assertEqual(sorted(stored), sorted(expected))
+        self.assertGreater(ht.resize.grows, 0)
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_round_trip(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'table.snap')
+        for table, _ in TestBatch.TABLES:
+            ht = table(hash_function='fnv1a', min_load_factor=0.1)
+            ht.insert_many(("key" + str(i), i) for i in range(3000))
+            ht.remove_many("key" + str(i) for i in range(0, 3000, 3))
+            ht.save(path)
+            loaded = table.load(path, hash_function='fnv1a')
+            self.assertEqual(len(loaded), 2000)
+            self.assertEqual(loaded.capacity, ht.capacity)
+            self.assertEqual(loaded.resize.min_load_factor, 0.1)
+            keys = ["key" + str(i) for i in range(3000)]
+            self.assertEqual(loaded.find_many(keys), ht.find_many(keys))
+            other = HashTableLP if table is not HashTableLP else HashTableDH
+            with self.assertRaises(ValueError):
+                other.load(path)
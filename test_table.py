@@ -0,0 +1,158 @@
+from hashTableDoubleHashing import HashTableDH
+from hashTableLinearProbing import HashTableLP
+from hashTableLockStriping import HashTableStriped
+from hashTableSeparateChainingWithLinkedList import HashTable
+from hashTableSeparateChainingWithList import HashTableSC
+from table import Table, HASH, RANGE, SCAN
+import random
+import unittest
+
+
+class TestTable(unittest.TestCase):
+    """Runs with the default hash table of hash indexes; the subclasses below run it with the others."""
+    HASH_TABLE = HashTableSC
+    QUERIES = [
+        [('category', '=', 3)],
+        [('price', 'between', (100, 200))],
+        [('price', '>=', 100), ('price', '<', 150), ('price', '>', 120)],
+        [('category', '=', 3), ('price', '<', 500)],
+        [('category', '=', 3), ('name', '=', 'item17')],
+        [('name', '=', 'item42')],
+        [],
+    ]
+
+    def setUp(self):
+        random.seed(7)
+        self.table = Table(['id', 'category', 'price', 'name'])
+        self.table.insert_many((i, i % 10, random.randrange(1000), f'item{i}') for i in range(2000))
+        self.table.create_index('by_category', 'category', 'hash', table_type=self.HASH_TABLE,
+                                hash_function='fnv1a')
+        self.table.create_index('by_price', 'price', include=['name'])
+        self.table.create_index('by_category_price', ['category', 'price'], maximum=8)
+
+    def check(self):
+        """Every query gives the rows of a full scan, and the indexes hold one entry per row."""
+        table = self.table
+        for where in self.QUERIES:
+            for columns in (None, ['price', 'name'], ['id']):
+                self.assertEqual(sorted(table.select(where, columns), key=repr),
+                                 sorted(table.select(where, columns, index=SCAN), key=repr), where)
+        for index in table.indexes.values():
+            if index.kind == 'tree':
+                self.assertEqual(index.tree.stats.size, len(table))
+            else:
+                positions = [table.columns.index(column) for column in index.columns]
+                keys = {tuple(row[i] for i in positions) for row in table.rows.values()}
+                postings = index.table.find_many(keys)
+                self.assertEqual(sum(len(posting) for posting in postings if posting), len(table))
+
+    def test_plan(self):
+        plan = self.table.plan
+        self.assertEqual(plan([('category', '=', 3)]).access, HASH)
+        chosen = plan([('price', 'between', (1, 5))])
+        self.assertEqual((chosen.access, chosen.index.name), (RANGE, 'by_price'))
+        self.assertEqual((chosen.low, chosen.high), ((1, True), (5, True)))
+        chosen = plan([('price', '>', 1), ('price', '>=', 3), ('price', '<', 9), ('price', '<=', 9)])
+        self.assertEqual((chosen.low, chosen.high), ((3, True), (9, False)))
+        # Two matched columns beat an equality lookup on one
+        chosen = plan([('category', '=', 3), ('price', '<', 10)])
+        self.assertEqual((chosen.index.name, chosen.prefix, chosen.high), ('by_category_price', (3,), (10, False)))
+        self.assertEqual(plan([('name', '=', 'item1')]).access, SCAN)
+        self.assertEqual(plan([('price', '<', 10)], ['price', 'name']).covering, True)
+        self.assertEqual(plan([('price', '<', 10)]).covering, False)
+        self.assertEqual(plan([('category', '=', 3)], index='by_category_price').prefix, (3,))
+        with self.assertRaises(ValueError):
+            plan([('name', '=', 'item1')], index='by_price')
+        with self.assertRaises(ValueError):
+            plan([('color', '=', 'red')])
+        with self.assertRaises(ValueError):
+            plan([('price', '~', 3)])
+
+    def test_select(self):
+        self.assertEqual(self.table.select([('id', '=', 42)]), [(42, 2, self.table.rows[42][2], 'item42')])
+        prices = [price for (price,) in self.table.select([('price', 'between', (100, 300))], ['price'])]
+        self.assertEqual(prices, sorted(prices))
+        self.check()
+
+    def test_update_and_delete(self):
+        table = self.table
+        self.assertEqual(table.update([('category', '=', 3)], {'category': 11, 'price': 5}), 200)
+        self.assertEqual(len(table.select([('category', '=', 11), ('price', '=', 5)])), 200)
+        self.assertEqual(table.select([('category', '=', 3)]), [])
+        cheap = sum(row[2] < 100 for row in table.rows.values())
+        self.assertEqual(table.delete([('price', 'between', (0, 99))]), cheap)
+        self.assertEqual(table.select([('price', '<', 100)]), [])
+        table.update([('id', '=', 500)], {'name': 'renamed'})
+        self.assertEqual(table.select([('price', '=', table.rows[500][2]), ('name', '=', 'renamed')], ['id']), [(500,)])
+        self.check()
+
+    def test_batch(self):
+        table = self.table
+        with table.batch():
+            rid = table.insert({'id': 5000, 'category': 3, 'price': 50})
+            self.assertTrue(table._pending)
+            table.update([('id', '=', 5000)], {'price': 60})
+            self.assertEqual(table.select([('category', '=', 3), ('price', '=', 60)], ['id']), [(5000,)])
+            table.update([('id', '=', 5000)], {'price': 70})
+            table.delete([('id', '<', 10)])
+            self.assertTrue(table._pending)
+        self.assertFalse(table._pending)
+        self.assertEqual(table.rows[rid], (5000, 3, 70, None))
+        self.check()
+
+    def test_nulls(self):
+        table = self.table
+        rids = table.insert_many([{'id': 3000}, {'id': 3001, 'category': 3}, {'id': 3002, 'price': 40}])
+        table.create_index('by_name', 'name')
+        table.create_index('by_price_hash', 'price', 'hash', table_type=self.HASH_TABLE)
+        for where in ([('category', '=', 3), ('price', '>', 0)], [('price', '=', 40)], [('name', '<', 'item2')]):
+            for index in table.indexes.values():
+                if index.kind == 'tree' and index.columns[0] == where[0][0]:
+                    self.assertEqual(sorted(table.select(where, ['id'], index=index.name)),
+                                     sorted(table.select(where, ['id'], index=SCAN)), where)
+        # The NULL price sorts last in its category and is still reached by the prefix alone
+        self.assertEqual(table.select([('category', '=', 3)], ['id'], index='by_category_price')[-1], (3001,))
+        self.assertEqual(table.select([('name', '=', 'item5')], ['id'], index='by_name'), [(5,)])
+        table.update([('id', '=', 3000)], {'price': 1})
+        table.delete([('id', 'between', (3001, 3002))])
+        self.assertIn((3000,), table.select([('price', '=', 1)], ['id'], index='by_price_hash'))
+        self.assertNotIn(rids[1], table.rows)
+        self.check()
+
+    def test_failed_insert_rolls_back(self):
+        table = self.table
+        before = len(table)
+        with self.assertRaises(TypeError):
+            table.insert_many([(5000, 1, 'not a price', 'x'), (5001, 2, 7, 'y')])
+        self.assertEqual(len(table), before)
+        self.assertNotIn(5000, [row[0] for row in table.rows.values()])
+        self.assertEqual(table.select([('category', '=', 1), ('id', '>=', 5000)]), [])
+        table.insert((5002, 2, 8, 'z'))
+        self.assertEqual(table.select([('price', '=', 8), ('id', '=', 5002)], ['name']), [('z',)])
+        self.check()
+
+    def test_emptied_postings(self):
+        self.table.delete([('category', '=', 4)])
+        self.assertIsNone(self.table.indexes['by_category'].table.find_many([(4,)])[0])
+        self.table.insert_many((i, 4, i, 'again') for i in range(10))
+        self.check()
+
+
+class TestTableLinkedList(TestTable):
+    HASH_TABLE = HashTable
+
+
+class TestTableLinearProbing(TestTable):
+    HASH_TABLE = HashTableLP
+
+
+class TestTableDoubleHashing(TestTable):
+    HASH_TABLE = HashTableDH
+
+
+class TestTableStriped(TestTable):
+    HASH_TABLE = HashTableStriped
+
+
+if __name__ == '__main__':
+    unittest.main()